@@ -1,6 +1,5 @@
 from biohit_pipettor import Pipettor
 import subprocess
-import time
 
 import sys
 
@@ -8,17 +7,15 @@ from ..src.action import EHMPlatePos, Reservoirs, PipetteTips, TipDropzone, dilu
     remove_multi, fill_multi, discard_tips, home, pick_tip_multi, return_tip_multi
 
 #sys.path.append(r"C:\Labhub\Repos\smartlab-network\contractiondb-python")
-#from examples import upload_myrimager, analyzeMeasurement
 
+from ..src.clock import VirtualClock, sleep, use_clock
 from ..src.deck import Deck
+from ..src.metrics import plate_done
+from ..src.tracing import default_tracer
 
-# on bottom plate with thin wells towards back, top right corner of each lot
-A1 = (130.5,   0)
-A2 = (0    ,   0)
-B1 = (130.5,  42)
-B2 = (0    ,  42)
-C1 = (130.5, 140)
-C2 = (0    , 140)
+# labware corners of Deck, shifted by the calibration fitted with deck.calibrate() from the reference points
+deck = Deck()
+deck.load_calibration()
 
 
 
@@ -32,34 +29,56 @@ p.tip_pickup_force = 20
 p.aspirate_speed = 1
 
 
-ehm_plate = EHMPlatePos(B1[0], B1[1])
+ehm_plate = EHMPlatePos(*deck.corner("B1"))
 ehm_plate.add_height=30
 ehm_plate.remove_height=38
+deck.place(ehm_plate, "B1")
 
-#                            pick_zone    drop_zone
-pipette_tips = PipetteTips(B2[0], B2[1], C1[0], C1[1])
+#                            pick_zone               drop_zone
+pipette_tips = PipetteTips(*deck.corner("B2"), *deck.corner("C1"))
+deck.place(pipette_tips, "B2", drop_slot="C1")
 
 pipette_tips.change_tips=0    #as default keep tips
 
-containers = Reservoirs(C2[0], C2[1])
+containers = deck.place(Reservoirs(*deck.corner("C2")), "C2")
 
 
 incubation_time = 300     #seconds
 platename       = '20250101x'
 
-incubation_time = 3
+#
+# Dry run: sleeps return immediately, simulated timestamps are kept in clock.events
+#
+bDryRun = 0
+if bDryRun:
+    use_clock(VirtualClock())
 
 
 #
 # Turn on/off FOC MEasurement
 #
 bDoFoc = 0
+db_config = r'C:\labhub\Import\config.json'
+
+#
+# Conversion, upload and analysis of each measurement run in the background during the next steps
+#
+if bDoFoc:
+    from .foc_pipeline import Measurement, foc_outfile, foc_pipeline
+    pipeline = foc_pipeline(db_config)
+    pipeline.start()
+
+
+def measure(label):
+    subprocess.call([r'C:\labhub\Import\FOC48.bat', platename])
+    pipeline.submit(Measurement(platename, label, file=foc_outfile()))
+
 
 print("Starting Ca-force curve measurement")
 print("Starting with 1.8mM default")
 
 if bDoFoc:
-    subprocess.call([r'C:\labhub\Import\FOC48.bat', platename]) # 0.2mM
+    measure("1.8mM default") # 0.2mM
 
 print("Initial measurement completed")
 
@@ -70,7 +89,7 @@ cols=[1,3,6]
 if pipette_tips.change_tips==0:
     #pick tips once    
     print("pick tips once")    
-    pick_multi_tips(p, pipette_tips)
+    pick_tip_multi(p, pipette_tips)
     
 
 #remove calcium
@@ -100,9 +119,9 @@ for volume in [50]:  # 0.2- 1mM
     print(f"Filled well with {volume} medium")
     if bDoFoc:
         p.move_xy(0, 0)
-        time.sleep(incubation_time)
+        sleep(incubation_time, "incubation")
         print(f"Incubation time {incubation_time/60} minutes. Turn measurement ON")        
-        subprocess.call([r'C:\labhub\Import\FOC48.bat', platename])
+        measure(f"well5 {volume}ul")
         print(f"Completed measurement")
         p.move_z(0)   
     
@@ -115,9 +134,9 @@ for volume in [30]:  # 2- 10mM
     print(f"Replaced {volume} ul medium")
     if bDoFoc:
         p.move_xy(0, 0)
-        time.sleep(incubation_time)
+        sleep(incubation_time, "incubation")
         print(f"Incubation time {incubation_time/60} minutes. Turn measurement ON")
-        subprocess.call([r'C:\labhub\Import\FOC48.bat', platename])
+        measure(f"calcium_18_mM {volume}ul")
         print(f"Completed measurement")
         p.move_z(0)
 
@@ -136,8 +155,15 @@ fill_multi(p, ehm_plate, containers, pipette_tips, calcium_0_mM, 6, 450)  # 1.97
 
     
 if pipette_tips.change_tips==0:
-    return_multi_tips(p, pipette_tips)
+    return_tip_multi(p, pipette_tips)
     
     
 home(p)
+plate_done()
+if bDoFoc:
+    print(f"Waiting for {pipeline.pending()} measurements to be processed")
+    pipeline.close()
+    for m in pipeline.failed():
+        print(f"{m.label}: {m.error[0]} failed, upload {m.data.get('file')} by hand")
+default_tracer.export_chrome(f"{platename}_trace.json")
 print("Completed Ca-force curve measurement. Replace plate, fill medium and discard waste before continuing")
@@ -1,6 +1,5 @@
 from biohit_pipettor import Pipettor
 import subprocess
-import time
 
 import sys
 
@@ -10,14 +9,12 @@ import sys
 
 from ..src.action import EHMPlatePos, Reservoirs, PipetteTips, TipDropzone,  \
     discard_tips, home
+from ..src.clock import VirtualClock, sleep, use_clock
+from ..src.deck import Deck
 
-# on bottom plate with thin wells towards back, top right corner of each lot
-A1 = (130.5,   0)
-A2 = (0    ,   0)
-B1 = (130.5,  42)
-B2 = (0    ,  42)
-C1 = (130.5, 140)
-C2 = (0    , 140)
+# labware corners of Deck, shifted by the calibration fitted with deck.calibrate() from the reference points
+deck = Deck()
+deck.load_calibration()
 
 
 
@@ -31,22 +28,29 @@ p.tip_pickup_force = 20
 p.aspirate_speed = 1
 
 
-ehm_plate = EHMPlatePos(B1[0], B1[1])
+ehm_plate = EHMPlatePos(*deck.corner("B1"))
 ehm_plate.add_height=30
 ehm_plate.remove_height=38
+deck.place(ehm_plate, "B1")
 
-#                            pick_zone    drop_zone
-pipette_tips = PipetteTips(B2[0], B2[1], C1[0], C1[1])
+#                            pick_zone               drop_zone
+pipette_tips = PipetteTips(*deck.corner("B2"), *deck.corner("C1"))
+deck.place(pipette_tips, "B2", drop_slot="C1")
 
 pipette_tips.change_tips=0    #as default keep tips
 
-containers = Reservoirs(C2[0], C2[1])
+containers = deck.place(Reservoirs(*deck.corner("C2")), "C2")
 
 
 incubation_time = 300     #seconds
 platename       = '20250101x'
 
-incubation_time = 3
+#
+# Dry run: sleeps return immediately, simulated timestamps are kept in clock.events
+#
+bDryRun = 0
+if bDryRun:
+    use_clock(VirtualClock())
 
 
 #
@@ -99,7 +103,7 @@ for volume in [50]:  # 0.2- 1mM
     print(f"Filled well with {volume} medium")
     if bDoFoc:
         p.move_xy(0, 0)
-        time.sleep(incubation_time)
+        sleep(incubation_time, "incubation")
         print(f"Incubation time {incubation_time/60} minutes. Turn measurement ON")        
         subprocess.call([r'C:\labhub\Import\FOC48.bat', platename])
         print(f"Completed measurement")
@@ -114,7 +118,7 @@ for volume in [30]:  # 2- 10mM
     print(f"Replaced {volume} ul medium")
     if bDoFoc:
         p.move_xy(0, 0)
-        time.sleep(incubation_time)
+        sleep(incubation_time, "incubation")
         print(f"Incubation time {incubation_time/60} minutes. Turn measurement ON")
         subprocess.call([r'C:\labhub\Import\FOC48.bat', platename])
         print(f"Completed measurement")
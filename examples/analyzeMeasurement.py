@@ -1,5 +1,31 @@
 
 
+
+def analyze(db, exp, mea=None, well=None, start_date='2025-01-01', plot=True):
+    """
+    Finds the peaks of all traces of a measurement and stores them in the database
+    Only traces missing in the local cache are downloaded
+    :return: the analyzed traces
+    """
+    from ..src.tracecache import TraceCache
+
+    if plot:
+        from matplotlib import pyplot as plt
+
+    cache = TraceCache()
+    traces = cache.refresh(db, exp, mea, well, start_date=start_date)
+
+    for t in traces:
+        t.filter_min_max()
+        t.find_peaks()
+        if plot:
+            graph = plt.plot(t.time, t.raw_distance)
+            t.plot()
+        db.remove_peaks_from_trace(t)
+        db.add_peaks_to_trace(t)
+    return traces
+
+
 def main():
     import json
     import sys
@@ -9,7 +35,6 @@ def main():
     sys.path.append(r"C:\Labhub\Repos\smartlab-network\contractiondb-python\src")
     from contractiondb import ContractionDB
     from contractiondb.regex import parse_args
-    from matplotlib import pyplot as plt
 
     print(__name__)
 
@@ -21,21 +46,11 @@ def main():
     db = ContractionDB(**loginData)
 
     #traces = db.get_traces(exp=args.expName, mea=args.meaName, well=args.wellName)
-    traces = db.get_trace_ids(args.expName, args.meaName, args.wellName, start_date='2025-01-01')
-
-    # plot them
-    for t in traces:
-        db.add_trace(t)
-        t.filter_min_max()
-        t.find_peaks()
-        graph = plt.plot(t.time, t.raw_distance)
-        t.plot()
-        db.remove_peaks_from_trace(t)
-        db.add_peaks_to_trace(t)
+    analyze(db, args.expName, args.meaName, args.wellName)
 
     print('done')
 
 if __name__ == "__main__":
     # Nur beim direkten Ausführen ausführen
     import sys
-    main()
\ No newline at end of file
+    main()
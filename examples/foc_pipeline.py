@@ -0,0 +1,52 @@
+"""
+Background conversion, upload and analysis of the FOC measurements of a CRC run
+Submit each measurement right after FOC48.bat returns, the robot continues with the next step
+
+    pipeline = foc_pipeline("config.json")
+    with pipeline:
+        ...
+        subprocess.call([r'C:\\labhub\\Import\\FOC48.bat', platename])
+        pipeline.submit(Measurement(platename, "0.4mM", file=foc_outfile()))
+
+Only the submitted measurement is analyzed, named after its csv file unless measurement=... is given
+"""
+import threading
+from pathlib import Path
+
+from ..src.pipeline import Measurement, Pipeline
+from .analyzeMeasurement import analyze
+from .upload_myrimager import connect, csv_file, foc_outfile, upload_files
+
+
+def foc_pipeline(config, experiment=None, csv_timeout=600, maxsize=4) -> Pipeline:
+    """
+    :param config: database config file, as for upload_myrimager
+    :param experiment: experiment name in the database, default the plate name
+    :param csv_timeout: seconds to wait for FOC48.bat to write the csv
+    """
+    connections = threading.local()
+
+    def db():
+        # one connection per stage thread
+        if not hasattr(connections, "db"):
+            connections.db = connect(config)
+        return connections.db
+
+    def convert(m: Measurement):
+        m.data["file"] = csv_file(m.data.get("file") or foc_outfile(), csv_timeout)
+        # the database names a measurement uploaded from csv after the file
+        m.data.setdefault("measurement", Path(m.data["file"]).stem)
+        return m
+
+    def upload(m: Measurement):
+        upload_files(db(), [m.data["file"]])
+        return m
+
+    def analysis(m: Measurement):
+        m.data["traces"] = analyze(db(), experiment or m.platename, m.data["measurement"], plot=False)
+        return m
+
+    return Pipeline([("convert", convert), ("upload", upload), ("analyze", analysis)], maxsize)
+
+
+__all__ = ["Measurement", "foc_pipeline", "foc_outfile"]
@@ -0,0 +1,40 @@
+"""
+Finds the fastest safe speed / tip settings for one Ca exchange step before running it on the robot
+python -m biohit-pipettor-python.examples.sweep_crc
+"""
+from ..src.action import EHMPlatePos, PipetteTips, Reservoirs, fill_multi, pick_tip_multi, remove_multi, \
+    return_tip_multi
+from ..src.deck import Deck
+from ..src.sweep import grid, run_sweep
+
+deck = Deck()
+deck.load_calibration()
+
+
+def exchange_step(p, change_tips=0, cols=(1, 3, 6), volume=50):
+    ehm_plate = deck.place(EHMPlatePos(*deck.corner("B1")), "B1")
+    pipette_tips = deck.place(PipetteTips(*deck.corner("B2"), *deck.corner("C1")), "B2", drop_slot="C1")
+    pipette_tips.change_tips = change_tips
+    containers = deck.place(Reservoirs(*deck.corner("C2")), "C2")
+
+    if not change_tips:
+        pick_tip_multi(p, pipette_tips)
+    remove_multi(p, ehm_plate, containers, pipette_tips, list(cols), volume)
+    fill_multi(p, ehm_plate, containers, pipette_tips, containers.well5_x, list(cols), volume)
+    if not change_tips:
+        return_tip_multi(p, pipette_tips)
+
+
+if __name__ == "__main__":
+    configs = grid(
+        x_speed=[5, 7, 9],
+        y_speed=[7, 9],
+        z_speed=[6, 8],
+        aspirate_speed=[1, 2],
+        tip_pickup_force=[20],
+        change_tips=[0, 1],
+        cols=[(1, 3, 6), (6, 3, 1)],
+    )
+    results = run_sweep(exchange_step, configs)
+    for result in results[:10]:
+        print(result)
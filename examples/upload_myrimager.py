@@ -2,14 +2,70 @@
 import json
 import os
 import sys
-import winreg
 import re
+import time
 
 from contractiondb import ContractionDB
 from contractiondb import (parse_args)
 
 #sys.path.append("E:\\Labhub\\Repos\\meyerti\\contractiondb-python")
 
+
+def connect(config):
+    """Connects to the contraction database with the login data in the config file"""
+    try:
+        loginData = json.load(open(config))
+        db = ContractionDB(**loginData)
+        print(f"connected to database")
+    except Exception as e:
+        raise RuntimeError(f"Failed to connect to DB, check Config File >{config}<") from e
+    return db
+
+
+def foc_outfile():
+    """Path of the last FOC measurement, from the FOC_OUTFILE user environment variable"""
+    import winreg
+
+    # Öffnen Sie den Registry-Ordner
+    reg_key = "FOC_OUTFILE"
+    hkey = winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Environment")
+    # Lesen Sie die Umgebungsvariable
+    fname, type = winreg.QueryValueEx(hkey, reg_key)
+    # the FOC_OUTFILE contains the path to xml file, if it is passed auto-convert to csv
+    return fname
+
+
+def csv_file(fname, timeout=0):
+    """
+    CSV file of a FOC measurement, the .xml is converted to .csv by FOC48.bat
+    :param timeout: seconds to wait for the csv to appear
+    """
+    if re.search(r".xml$", fname):
+        fname = re.sub(r"\.xml$", ".csv", fname)
+        print(f"fname became {fname}")
+    deadline = time.time() + timeout
+    while not os.path.isfile(fname) and time.time() < deadline:
+        time.sleep(1)
+    return fname
+
+
+def upload_files(db, file_list):
+    """
+    Uploads the CSV files of FOC measurements, .xml names are mapped to their .csv
+    :raise FileNotFoundError: if a csv file does not exist, nothing was uploaded for it
+    """
+    for fname in file_list:
+        print(f"fname is {fname}")
+        fname = csv_file(fname)
+
+        if not os.path.isfile(fname):
+            raise FileNotFoundError(f"no file >{fname}< found")
+        try:
+            db.upload_measurement_from_csv(fname)
+        except Exception as e:
+            raise ValueError(f"Second Argument does not contain a valid CSV File, {fname}") from e
+
+
 def upload_foc_file():
 
     args = parse_args()
@@ -21,47 +77,16 @@ def upload_foc_file():
     if args.files:
         file_list=args.files
     else:
-        # Öffnen Sie den Registry-Ordner
-        reg_key = "FOC_OUTFILE"
-        hkey = winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Environment")
-        # Lesen Sie die Umgebungsvariable
-        fname, type = winreg.QueryValueEx(hkey, reg_key)
-        # Drucken Sie den Wert der Umgebungsvariable
-        # the FOC_OUTFILE contains the path to xml file, if it is passed auto-convert to csv
-
+        fname = foc_outfile()
         if os.path.isfile(fname):
             file_list.append(fname)
         else:
-            print(f"Env {reg_key} does not contain a valid filename >{fname}<")
-
-
-    try:
-        loginData = json.load(open(args.config))
-        db = ContractionDB(**loginData)
-        print(f"connected to database")
-    except:
-        raise Exception(f"Failed to connect to DB, check Config File >{args.config}<")
-
-
-
-    for fname in file_list:
-        print(f"fname is {fname}")
-        if re.search(r".xml$", fname):
-            fname = re.sub(r"\.xml$", ".csv", fname)
-            print(f"fname became {fname}")
-
-        if os.path.isfile(fname):
-            try:
-                db.upload_measurement_from_csv(fname)
-            except:
-                raise Exception(f"Second Argument does not contain a valid CSV File, {fname}")
-        else:
-            print(f"no file >{fname}< found")
+            print(f"Env FOC_OUTFILE does not contain a valid filename >{fname}<")
 
 
+    db = connect(args.config)
+    upload_files(db, file_list)
     db.close()
 
 
     print("DONE")
-
-
@@ -2,12 +2,19 @@
 Classes and functions to be used with biohit_pipettor
 p = Pipettor() in all cases
 """
-import time
-from typing import List
+import math
+from typing import Dict, List, Optional, Tuple, Union
 
 from biohit_pipettor import Pipettor
 from biohit_pipettor.errors import CommandFailed
 
+from . import clock, metrics
+from .reagentmap import Location, ReagentMap
+from .tipplanner import TipPlanner, Transfer
+from .tracing import instant, traced
+from .wellset import COLS, WellSet, well_coordinates
+
+MULTICHANNEL = 8    # channels of the multichannel head, for tracked container volumes
 
 
 
@@ -38,6 +45,7 @@ class Reservoirs:
         self.y_corner = y_corner + 40
         self.add_height = 65
         self.remove_height = 90
+        self.reagents: Optional[ReagentMap] = None    # if set, fill_multi takes reagent names as stock
 
 
 class RoundContainers:  # TODO: adjust to 6-well setup once that�s printed
@@ -46,6 +54,7 @@ class RoundContainers:  # TODO: adjust to 6-well setup once that�s printed
         self.waste_x = x_corner + 62.5
         self.well3_x = x_corner + 20.5
         self.y_corner = y_corner + 15
+        self.reagents: Optional[ReagentMap] = None
 
 
 class PipetteTips:
@@ -55,7 +64,10 @@ class PipetteTips:
         self.x_corner_multi = x_corner + 105
         self.y_corner_multi = y_corner + 42
         self.x_step = 9
+        self.next_column = 0    # next tip column for pick_tip_multi
+        self.next_tip = 0       # next tip for pick_next_tip, counted column by column
         self.change_tips = 1
+        self.planner: Optional[TipPlanner] = None    # if set, replaces change_tips in fill_multi/remove_multi
         self.return_height = 85
         self.pick_height   = 75
         self.x_drop   = x_drop+50
@@ -71,29 +83,35 @@ class TipDropzone:
 """Functions"""
 
 
+@traced()
 def pick_tip_multi(p: Pipettor, pipette_tips):
     """
     Picks tips going through tip box left to right
     :param p: Pipettor, multichannel = True
     :param pipette_tips:
     """
-    print("pick_multi_tips: start")
-    p.move_xy(pipette_tips.x_corner_multi, pipette_tips.y_corner_multi)    
+    start = pipette_tips.next_column
+    if start >= 12:
+        raise RuntimeError("No tip columns left, refill the tip box and reset pipette_tips.next_column")
+    p.move_xy(pipette_tips.x_corner_multi - start * 9, pipette_tips.y_corner_multi)    
     
-    for i in range(1, 13, 1):
+    for i in range(start + 1, 13, 1):
         try:
             p.pick_tip(pipette_tips.pick_height)
-            print("Picked up pipette tip")
+            pipette_tips.next_column = i
             break
         except CommandFailed:
-            print(f"Found no tips, moving on to x {pipette_tips.x_corner - i * 9}")
+            instant("no tips found", x=pipette_tips.x_corner_multi - (i - 1) * 9)
+            metrics.inc("biohit_pick_tip_retries_total", routine="pick_tip_multi")
             p.move_x(pipette_tips.x_corner_multi - i * 9)
             continue
         finally:
             p.move_z(0)
     else:
-        raise RuntimeError(f"Failed to pick tips from {i} pipette box columns")
+        pipette_tips.next_column = 12
+        raise RuntimeError(f"Failed to pick tips from {12 - start} pipette box columns")
 
+@traced()
 def return_tip_multi(p: Pipettor, pipette_tips):
     """
     Return Tips to tip box left to right
@@ -101,40 +119,45 @@ def return_tip_multi(p: Pipettor, pipette_tips):
     :param pipette_tips:
     """
     p.move_xy(pipette_tips.x_corner_multi,pipette_tips.y_corner_multi)    
-    p.move_z(85)
+    p.move_z(pipette_tips.return_height)
     p.eject_tip()
     p.move_z(0)
+    pipette_tips.next_column = 0
     
     
+@traced()
 def pick_next_tip(p: Pipettor, pipette_tips):
     """
     :param p: Pipettor, multichannel= False
     :param pipette_tips: location of tip box, PipetteTips class
     Picks up a tip going through whole box starting top left corner
     """
-    for column in reversed(range(12)):
-        tip_x = column * 9 + 6
-        for row in range(8):
-            tip_y = row * 9 + pipette_tips.y_corner
-            print(f"Moving to tip {column}, {row}; position {tip_x}, {tip_y}")
-            p.move_xy(tip_x, tip_y)
-            try:
-                p.pick_tip(75)
-                print("Picked tip")
-                return
-            except CommandFailed:
-                print("No tip found")
-                pass
-            finally:
-                p.move_z(0)
+    for index in range(pipette_tips.next_tip, 96):
+        column, row = 11 - index // 8, index % 8
+        tip_x = pipette_tips.x_corner - (11 - column) * pipette_tips.x_step
+        tip_y = row * 9 + pipette_tips.y_corner
+        p.move_xy(tip_x, tip_y)
+        try:
+            p.pick_tip(pipette_tips.pick_height)
+            pipette_tips.next_tip = index + 1
+            return
+        except CommandFailed:
+            instant("no tip found", column=column, row=row)
+            metrics.inc("biohit_pick_tip_retries_total", routine="pick_next_tip")
+        finally:
+            p.move_z(0)
+    pipette_tips.next_tip = 96
     raise RuntimeError("No tips left")
 
 
-def discard_tips(p: Pipettor, containers, tip_dropzone):
+@traced()
+def discard_tips(p: Pipettor, containers, tip_dropzone, content: float = 0):
     """
     Discards pipette tip after blowing out any remaining medium into declared waste container
+    :param content: volume per channel still in the tips, booked in the waste, see waste_location()
     """
-    p.move_xy(containers.waste_x, containers.y_corner)
+    waste = waste_location(containers, content, containers.waste_x, containers.y_corner)
+    move_to_reservoir(p, waste.x, waste.y)
     spit_all(p, 60)
     p.move_y(tip_dropzone.y_corner)
     p.move_x(tip_dropzone.x_corner)
@@ -143,8 +166,9 @@ def discard_tips(p: Pipettor, containers, tip_dropzone):
     p.move_z(0)
 
 
+@traced()
 def remove_medium(p: Pipettor, ehm_plate: EHMPlatePos, containers, pipette_tips,  total_row: float, total_column: float,
-                volume: float, height: float, start_x=None, start_y=None):
+                volume: float, height: float, start_x=None, start_y=None, wells: Optional[WellSet] = None):
     """Removes medium from whole 48well plate
     Adjustments possible by altering total number of columns and rows
     :param p: Pipettor Object
@@ -157,106 +181,85 @@ def remove_medium(p: Pipettor, ehm_plate: EHMPlatePos, containers, pipette_tips,
     :param volume: amount ot be removed
     :param start_x: default = ehm_plate_x.corner, skip columns to start of fill
     :param start_y: default = ehm_plate_y.corner, skip columns to start of fill
+    :param wells: default = None, WellSet to process instead of total_row x total_column
     """
-    column = 0
-    row = 0
     tip_content = 0
     start_x = start_x or ehm_plate.x_corner
     start_y = start_y or ehm_plate.y_corner
     pick_next_tip(p, pipette_tips)
-    while row < total_row:
-        while column < total_column:
-            if 1000 - tip_content < volume:
-                p.move_xy(containers.waste_x, containers.y_corner)
-                spit(p, tip_content, containers.add_height)
-                tip_content = 0
-            else:
-                pass
-            p.move_xy(start_x, start_y)
-            suck(p, volume, height)
-            start_y = start_y + ehm_plate.y_step
-            column = column + 1
-            tip_content = tip_content + volume
-        column = 0
-        start_y = start_y - total_column * 9
-        row = row + 1
-        start_x = start_x + ehm_plate.x_step
+    for x, y in well_positions(ehm_plate, start_x, start_y, total_row, total_column, wells):
+        if 1000 - tip_content < volume:
+            move_to_reservoir(p, containers.waste_x, containers.y_corner)
+            spit(p, tip_content, containers.add_height)
+            tip_content = 0
+        p.move_xy(x, y)
+        suck(p, volume, height)
+        tip_content = tip_content + volume
     print(f"Removed {volume} ul medium from plate")
 
 
+@traced()
 def fill_medium(p: Pipettor, ehm_plate: EHMPlatePos, containers, total_row: float, total_column: float,
-                volume: float, fill_height: float):
+                volume: float, fill_height: float, wells: Optional[WellSet] = None):
     """
     Fills medium of specified volume to all wells on 48well plate, right to left
-    Requires variables total_row and total_column to be set up
-    ehm_plate.x_corner and y_corner need to be reset after use of function"""
-    column = 0
-    row = 0
+    Requires variables total_row and total_column to be set up, or wells"""
     tip_content = 0
-    while row < total_row:
-        while column < total_column:
-            if tip_content < volume:
-                p.move_xy(containers.medium_x, containers.y_corner)
-                suck(p, 1000, containers.remove_height)
-                tip_content = 1000
-            else:
-                pass
-            p.move_xy(ehm_plate.x_corner, ehm_plate.y_corner)
-            spit(p, volume, fill_height)
-            ehm_plate.y_corner = ehm_plate.y_corner + 9
-            column = column + 1
-            tip_content = tip_content - volume
-        column = 0
-        ehm_plate.y_corner = ehm_plate.y_corner - total_column * 9
-        row = row + 1
-        ehm_plate.x_corner = ehm_plate.x_corner + ehm_plate.x_step
+    for x, y in well_positions(ehm_plate, ehm_plate.x_corner, ehm_plate.y_corner, total_row, total_column, wells):
+        if tip_content < volume:
+            move_to_reservoir(p, containers.medium_x, containers.y_corner)
+            suck(p, 1000 - tip_content, containers.remove_height)
+            tip_content = 1000
+        p.move_xy(x, y)
+        spit(p, volume, fill_height)
+        tip_content = tip_content - volume
     print("Filled all wells with medium")
 
 
+@traced()
 def fill(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone, stock_x, total_row: float, total_column: float,
-         volume: float, fill_height: float, start_x=None, start_y=None):
+         volume: Union[float, Dict[Tuple[int, int], float]], fill_height: float, start_x=None, start_y=None,
+         wells: Optional[WellSet] = None):
     """
     Fills medium of specified volume to all wells on 48well plate, right to left; includes tip drop at end
-    ehm_plate.x_corner and y_corner need to be reset after use of function
     :param stock_x: location of stock container, any class
     :param total_row: total length of a row (in wells)
     :param total_column: total length of a column (in wells)
-    :param volume: volume to be filled
+    :param volume: volume to be filled, or (col, row) -> volume per well, filled in the order of the dict
+        unless wells is given
     :param fill_height: height of EHM plate
     :param start_x: default = ehm_plate_x.corner, skip columns to start of fill
     :param start_y: default = ehm_plate_y.corner, skip rows to start of fill
+    :param wells: default = None, WellSet to process instead of total_row x total_column
     """
-    column = 0
-    row = 0
     tip_content = 0
     start_x = start_x or ehm_plate.x_corner 
     start_y = start_y or ehm_plate.y_corner
+    if wells is None:
+        if isinstance(volume, dict):
+            wells = list(volume)
+        else:
+            wells = WellSet.block(math.ceil(total_row), math.ceil(total_column))
     pick_next_tip(p, pipette_tips)
-    while row < total_row:
-        while column < total_column:
-            if tip_content < volume:
-                p.move_x(stock_x)
-                p.move_y(containers.y_corner)
-                suck(p, 1000, 85)
-                tip_content = 1000
-            else:
-                pass
-            p.move_xy(start_x, start_y)
-            spit(p, volume, fill_height)
-            start_y = start_y + ehm_plate.y_step
-            column = column + 1
-            tip_content = tip_content - volume
-        column = 0
-        start_y = start_y - total_column * 9
-        row = row + 1
-        start_x = start_x + ehm_plate.x_step
+    for well, (x, y) in zip(wells, well_positions(ehm_plate, start_x, start_y, total_row, total_column, wells)):
+        well_volume = volume[well] if isinstance(volume, dict) else volume
+        if tip_content < well_volume:
+            p.move_x(stock_x)
+            p.move_y(containers.y_corner)
+            metrics.inc("biohit_reservoir_trips_total")
+            suck(p, 1000 - tip_content, 85)
+            tip_content = 1000
+        p.move_xy(x, y)
+        spit(p, well_volume, fill_height)
+        tip_content = tip_content - well_volume
     p.move_z(0)
     discard_tips(p, containers, tip_dropzone)
-    print(f"Filled all wells with {volume} ul medium")
+    print(f"Filled {len(wells)} wells with {'mapped' if isinstance(volume, dict) else volume} ul medium")
 
 
+@traced()
 def dilute(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone, total_row: float, total_column: float,
-           volume: float, fill_height: float):
+           volume: float, fill_height: float, wells: Optional[WellSet] = None):
     """
     Single channel, removes specified volume and replaces it with the same amount from the medium container
     Calibrated onto corner ledge of EHM plate to leave 200ul liquid behind
@@ -266,132 +269,189 @@ def dilute(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone, total
     :param total_column: total length of a column (in wells)
     :param volume: volume to be exchanged
     :param fill_height: height of EHM plate
+    :param wells: default = None, WellSet to process instead of total_row x total_column
     """
     pick_next_tip(p, pipette_tips)
-    column = 0
-    row = 0
     tip_content = 0
-    while row < total_row:
-        while column < total_column:
-            if 1000 - tip_content < volume:
-                p.move_xy(containers.waste_x, containers.y_corner)
-                spit_all(p, 60)
-                tip_content = 0
-            else:
-                pass
-            p.move_xy(ehm_plate.x_tight, ehm_plate.y_tight)
-            suck(p, volume, fill_height)
-            tip_content = tip_content + volume
-            ehm_plate.y_tight = ehm_plate.y_tight + 9
-            column = column + 1
-        column = 0
-        ehm_plate.y_tight = ehm_plate.y_tight - total_column * 9
-        row = row + 1
-        ehm_plate.x_tight = ehm_plate.x_tight + ehm_plate.x_step
+    for x, y in well_positions(ehm_plate, ehm_plate.x_tight, ehm_plate.y_tight, total_row, total_column, wells):
+        if 1000 - tip_content < volume:
+            move_to_reservoir(p, containers.waste_x, containers.y_corner)
+            spit_all(p, 60)
+            tip_content = 0
+        p.move_xy(x, y)
+        suck(p, volume, fill_height)
+        tip_content = tip_content + volume
     p.move_z(0)
     discard_tips(p, containers, tip_dropzone)
     pick_next_tip(p, pipette_tips)
-    column = 0
-    row = 0
     tip_content = 0
-    while row < total_row:
-        while column < total_column:
-            if tip_content < volume:
-                p.move_xy(containers.medium_x, containers.y_corner)
-                suck(p, 1000, 85)
-                tip_content = 1000
-            else:
-                pass
-            p.move_xy(ehm_plate.x_corner, ehm_plate.y_corner)
-            spit(p, volume, fill_height - 2)
-            ehm_plate.y_corner = ehm_plate.y_corner + 9
-            column = column + 1
-            tip_content = tip_content - volume
-        column = 0
-        ehm_plate.y_corner = ehm_plate.y_corner - total_column * 9
-        row = row + 1
-        ehm_plate.x_corner = ehm_plate.x_corner + ehm_plate.x_step
+    for x, y in well_positions(ehm_plate, ehm_plate.x_corner, ehm_plate.y_corner, total_row, total_column, wells):
+        if tip_content < volume:
+            move_to_reservoir(p, containers.medium_x, containers.y_corner)
+            suck(p, 1000 - tip_content, 85)
+            tip_content = 1000
+        p.move_xy(x, y)
+        spit(p, volume, fill_height - 2)
+        tip_content = tip_content - volume
     discard_tips(p, containers, tip_dropzone)
     print(f"Diluted medium in wells {volume}ul to 200ul remaining")
 
 
+def well_positions(ehm_plate: EHMPlatePos, x_corner: float, y_corner: float, total_row: float, total_column: float,
+                   wells: Union[WellSet, List[Tuple[int, int]], None] = None):
+    """
+    Precomputed (x, y) positions for the single channel routines
+    :param x_corner: x of the first row of wells (column 6), e.g. ehm_plate.x_corner or ehm_plate.x_tight
+    :param y_corner: y of the first well in a row
+    :param wells: default = None, all wells of the first total_row x total_column block,
+        a list of (col, row) is visited in its own order
+    """
+    if wells is None:
+        wells = WellSet.block(math.ceil(total_row), math.ceil(total_column))
+    return well_coordinates(wells, x_corner, y_corner, ehm_plate.x_step, ehm_plate.y_step)
+
+
+def column_list(cols) -> List[int]:
+    """
+    Columns for the multichannel routines in the given order
+    :param cols: list of column numbers, number of columns (6 -> 1..6) or WellSet of full columns,
+        None for all columns starting with column 6
+    """
+    if cols is None:
+        return list(range(COLS, 0, -1))
+    if isinstance(cols, WellSet):
+        return cols.multichannel_columns()
+    if isinstance(cols, int):
+        return list(range(1, cols + 1))
+    return list(cols)
+
+
+@traced()
 def change_medium_multi(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone,
-                        volume: float, height: float, bChangeTips=1):
+                        volume: float, height: float, bChangeTips=1, cols=None, medium=None):
     """
     :param p: Pipettor, multichannel= True
     :param volume: the volume to change per well
-    :param x: the well x position
+    :param cols: default = None, all columns; list of columns or WellSet of full columns
+    :param medium: x position of the medium or reagent name, default: see medium_source()
+    The removed medium goes to the nearest waste, see waste_location()
+    With pipette_tips.planner set, tips are changed by the planner: after touching the cells of a well
+    and before going back to the medium
     """
+    planner = pipette_tips.planner
+    medium = medium_source(containers, medium)
     tip_content = 0
+    cols = column_list(cols)
     p.move_y(ehm_plate.y_corner_multi)
-    for i in range(6):
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner_multi + i * ehm_plate.x_step
+        if planner is not None:
+            transfer = Transfer(planner.well_group(col), "waste", volume, contact=True)
+            if ensure_tips_multi(p, containers, pipette_tips, transfer, tip_content, x_pos, ehm_plate.y_corner_multi):
+                tip_content = 0
         if 1000 - tip_content < volume:
-            p.move_xy(containers.waste_x, containers.y_corner)
+            waste = waste_location(containers, tip_content, x_pos, ehm_plate.y_corner_multi)
+            move_to_reservoir(p, waste.x, waste.y)
             spit(p, tip_content, 70)
             tip_content = 0
         else:
             pass
-        p.move_xy(ehm_plate.x_corner_multi + i * ehm_plate.x_step, ehm_plate.y_corner_multi)
+        p.move_xy(x_pos, ehm_plate.y_corner_multi)
         suck(p, volume, height)
         tip_content = tip_content + volume
-        print(f"Removed medium from column {i + 1}")
-    discard_tips(p, containers, tip_dropzone)
-    p.move_y(pipette_tips.y_corner_multi)
-    pick_multi_tips(p, pipette_tips)
+    if planner is None:
+        discard_tips(p, containers, tip_dropzone, tip_content)
+        p.move_y(pipette_tips.y_corner_multi)
+        pick_tip_multi(p, pipette_tips)
+    elif cols:
+        blow_out_multi(p, containers, tip_content, x_pos, ehm_plate.y_corner_multi)
     tip_content = 0
-    for i in range(6):
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner_multi + i * ehm_plate.x_step
         if tip_content < volume:
-            p.move_xy(containers.medium_x, containers.y_corner)
-            suck(p, 1000, 100)
+            if planner is not None:
+                # the medium is dispensed into the liquid of the wells
+                transfer = Transfer(medium, col, volume, contact=True)
+                y_pos = ehm_plate.y_corner_multi
+                if ensure_tips_multi(p, containers, pipette_tips, transfer, tip_content, x_pos, y_pos):
+                    tip_content = 0
+            source = stock_location(containers, medium, 1000 - tip_content, x_pos, ehm_plate.y_corner_multi)
+            move_to_reservoir(p, source.x, source.y)
+            suck(p, 1000 - tip_content, 100)
             tip_content = 1000
-        p.move_xy(ehm_plate.x_corner_multi + i * ehm_plate.x_step, ehm_plate.y_corner_multi)
+        p.move_xy(x_pos, ehm_plate.y_corner_multi)
         spit(p, volume, height - 3)
         tip_content = tip_content - volume
-        print(f"Changed medium for column {i + 1}")
     print("Finished medium change")
 
 
+@traced()
 def dilute_multi(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone, 
-                volume: float, height: float, bChangeTips=1):
+                volume: float, height: float, bChangeTips=1, cols=None, medium=None):
     """
     Replaces set volume in a well with medium from any container type with medium_x
+    The removed medium goes to the nearest waste, see waste_location()
     Changes tips between operations
     :param p: Pipettor, multichannel= True
     :param ehm_plate: Position of ehmPlate
     :param containers: Position of container rack
     :param volume: volume to be exchanged
     :param height: height of EHM plate
-    :param bChangeTips: default = TRUE, Keep Tips or not
+    :param bChangeTips: default = TRUE, Keep Tips or not, ignored if pipette_tips.planner is set
+    :param cols: default = None, all columns; list of columns or WellSet of full columns
+    :param medium: x position of the medium or reagent name, default: see medium_source()
     """
+    planner = pipette_tips.planner
+    medium = medium_source(containers, medium)
+    change_tips = bChangeTips and planner is None
     tip_content = 0
-    if bChangeTips:
+    cols = column_list(cols)
+    if change_tips:
         p.move_y(pipette_tips.y_corner_multi)
-        pick_multi_tips(p, pipette_tips)
+        pick_tip_multi(p, pipette_tips)
         
     p.move_y(ehm_plate.y_corner_multi)
-    for i in range(6):
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner + i * ehm_plate.x_step
+        if planner is not None:
+            transfer = Transfer(planner.well_group(col), "waste", volume, contact=True)
+            if ensure_tips_multi(p, containers, pipette_tips, transfer, tip_content, x_pos, ehm_plate.y_corner_multi):
+                tip_content = 0
         if 1000 - tip_content < volume:
-            p.move_xy(containers.waste_x, containers.y_corner)
+            waste = waste_location(containers, tip_content, x_pos, ehm_plate.y_corner_multi)
+            move_to_reservoir(p, waste.x, waste.y)
             spit(p, tip_content, 70)
             tip_content = 0
         else:
             pass
-        p.move_xy(ehm_plate.x_corner + i * ehm_plate.x_step, ehm_plate.y_corner_multi)
+        p.move_xy(x_pos, ehm_plate.y_corner_multi)
         suck(p, volume, height)  # 62 on low deck
         tip_content = tip_content + volume
     
-    if bChangeTips:
-        discard_tips(p, containers, tip_dropzone)
+    if change_tips:
+        discard_tips(p, containers, tip_dropzone, tip_content)
+    elif planner is not None and cols:
+        blow_out_multi(p, containers, tip_content, x_pos, ehm_plate.y_corner_multi)
     
-    for i in range(6):
-        if bChangeTips:
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner + i * ehm_plate.x_step
+        if change_tips:
             p.move_y(pipette_tips.y_corner_multi)
-            pick_multi_tips(p, pipette_tips)
-        p.move_xy(containers.medium_x, containers.y_corner)
+            pick_tip_multi(p, pipette_tips)
+        if planner is not None:
+            # the medium is dispensed into the liquid of the well
+            transfer = Transfer(medium, col, volume, contact=True)
+            ensure_tips_multi(p, containers, pipette_tips, transfer, 0, x_pos, ehm_plate.y_corner_multi)
+        source = stock_location(containers, medium, volume, x_pos, ehm_plate.y_corner_multi)
+        move_to_reservoir(p, source.x, source.y)
         suck(p, volume, 100)
-        p.move_xy(ehm_plate.x_corner + i * ehm_plate.x_step, ehm_plate.y_corner_multi)
+        p.move_xy(x_pos, ehm_plate.y_corner_multi)
         spit(p, volume, height - 2) 
-        if bChangeTips:
+        if change_tips:
             discard_tips(p, containers, tip_dropzone)
     p.move_z(0)
     print(f"Filled all columns with {volume}ul medium ti 200ul remaining")
@@ -399,14 +459,18 @@ def dilute_multi(p: Pipettor, ehm_plate, containers, pipette_tips, tip_dropzone,
 
 #fill_multi(p, ehm_plate, containers, pipette_tips, tip_dropzone, containers.well5_x, 6, 
 #            volume, 48, None, None, bChangeTips)  # 1.973mM
-def fill_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipette_tips, stock_x, cols: List[float], volume: float):
+@traced()
+def fill_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipette_tips, stock_x: Union[float, str],
+               cols: Union[List[float], int, WellSet], volume: Union[float, Dict[int, float]]):
     """
     Using multichannel ,fills specified amount of volume into specified columns at desired height
     :param p: Pipettor, multichannel
 
-    :param stock_x: location of stock, give full location of reservoir
+    :param stock_x: location of stock, give full location of reservoir,
+        or the reagent name if containers.reagents is set, each refill then uses the nearest well with enough left
+    :param cols: columns in the order to fill, number of columns or WellSet of full columns
     :param total_row: total length of column (nr in wells)
-    :param volume:
+    :param volume: volume per well, or column -> volume
     :param fill_height:
     :param start_x: default = ehm_plate.x_corner, skip columns to start of fill
     :param start_y: default = ehm_plate.y_corner_multi, NOT advised to change
@@ -414,123 +478,283 @@ def fill_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipe
     :return:
     """
     tip_content = 0
+    cols = column_list(cols)
 
-    if pipette_tips.change_tips :
-        pick_multi_tips(p, pipette_tips)
+    if pipette_tips.planner is None and pipette_tips.change_tips:
+        pick_tip_multi(p, pipette_tips)
         
+    stock = None
     for col in cols:
-        if tip_content < volume:
-            p.move_x(stock_x)
-            p.move_y(containers.y_corner)
-            suck(p, 1000, containers.remove_height)
+        x_pos = ehm_plate.x_corner + (ehm_plate.cols - col) * ehm_plate.x_step
+        col_volume = volume[col] if isinstance(volume, dict) else volume
+        if tip_content < col_volume:
+            if pipette_tips.planner is not None:
+                transfer = Transfer(stock_x, col, col_volume)
+                y_pos = ehm_plate.y_corner_multi
+                if ensure_tips_multi(p, containers, pipette_tips, transfer, tip_content, x_pos, y_pos):
+                    tip_content = 0
+            stock = stock_location(containers, stock_x, 1000 - tip_content, x_pos, ehm_plate.y_corner_multi)
+            p.move_x(stock.x)
+            p.move_y(stock.y)
+            metrics.inc("biohit_reservoir_trips_total")
+            suck(p, 1000 - tip_content, containers.remove_height)
             tip_content = 1000
         else:
             pass
+        p.move_xy(x_pos, ehm_plate.y_corner_multi)
+        spit(p, col_volume, ehm_plate.add_height)
+        tip_content = tip_content - col_volume
+    p.move_z(0)
+    if stock is not None:
+        move_to_reservoir(p, stock.x, stock.y)
+        spit_all(p, containers.add_height)
+        stock.put(MULTICHANNEL * tip_content)
+    if pipette_tips.planner is None and pipette_tips.change_tips:
+        drop_multi_tips(p, pipette_tips)
+    p.move_z(0)
+
+
+@traced()
+def fill_mixture_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipette_tips,
+                       stocks: List[Tuple[Union[float, str], float]], cols: Union[List[float], int, WellSet],
+                       air_gap: float = 10, tip_volume: float = 1000):
+    """
+    Using multichannel, fills a mixture of several stocks into the specified columns in one pass
+    For every column the stocks are aspirated one after another into the same tips, each followed by an
+    air gap, and dispensed together into the column
+    :param p: Pipettor, multichannel
+    :param stocks: (stock, volume per well) in aspiration order, stock as for fill_multi
+        (x position of the reservoir or reagent name with containers.reagents)
+    :param cols: columns in the order to fill, number of columns or WellSet of full columns
+    :param air_gap: air aspirated after each stock, keeps the liquids apart in the tip
+    :param tip_volume: capacity of the tips, liquid and air gaps together have to fit
+    """
+    if not stocks:
+        raise ValueError("No stocks given for the mixture")
+    load = sum(volume for _, volume in stocks) + air_gap * len(stocks)
+    if load > tip_volume:
+        raise ValueError(f"Mixture needs {load}ul including air gaps, tips hold {tip_volume}ul")
+    cols = column_list(cols)
+    mixture = tuple(stock for stock, _ in stocks)
+
+    if pipette_tips.planner is None and pipette_tips.change_tips:
+        pick_tip_multi(p, pipette_tips)
+
+    for col in cols:
         x_pos = ehm_plate.x_corner + (ehm_plate.cols - col) * ehm_plate.x_step
+        if pipette_tips.planner is not None:
+            transfer = Transfer(mixture, col, load)
+            ensure_tips_multi(p, containers, pipette_tips, transfer, 0, x_pos, ehm_plate.y_corner_multi)
+        for stock_x, volume in stocks:
+            stock = stock_location(containers, stock_x, volume, x_pos, ehm_plate.y_corner_multi)
+            p.move_x(stock.x)
+            p.move_y(stock.y)
+            metrics.inc("biohit_reservoir_trips_total")
+            suck(p, volume, containers.remove_height)
+            p.aspirate(air_gap)
         p.move_xy(x_pos, ehm_plate.y_corner_multi)
-        spit(p, volume, ehm_plate.add_height)
-        tip_content = tip_content - volume
+        spit_all(p, ehm_plate.add_height)
     p.move_z(0)
-    p.move_xy(stock_x, containers.y_corner)
-    spit_all(p, containers.add_height)
-    if pipette_tips.change_tips:
+    if pipette_tips.planner is None and pipette_tips.change_tips:
         drop_multi_tips(p, pipette_tips)
     p.move_z(0)
+    mix = ", ".join(f"{volume}ul {stock}" for stock, volume in stocks)
+    print(f"Filled {len(cols)} columns with mixture of {mix}")
 
 
-def remove_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipette_tips,  cols: List[float] , volume: float):
+@traced()
+def remove_multi(p: Pipettor, ehm_plate: EHMPlatePos, containers: Reservoirs, pipette_tips,
+                 cols: Union[List[float], int, WellSet], volume: float):
     """Removes medium from whole 48well plate
     Adjustments possible by altering total number of columns and rows
     :param total_row: total length of a row (in wells)
     :param total_column: total length of a column (in wells)
     :param height: height of EHM plate, mind sufficient distance from plate floor
     :param volume: amount ot be removed
+    :param cols: columns in the order to empty, number of columns or WellSet of full columns
     :param start_x: default = ehm_plate_x.corner, skip columns to start of fill
     :param start_y: default = ehm_plate_y.corner, skip columns to start of fill
     :param bChangeTips: default = TRUE, Keep Tips or not
     """
-    print(f"x corner {ehm_plate.x_corner} and step {ehm_plate.x_step}")
-
-    for col in cols:
-        print(f"do col {col}")
-        x_col = ehm_plate.cols - col
-        x_pos = ehm_plate.x_corner + (x_col * ehm_plate.x_step)
-        print(f"move to col {x_col} of {ehm_plate.cols} mm {x_pos} and y_mm{ehm_plate.y_corner_multi}")
-
-
-
+    cols = column_list(cols)
     tip_content = 0
+    x_pos = ehm_plate.x_corner
 
-    if pipette_tips.change_tips:
-        pick_multi_tips(p, pipette_tips)
+    if pipette_tips.planner is None and pipette_tips.change_tips:
+        pick_tip_multi(p, pipette_tips)
     
     for col in cols:
+        x_col =ehm_plate.cols - col
+        x_pos =ehm_plate.x_corner + (x_col * ehm_plate.x_step)
+        if pipette_tips.planner is not None:
+            transfer = Transfer(pipette_tips.planner.well_group(col), "waste", volume, contact=True)
+            if ensure_tips_multi(p, containers, pipette_tips, transfer, tip_content, x_pos, ehm_plate.y_corner_multi):
+                tip_content = 0
         if 1000 - tip_content < volume:
-            p.move_xy(containers.waste_x, containers.y_corner)
+            waste = waste_location(containers, tip_content, x_pos, ehm_plate.y_corner_multi)
+            move_to_reservoir(p, waste.x, waste.y)
             spit(p, tip_content, containers.add_height)
             tip_content = 0
         else:
             pass
         p.move_z(0)
-        x_col =ehm_plate.cols - col
-        x_pos =ehm_plate.x_corner + (x_col * ehm_plate.x_step)
-        print(f"move to col {x_col} of {ehm_plate.cols} mm {x_pos} and y_mm{ehm_plate.y_corner_multi}")
         p.move_xy(x_pos, ehm_plate.y_corner_multi)
         suck(p, volume, ehm_plate.remove_height)
         tip_content = tip_content + volume
 
     p.move_z(0)
-    p.move_xy(containers.waste_x, containers.y_corner)
+    waste = waste_location(containers, tip_content, x_pos, ehm_plate.y_corner_multi)
+    move_to_reservoir(p, waste.x, waste.y)
     spit(p, tip_content, containers.add_height)    
     print(f"Removed {volume} ul medium from plate")
-    if pipette_tips.change_tips:
+    if pipette_tips.planner is None and pipette_tips.change_tips:
         drop_multi_tips(p,pipette_tips)
         
     
+def stock_location(containers, stock: Union[float, str], volume: float, x: float, y: float) -> Location:
+    """
+    Where to aspirate volume per channel of stock before dispensing at (x, y)
+    :param stock: x position of the stock well, or a reagent name routed via containers.reagents
+    """
+    if not isinstance(stock, str):
+        return Location(stock, containers.y_corner)
+    if getattr(containers, "reagents", None) is None:
+        raise ValueError(f"Stock {stock!r} given by name, but no reagent map is set on the containers")
+    return containers.reagents.take(stock, MULTICHANNEL * volume, x, y)
+
+
+def medium_source(containers, medium: Union[float, str, None] = None) -> Union[float, str]:
+    """The medium to use: medium if given, else the "medium" of containers.reagents, else containers.medium_x"""
+    if medium is not None:
+        return medium
+    reagents = getattr(containers, "reagents", None)
+    if reagents is None or "medium" not in reagents.locations:
+        return containers.medium_x
+    return "medium"
+
+
+def waste_location(containers, volume: float, x: float, y: float) -> Location:
+    """Nearest waste with room for volume per channel, containers.waste_x without a reagent map"""
+    reagents = getattr(containers, "reagents", None)
+    if reagents is None or "waste" not in reagents.locations:
+        return Location(containers.waste_x, containers.y_corner)
+    return reagents.put("waste", MULTICHANNEL * volume, x, y)
+
+
+@traced()
 def drop_multi_tips(p: Pipettor, pipette_tips: PipetteTips):
     p.move_z(0)
-    p.move_xy(pipette_tips.drop_x, pipette_tips.drop_y)
+    p.move_xy(pipette_tips.x_drop, pipette_tips.y_drop)
     p.eject_tip()
+
+
+@traced()
+def ensure_tips_multi(p: Pipettor, containers, pipette_tips: PipetteTips, transfer: Transfer, content: float = 0,
+                      x: Optional[float] = None, y: Optional[float] = None) -> bool:
+    """
+    Changes the multichannel tips only if pipette_tips.planner reports possible cross-contamination
+    Remaining liquid is blown out into the waste before the tips are dropped
+    :param transfer: the upcoming transfer, tagged with its source and destination
+    :param content: volume per channel still in the tips, booked in the waste
+    :param x: position of the head, for the nearest waste, default: containers.waste_x
+    :param y: default: containers.y_corner
+    :return: True if the tips were changed
+    """
+    planner = pipette_tips.planner
+    change = planner.needs_change(transfer)
+    if change and planner.has_tip:
+        blow_out_multi(p, containers, content, x, y)
+        drop_multi_tips(p, pipette_tips)
+        planner.drop_tip()
+    if change:
+        pick_tip_multi(p, pipette_tips)
+    planner.use(transfer)
+    return change
+
+
+@traced()
+def release_tips_multi(p: Pipettor, containers, pipette_tips: PipetteTips, content: float = 0):
+    """
+    Blows out and drops the tips kept by pipette_tips.planner at the end of a run
+    :param content: volume per channel still in the tips, booked in the waste
+    """
+    if pipette_tips.planner is not None and pipette_tips.planner.has_tip:
+        blow_out_multi(p, containers, content)
+        drop_multi_tips(p, pipette_tips)
+        pipette_tips.planner.drop_tip()
        
-def replace_multi(p: Pipettor, ehm_plate, reservoirs, pipette_tips, tip_dropzone, stock, volume, height=58):
+@traced()
+def replace_multi(p: Pipettor, ehm_plate, reservoirs, pipette_tips, tip_dropzone, stock, volume, height=58, cols=None):
     """
     replacing given volumes in a well using the multichannel head
     :param p: Pipettor parent class
     :param stock: location in Containers
     :param bChangeTips: default = TRUE, Keep Tips or not
+    :param cols: default = None, all columns; list of columns or WellSet of full columns
     needs list supplying volumes to exchange
     includes 2min waiting time
+    With pipette_tips.planner set, the planner changes the tips after every well instead of change_tips
     """
+    planner = pipette_tips.planner
+    change_tips = pipette_tips.change_tips and planner is None
+    if change_tips:
+        pick_tip_multi(p, pipette_tips)
     
-    if pipette_tips.change_tips:
-        pick_multi_tips(p, pipette_tips)
-    
+    cols = column_list(cols)
     p.move_y(ehm_plate.y_corner)          
         
-    for i in range(6):
-        p.move_x(ehm_plate.x_corner + i * ehm_plate.x_step)
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner + i * ehm_plate.x_step
+        if planner is not None:
+            transfer = Transfer(planner.well_group(col), "waste", volume, contact=True)
+            ensure_tips_multi(p, reservoirs, pipette_tips, transfer, 0, x_pos, ehm_plate.y_corner)
+            p.move_y(ehm_plate.y_corner)
+        p.move_x(x_pos)
         suck(p, volume, ehm_plate.remove_height)
         p.move_x(reservoirs.waste_x)
+        metrics.inc("biohit_reservoir_trips_total")
         spit_all(p, 60)
     
-    if bChangeTips:
+    if change_tips:
         p.move_xy(tip_dropzone.x_corner, tip_dropzone.y_corner)
         p.eject_tip()
         p.move_y(pipette_tips.y_corner)
-        pick_multi_tips(p, pipette_tips)
+        pick_tip_multi(p, pipette_tips)
     
-    for i in range(6):
-        p.move_xy(stock, reservoirs.y_corner)
+    for col in cols:
+        i = ehm_plate.cols - col
+        x_pos = ehm_plate.x_corner + i * ehm_plate.x_step
+        if planner is not None:
+            # dispensed at the height of the liquid in the well
+            transfer = Transfer(stock, col, volume, contact=True)
+            ensure_tips_multi(p, reservoirs, pipette_tips, transfer, 0, x_pos, ehm_plate.y_corner)
+        move_to_reservoir(p, stock, reservoirs.y_corner)
         suck(p, volume, 85)
-        p.move_x(ehm_plate.x_corner + i * ehm_plate.x_step)
+        p.move_x(x_pos)
         spit(p, volume, 58)
     
-    if pipette_tips.change_tips:
+    if change_tips:
         p.move_xy(tip_dropzone.x_corner, tip_dropzone.y_corner)
         p.move_z(70)    
         p.eject_tip()
         
-    time.sleep(120)
+    clock.sleep(120, "replace_multi incubation")
+
+
+def blow_out_multi(p: Pipettor, containers, content: float = 0, x: Optional[float] = None, y: Optional[float] = None):
+    """Empties the tips into the waste nearest to (x, y), see waste_location()"""
+    if x is None:
+        x, y = containers.waste_x, containers.y_corner
+    waste = waste_location(containers, content, x, y)
+    move_to_reservoir(p, waste.x, waste.y)
+    spit_all(p, containers.add_height)
+
+
+def move_to_reservoir(p: Pipettor, x: float, y: float):
+    """Moves to a stock or waste reservoir, counted as reservoir trip in the run metrics"""
+    p.move_xy(x, y)
+    metrics.inc("biohit_reservoir_trips_total")
 
 
 def suck(p: Pipettor, volume: float, height: float):
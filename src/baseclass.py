@@ -1,4 +1,7 @@
 import ctypes  # An included library with Python install.
+import sys
+
+from . import prompts
 
 class Baseclass:
     """ Base Class for all"""
@@ -21,7 +24,15 @@ class Baseclass:
         4 : Yes | No
         5 : Retry | Cancel 
         6 : Cancel | Try Again | Continue
+        Returns the MessageBoxW code of the button. Off Windows, or once prompts.use_queue() was called,
+        the prompt goes through the operator prompt queue, still blocking; use prompts.get_queue().ask()
+        and defer() to keep the protocol running meanwhile
         """
+        if sys.platform != "win32" or prompts.has_queue():
+            queue = prompts.get_queue()
+            prompt = queue.ask(text, title, style)
+            queue.wait(prompt.key)
+            return prompt.result(0)
         return ctypes.windll.user32.MessageBoxW(0, text, title, style)
     
     
@@ -0,0 +1,131 @@
+"""
+Deck calibration
+Fits an affine XY transform plus a tilted Z plane from the nominal reference points of the deck
+(Deck._refPosition) to where they were measured on the device. The fit is cached on disk and applied
+to whole coordinate tables at once, so nothing is corrected per move at run time.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from envs import env
+
+_calibration_env: str = "DECK_CALIBRATION"
+_calibration_file = Path.home() / ".biohit_deck_calibration.json"
+
+
+def calibration_path(path=None) -> Path:
+    """Cache file, default from env DECK_CALIBRATION"""
+    if path is None and env(_calibration_env) is not None:
+        path = env(_calibration_env)
+    return Path(path) if path is not None else _calibration_file
+
+
+def _key(nominal: Dict[str, Sequence[float]], measured: Dict[str, Sequence[float]]) -> str:
+    data = json.dumps([sorted(nominal.items()), sorted(measured.items())])
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+class Calibration:
+    """
+    Maps nominal deck coordinates to device coordinates
+    x' = M[0] . (x, y, 1), y' = M[1] . (x, y, 1), z' = z + tilt . (x, y, 1)
+    :param matrix: 2x3 affine matrix of the XY transform
+    :param tilt: (a, b, c) of the Z offset plane a*x + b*y + c
+    :param residual: RMS distance (mm) of the reference points after the fit
+    """
+
+    def __init__(self, matrix=None, tilt=None, residual: float = 0.0, key: str = ""):
+        self.matrix = np.eye(2, 3) if matrix is None else np.asarray(matrix, dtype=float)
+        self.tilt = np.zeros(3) if tilt is None else np.asarray(tilt, dtype=float)
+        self.residual = residual
+        self.key = key
+
+    @classmethod
+    def fit(cls, nominal: Dict[str, Sequence[float]], measured: Dict[str, Sequence[float]]) -> "Calibration":
+        """
+        Least squares fit over the reference points present in both tables, at least three not on one line
+        :param nominal: name -> (x, y, z) as on the drawing, e.g. Deck._refPosition
+        :param measured: name -> (x, y, z) where the head was jogged to on the device
+        """
+        names = sorted(set(nominal) & set(measured))
+        if len(names) < 3:
+            raise ValueError(f"Need at least 3 reference points measured, got {names}")
+        src = np.array([nominal[name] for name in names], dtype=float)
+        dst = np.array([measured[name] for name in names], dtype=float)
+        design = np.column_stack([src[:, 0], src[:, 1], np.ones(len(names))])
+        if np.linalg.matrix_rank(design) < 3:
+            raise ValueError("Reference points lie on one line, the transform is not determined")
+
+        solution = np.linalg.lstsq(design, dst[:, :2], rcond=None)[0]
+        tilt = np.linalg.lstsq(design, dst[:, 2] - src[:, 2], rcond=None)[0]
+        calibration = cls(solution.T, tilt, key=_key(nominal, measured))
+        error = calibration.apply(src) - dst
+        calibration.residual = float(np.sqrt(np.mean(np.sum(error**2, axis=1))))
+        return calibration
+
+    def apply(self, points) -> np.ndarray:
+        """
+        Transforms an array of points, shape (..., 2) for XY or (..., 3) for XYZ
+        """
+        points = np.asarray(points, dtype=float)
+        homogeneous = np.concatenate([points[..., :2], np.ones(points.shape[:-1] + (1,))], axis=-1)
+        xy = homogeneous @ self.matrix.T
+        if points.shape[-1] == 2:
+            return xy
+        z = points[..., 2] + homogeneous @ self.tilt
+        return np.concatenate([xy, z[..., None]], axis=-1)
+
+    def offset(self, point: Sequence[float]) -> tuple:
+        """Correction (dx, dy, dz) at a nominal point (x, y) or (x, y, z), for shifting labware placed there"""
+        xyz = np.zeros(3)
+        xyz[: len(point)] = point
+        return tuple(float(v) for v in self.apply(xyz) - xyz)
+
+    def apply_table(self, table: Dict[str, Sequence[float]]) -> Dict[str, tuple]:
+        """Transforms a coordinate table such as Deck._deckPosition in one vectorized call"""
+        if not table:
+            return {}
+        names = list(table)
+        widths = {len(table[name]) for name in names}
+        if len(widths) != 1:
+            raise ValueError("All coordinates of a table need the same number of axes")
+        result = self.apply(np.array([table[name] for name in names], dtype=float))
+        return {name: tuple(float(v) for v in row) for name, row in zip(names, result)}
+
+    def save(self, path=None):
+        path = calibration_path(path)
+        data = {"matrix": self.matrix.tolist(), "tilt": self.tilt.tolist(), "residual": self.residual, "key": self.key}
+        path.write_text(json.dumps(data, indent=2))
+
+    @classmethod
+    def load(cls, path=None) -> Optional["Calibration"]:
+        try:
+            data = json.loads(calibration_path(path).read_text())
+        except (OSError, ValueError):
+            return None
+        return cls(data["matrix"], data["tilt"], data.get("residual", 0.0), data.get("key", ""))
+
+    def __repr__(self) -> str:
+        return f"Calibration(residual={self.residual:.3f}mm)"
+
+
+def calibrate(nominal: Dict[str, Sequence[float]], measured: Dict[str, Sequence[float]], path=None) -> Calibration:
+    """
+    Cached calibration for these reference points, fitted and saved only if the cache is for other points
+    """
+    cached = Calibration.load(path)
+    if cached is not None and cached.key == _key(nominal, measured):
+        return cached
+    calibration = Calibration.fit(nominal, measured)
+    calibration.save(path)
+    print(f"Fitted deck calibration, residual {calibration.residual:.3f}mm, saved to {calibration_path(path)}")
+    return calibration
+
+
+def record_reference(p, name: str, measured: Dict[str, list]) -> Dict[str, list]:
+    """Stores the current head position as the measured position of reference point name"""
+    measured[name] = [float(v) for v in p.xyz_position]
+    return measured
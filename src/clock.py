@@ -0,0 +1,110 @@
+"""
+Clock used by the pipetting routines for waiting and timestamps
+The default clock sleeps for real, VirtualClock fast-forwards sleeps for dry runs on the simulator
+"""
+import time
+from typing import List, Optional, Tuple
+
+
+class Clock:
+    """Wall clock, sleep() blocks for the given time"""
+
+    def time(self) -> float:
+        """Seconds since the epoch"""
+        return time.time()
+
+    def sleep(self, seconds: float, label: Optional[str] = None):
+        """Blocks for seconds, counted as idle time in the run metrics"""
+        # metrics imports instrumented, which imports this module
+        from . import metrics
+
+        time.sleep(seconds)
+        metrics.inc("biohit_idle_seconds_total", seconds)
+
+    def mark(self, label: str) -> float:
+        """Returns the current time, the virtual clock additionally records it under label"""
+        return self.time()
+
+
+class VirtualClock(Clock):
+    """
+    Simulated clock, sleep() returns immediately and advances the simulated time
+    Every sleep and mark is recorded, so scheduling and timing windows can be checked after a dry run
+    :param start: simulated start time
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.start = start
+        self._now = start
+        self.events: List[Tuple[float, str]] = []
+
+    def time(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float, label: Optional[str] = None):
+        self.events.append((self._now, label or f"sleep {seconds}s"))
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        """Moves the simulated time forward, e.g. by the estimated duration of a motion"""
+        if seconds < 0:
+            raise ValueError(f"Cannot move clock backwards by {seconds}s")
+        self._now += seconds
+
+    def mark(self, label: str) -> float:
+        self.events.append((self._now, label))
+        return self._now
+
+    @property
+    def elapsed(self) -> float:
+        """Simulated seconds since start"""
+        return self._now - self.start
+
+    def times(self, label: str) -> List[float]:
+        """Simulated timestamps of all events with the given label"""
+        return [t for t, event in self.events if event == label]
+
+    def check_window(self, first: str, second: str, min_seconds: float = 0.0, max_seconds: float = float("inf")):
+        """
+        Raises RuntimeError if the time between each `first` event and the next `second` event is outside the window
+        """
+        seconds = None
+        for t, event in self.events:
+            if event == first:
+                seconds = t
+            elif event == second and seconds is not None:
+                delta = t - seconds
+                if not min_seconds <= delta <= max_seconds:
+                    raise RuntimeError(
+                        f"{delta:.1f}s between '{first}' and '{second}' at {t:.1f}s, "
+                        f"expected {min_seconds}s to {max_seconds}s"
+                    )
+                seconds = None
+
+
+_clock: Clock = Clock()
+
+
+def get_clock() -> Clock:
+    """Returns the clock used by the routines"""
+    return _clock
+
+
+def use_clock(clock: Clock) -> Clock:
+    """
+    Sets the clock used by the routines, returns the previous one
+    Use use_clock(VirtualClock()) before a dry run with the PipettorSimulator
+    """
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def sleep(seconds: float, label: Optional[str] = None):
+    """Sleeps on the current clock"""
+    _clock.sleep(seconds, label)
+
+
+def mark(label: str) -> float:
+    """Records a timestamp on the current clock"""
+    return _clock.mark(label)
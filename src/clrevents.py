@@ -0,0 +1,179 @@
+"""
+Events of the InstrumentLib CLR objects as Python callbacks, threading waits and asyncio futures
+clr_wrapping.ClrObject skips the add_/remove_ members of the wrapped instance, so the events are
+subscribed on the raw CLR object (ClrObject._wrapped_instance) with += as pythonnet expects.
+Handlers run on a .NET thread and are handed over to Python threads or an event loop here.
+"""
+import asyncio
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+
+def unwrap(obj):
+    """Raw CLR instance behind a clr_wrapping.ClrObject (or the object itself)"""
+    while hasattr(obj, "_wrapped_instance"):
+        obj = obj._wrapped_instance
+    return obj
+
+
+def event_names(obj) -> List[str]:
+    """Events of a CLR object, e.g. event_names(instrument.Control)"""
+    return sorted(name[4:] for name in dir(unwrap(obj)) if name.startswith("add_"))
+
+
+class EventBridge:
+    """
+    Subscribes to events of a CLR object and marshals them to Python
+    All handlers are removed again by close()
+    :param obj: InstrumentCls, its Control object or any other (wrapped) CLR object
+    """
+
+    def __init__(self, obj):
+        self.raw = unwrap(obj)
+        self._handlers: List[Tuple[str, Callable]] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _event(self, name: str):
+        if not hasattr(self.raw, f"add_{name}"):
+            raise AttributeError(f"{type(self.raw).__name__} has no event {name}, available: {event_names(self.raw)}")
+        return getattr(self.raw, name)
+
+    def subscribe(self, name: str, callback: Callable[..., Any]) -> Callable:
+        """
+        Calls callback(sender, args) on every event, on the .NET thread that raised it
+        :return: the handler, for unsubscribe()
+        """
+
+        def handler(sender, args):
+            callback(sender, args)
+
+        event = self._event(name)
+        event += handler
+        with self._lock:
+            self._handlers.append((name, handler))
+        return handler
+
+    def unsubscribe(self, name: str, handler: Callable):
+        event = self._event(name)
+        event -= handler
+        with self._lock:
+            self._handlers.remove((name, handler))
+
+    def close(self):
+        with self._lock:
+            handlers, self._handlers = self._handlers, []
+        for name, handler in handlers:
+            event = self._event(name)
+            event -= handler
+
+    def waiter(self, name: str, predicate: Optional[Callable[[Any], bool]] = None) -> "EventWaiter":
+        """
+        Arms a one-shot wait for the next event, create it before sending the command that triggers it
+        :param predicate: only event args for which it returns True complete the wait
+        """
+        return EventWaiter(self, name, predicate)
+
+    def future(
+        self,
+        name: str,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        predicate: Optional[Callable[[Any], bool]] = None,
+    ) -> "asyncio.Future":
+        """
+        Future completed with the args of the next event, resolved on loop via call_soon_threadsafe
+        The handler is removed once the future is done or cancelled
+        :param loop: default: the running loop, so call it from a coroutine or pass the loop
+        """
+        loop = loop or asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(args):
+            if not future.done():
+                future.set_result(args)
+
+        def callback(sender, args):
+            if predicate is not None and not predicate(args):
+                return
+            loop.call_soon_threadsafe(resolve, args)
+
+        # release also runs if the event already resolved the future, no handler is left behind
+        handler = self.subscribe(name, callback)
+
+        def release(_):
+            try:
+                self.unsubscribe(name, handler)
+            except ValueError:
+                pass
+
+        future.add_done_callback(release)
+        return future
+
+
+class EventWaiter:
+    """One-shot wait for an event, see EventBridge.waiter()"""
+
+    def __init__(self, bridge: EventBridge, name: str, predicate: Optional[Callable[[Any], bool]] = None):
+        self.bridge = bridge
+        self.name = name
+        self.predicate = predicate
+        self.args = None
+        self._event = threading.Event()
+        self._handler = bridge.subscribe(name, self._on_event)
+
+    def _on_event(self, sender, args):
+        if self._event.is_set() or (self.predicate is not None and not self.predicate(args)):
+            return
+        self.args = args
+        self._event.set()
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Blocks until the event arrived and returns its args
+        :raise TimeoutError: if it did not arrive within timeout seconds
+        """
+        try:
+            if not self._event.wait(timeout):
+                raise TimeoutError(f"No {self.name} event within {timeout}s")
+            return self.args
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        if self._handler is not None:
+            try:
+                self.bridge.unsubscribe(self.name, self._handler)
+            except ValueError:
+                pass
+            self._handler = None
+
+
+def wait_for_event(instrument, name: str, command: Callable[[], Any], timeout: float = 60, fallback=None):
+    """
+    Runs command (usually with wait=False) and waits for the event signalling its completion instead of
+    polling. Without such an event on the instrument, fallback() is called instead, e.g. Control.WaitArmToStop
+    :return: the result of command
+    """
+    if name not in event_names(instrument):
+        result = command()
+        if fallback is not None:
+            fallback()
+        return result
+    bridge = EventBridge(instrument)
+    waiter = bridge.waiter(name)
+    try:
+        result = command()
+    except BaseException:
+        waiter.cancel()
+        raise
+    if not result:
+        # the command was not accepted, no event will come
+        waiter.cancel()
+        return result
+    waiter.wait(timeout)
+    return result
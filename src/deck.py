@@ -1,5 +1,21 @@
+from typing import Dict, Optional, Sequence
 
+from envs import env
 
+from .calibration import Calibration, calibrate, calibration_path
+
+
+def _axis(name: str) -> Optional[int]:
+    """Axis (0, 1, 2) of a labware coordinate attribute such as x_corner, waste_x or add_height, None for steps etc."""
+    if name.endswith("_step"):
+        return None
+    if name.startswith("x_") or name.endswith("_x"):
+        return 0
+    if name.startswith("y_"):
+        return 1
+    if name.endswith("_height"):
+        return 2
+    return None
 
 
 class Deck:
@@ -14,7 +30,7 @@ class Deck:
 
     if env(lDir) is not None:
         labware_folder= env(lDir)
-    
+
 
 
 
@@ -27,20 +43,69 @@ class Deck:
                         "P2" : [ 26.11,  43.00,  6.80],
                         "P3" : [132.80, 170.50, 41.40]}
 
-    #A1 = (130.5, 0)
-    #A2 = (0, 0)
-    #B1 = (130.5, 42)
+    # corners the labware of action.py is built from,
+    # on bottom plate with thin wells towards back, top right corner of each lot
+    _labwarePosition = {"A1": (130.5,   0), "A2": (0,   0),
+                        "B1": (130.5,  42), "B2": (0,  42),
+                        "C1": (130.5, 140), "C2": (0, 140)}
     B2 = (0, 42)
-    #C1 = (130.5, 140)
-    #C2 = (0, 140)
 
     def __init__(self):
-        
+        self.calibration: Optional[Calibration] = None
+        self.slots: Dict[str, tuple] = {name: tuple(xy) for name, xy in self._deckPosition.items()}
+
+    def calibrate(self, measured: Dict[str, Sequence[float]], path=None) -> Calibration:
+        """
+        Fits (or loads the cached) calibration from the measured reference points P1-P3
+        and transforms all slot positions once
+        :param measured: name -> (x, y, z) of the reference points on the device
+        """
+        self.calibration = calibrate(self._refPosition, measured, path)
+        self.slots = self.calibration.apply_table(self._deckPosition)
+        return self.calibration
+
+    def load_calibration(self, path=None) -> Optional[Calibration]:
+        """
+        Uses the calibration cached by calibrate(), without one the nominal positions are kept
+        """
+        self.calibration = Calibration.load(path)
+        if self.calibration is None:
+            print(f"No deck calibration in {calibration_path(path)}, using nominal labware positions")
+        else:
+            self.slots = self.calibration.apply_table(self._deckPosition)
+        return self.calibration
+
+    def corner(self, name: str) -> tuple:
+        """Nominal corner of a slot to build labware with, e.g. EHMPlatePos(*deck.corner("B1"))"""
+        return self._labwarePosition[name]
+
+    def place(self, labware, slot: str, drop_slot: Optional[str] = None):
+        """
+        Shifts labware built at corner(slot) by the calibration there, x/y positions and heights (z)
+        The labware is moved as a whole and its steps are kept, a rotation within one labware stays uncorrected
+        :param labware: EHMPlatePos, Reservoirs, RoundContainers, PipetteTips or TipDropzone of action.py
+        :param drop_slot: slot the drop zone of PipetteTips (x_drop, y_drop) was built at
+        :return: labware
+        """
+        if self.calibration is None:
+            return labware
+        offset = self.calibration.offset(self.corner(slot))
+        drop_offset = offset if drop_slot is None else self.calibration.offset(self.corner(drop_slot))
+        for name, value in list(vars(labware).items()):
+            axis = _axis(name)
+            if axis is None or not isinstance(value, (int, float)):
+                continue
+            shift = drop_offset if name in ("x_drop", "y_drop") else offset
+            setattr(labware, name, value + shift[axis])
+        return labware
+
+    def slot(self, name: str) -> tuple:
+        """Calibrated (x, y) of a deck slot, e.g. "B1" """
+        return self.slots[name]
 
-        
     @property
     def tipPosition(self) -> str:
-        """True if the device is connected, False otherwise"""
+        """Slot of the tip box"""
         return self._tipPosition
 
     @tipPosition.setter
@@ -48,16 +113,7 @@ class Deck:
         self._tipPosition=sPosition
 
     def tipCoordinates(self):
-        return self._deckPosition[self._tipPosition]
-
-    @property
-    def tipPosition(self) -> str:
-        """True if the device is connected, False otherwise"""
-        return self._tipPosition
+        return self.slots[self._tipPosition]
 
 
  #   pass
-
-
-
-
@@ -0,0 +1,176 @@
+"""
+Dose-response fitting for Ca CRC measurements
+Fits Hill curves  y = emax * c^n / (ec50^n + c^n)  for all wells of a plate at once
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+
+class HillFit:
+    """
+    Result of a batched Hill fit, one entry per well
+    :param emax: maximal response
+    :param ec50: concentration of half-maximal response
+    :param hill_slope: Hill coefficient n
+    :param converged: True where the optimization converged
+    """
+
+    def __init__(self, emax, ec50, hill_slope, converged):
+        self.emax = emax
+        self.ec50 = ec50
+        self.hill_slope = hill_slope
+        self.converged = converged
+
+    def predict(self, concentrations) -> np.ndarray:
+        """Model response of every well at the given concentrations, shape (wells, concentrations)"""
+        theta = np.stack([self.emax, np.log(self.ec50), self.hill_slope], axis=-1)
+        return _model(theta, _log(concentrations))[0]
+
+
+def hill(concentrations, emax, ec50, hill_slope):
+    """Hill equation, concentrations and parameters broadcast against each other"""
+    c = np.asarray(concentrations, dtype=float)
+    cn = c**hill_slope
+    return emax * cn / (ec50**hill_slope + cn)
+
+
+def fit_hill(concentrations, amplitudes, max_iter: int = 100, tol: float = 1e-10) -> HillFit:
+    """
+    Fits Hill curves to the peak amplitudes of all wells simultaneously (batched Levenberg-Marquardt)
+    :param concentrations: concentration steps, shape (steps,)
+    :param amplitudes: peak amplitude per well and step, shape (wells, steps), missing values as NaN
+    :param max_iter: maximum number of iterations
+    :param tol: relative decrease of the residual sum of squares below which a well counts as converged
+    :return: HillFit, wells without any amplitude get NaN parameters and converged False
+    """
+    c = np.asarray(concentrations, dtype=float)
+    y = np.atleast_2d(np.asarray(amplitudes, dtype=float))
+    if y.shape[-1] != c.shape[0]:
+        raise ValueError(f"Got {c.shape[0]} concentrations but {y.shape[-1]} amplitude columns")
+    measured = np.isfinite(y).any(axis=1)
+    theta = np.full((len(y), 3), np.nan)
+    converged = np.zeros(len(y), dtype=bool)
+    if measured.any():
+        ym = y[measured]
+        theta[measured], converged[measured] = _levenberg_marquardt(_log(c), ym, _initial_guess(c, ym), max_iter, tol)
+    return HillFit(theta[:, 0], np.exp(theta[:, 1]), theta[:, 2], converged)
+
+
+def bootstrap_hill(
+    concentrations,
+    amplitudes,
+    n_boot: int = 200,
+    alpha: float = 0.05,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+):
+    """
+    Residual bootstrap confidence intervals for emax, ec50 and hill_slope
+    The bootstrap replicates are fitted in batches on a thread pool (NumPy releases the GIL)
+    Costs n_boot fits of the plate, so it is only run on request, fit_hill() alone gives the estimates
+    :param n_boot: number of bootstrap replicates, raise it for steadier interval ends
+    :param alpha: 1 - confidence level
+    :param workers: number of threads, default ThreadPoolExecutor default
+    :return: (fit, lower, upper), lower/upper of shape (wells, 3) in order emax, ec50, hill_slope,
+        NaN for wells without any amplitude
+    """
+    c = np.asarray(concentrations, dtype=float)
+    y_all = np.atleast_2d(np.asarray(amplitudes, dtype=float))
+    fit = fit_hill(c, y_all)
+    theta_all = np.stack([fit.emax, np.log(fit.ec50), fit.hill_slope], axis=-1)
+    measured = np.isfinite(theta_all).all(axis=1)
+    lower = np.full(theta_all.shape, np.nan)
+    upper = np.full(theta_all.shape, np.nan)
+    if not measured.any():
+        return fit, lower, upper
+    y = y_all[measured]
+    theta0 = theta_all[measured]
+    fitted = _model(theta0, _log(c))[0]
+    residuals = y - fitted
+
+    n_wells, n_steps = y.shape
+    rng = np.random.default_rng(seed)
+    # draw all resampling indices up front so results do not depend on the thread schedule
+    draws = rng.integers(0, n_steps, size=(n_boot, n_wells, n_steps))
+    chunks = np.array_split(np.arange(n_boot), max(1, min(n_boot, 8)))
+
+    def fit_chunk(idx):
+        resampled = np.take_along_axis(np.broadcast_to(residuals, (len(idx),) + y.shape), draws[idx], axis=-1)
+        y_boot = (fitted + resampled).reshape(-1, n_steps)
+        start = np.tile(theta0, (len(idx), 1))
+        theta, _ = _levenberg_marquardt(_log(c), y_boot, start, 50, 1e-8)
+        theta[:, 1] = np.exp(theta[:, 1])
+        return theta.reshape(len(idx), n_wells, 3)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        samples = np.concatenate(list(pool.map(fit_chunk, chunks)), axis=0)
+    lower[measured] = np.nanquantile(samples, alpha / 2, axis=0)
+    upper[measured] = np.nanquantile(samples, 1 - alpha / 2, axis=0)
+    return fit, lower, upper
+
+
+def _initial_guess(c, y) -> np.ndarray:
+    emax = np.nanmax(y, axis=1)
+    # concentration closest to half of the maximal response
+    half = np.nanargmin(np.abs(np.nan_to_num(y, nan=np.inf) - emax[:, None] / 2), axis=1)
+    ec50 = np.where(c[half] > 0, c[half], np.min(c[c > 0]))
+    return np.stack([emax, np.log(ec50), np.ones_like(emax)], axis=-1)
+
+
+def _log(concentrations) -> np.ndarray:
+    """Natural log, the zero concentration step maps to -inf"""
+    with np.errstate(divide="ignore"):
+        return np.log(np.asarray(concentrations, dtype=float))
+
+
+def _model(theta, x):
+    """
+    Response and Jacobian for theta = (emax, log ec50, n) of shape (wells, 3) at log concentrations x
+    """
+    emax, log_ec50, n = theta[:, 0:1], theta[:, 1:2], theta[:, 2:3]
+    positive = np.isfinite(x)
+    dx = np.where(positive, x - log_ec50, 0.0)
+    with np.errstate(over="ignore"):
+        s = np.where(positive, 1.0 / (1.0 + np.exp(-n * dx)), 0.0)
+    ds = emax * s * (1.0 - s)
+    jac = np.stack([s, -n * ds, dx * ds], axis=-1)
+    return emax * s, jac
+
+
+def _levenberg_marquardt(x, y, theta, max_iter, tol):
+    valid = np.isfinite(y)
+    y = np.where(valid, y, 0.0)
+    lam = np.full(len(theta), 1e-3)
+    eye = np.eye(3)
+
+    f, jac = _model(theta, x)
+    r = np.where(valid, y - f, 0.0)
+    jac = jac * valid[..., None]
+    sse = np.sum(r**2, axis=1)
+    converged = np.zeros(len(theta), dtype=bool)
+    stalled = np.zeros(len(theta), dtype=bool)
+
+    for _ in range(max_iter):
+        jtj = np.einsum("wsi,wsj->wij", jac, jac)
+        jtr = np.einsum("wsi,ws->wi", jac, r)
+        damped = jtj + lam[:, None, None] * (jtj * eye + 1e-12 * eye)
+        step = np.linalg.solve(damped, jtr[..., None])[..., 0]
+        trial = theta + step
+
+        f_new, jac_new = _model(trial, x)
+        r_new = np.where(valid, y - f_new, 0.0)
+        sse_new = np.sum(r_new**2, axis=1)
+        better = np.isfinite(sse_new) & (sse_new < sse)
+
+        converged |= better & (sse - sse_new <= tol * np.maximum(sse, tol))
+        theta = np.where(better[:, None], trial, theta)
+        r = np.where(better[:, None], r_new, r)
+        jac = np.where(better[:, None, None], jac_new * valid[..., None], jac)
+        sse = np.where(better, sse_new, sse)
+        lam = np.where(better, lam / 3, lam * 4)
+        stalled |= lam > 1e10
+        if (converged | stalled).all():
+            break
+    return theta, converged
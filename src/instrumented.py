@@ -0,0 +1,228 @@
+"""
+Pipettor wrapper that records every device command
+Works with Pipettor and PipettorSimulator, the routines in action.py accept it in place of p
+"""
+import math
+import time
+from typing import Dict, List, Optional
+
+from . import clock
+
+COMMANDS = (
+    "move_xy",
+    "move_x",
+    "move_y",
+    "move_z",
+    "move_to_surface",
+    "aspirate",
+    "dispense",
+    "dispense_all",
+    "pick_tip",
+    "eject_tip",
+    "initialize",
+)
+SPEEDS = ("x_speed", "y_speed", "z_speed", "aspirate_speed", "dispense_speed")
+
+
+class MotionModel:
+    """
+    Rough duration estimate of device commands
+    Speeds are the device speed settings, each setting step is assumed to add the given mm/s or ul/s
+    :param xy_mm_per_s: axis speed per x/y speed step
+    :param z_mm_per_s: axis speed per z speed step
+    :param piston_ul_per_s: piston speed per aspirate/dispense speed step
+    :param overhead: fixed time per command (DLL round trip, acceleration)
+    """
+
+    def __init__(
+        self,
+        xy_mm_per_s: float = 20,
+        z_mm_per_s: float = 10,
+        piston_ul_per_s: float = 80,
+        overhead: float = 0.1,
+        pick_tip: float = 2.5,
+        eject_tip: float = 1.5,
+        initialize: float = 20,
+    ):
+        self.xy_mm_per_s = xy_mm_per_s
+        self.z_mm_per_s = z_mm_per_s
+        self.piston_ul_per_s = piston_ul_per_s
+        self.overhead = overhead
+        self.pick_tip = pick_tip
+        self.eject_tip = eject_tip
+        self.initialize = initialize
+
+    def move(self, dx: float, dy: float, dz: float, speeds: Dict[str, float]) -> float:
+        """Seconds for a move, axes move simultaneously"""
+        tx = abs(dx) / (self.xy_mm_per_s * max(speeds.get("x_speed", 1), 1))
+        ty = abs(dy) / (self.xy_mm_per_s * max(speeds.get("y_speed", 1), 1))
+        tz = abs(dz) / (self.z_mm_per_s * max(speeds.get("z_speed", 1), 1))
+        return self.overhead + max(tx, ty, tz)
+
+    def piston(self, volume: float, speed: float) -> float:
+        """Seconds to aspirate or dispense volume"""
+        return self.overhead + abs(volume) / (self.piston_ul_per_s * max(speed, 1))
+
+
+class Observer:
+    """Receives the commands of an InstrumentedPipettor, override the methods that are needed"""
+
+    def before_command(self, p: "InstrumentedPipettor", name: str, args: tuple):
+        pass
+
+    def after_command(self, p: "InstrumentedPipettor", name: str, args: tuple, seconds: float, failed: bool):
+        pass
+
+
+class InstrumentedPipettor:
+    """
+    Forwards everything to the wrapped pipettor and keeps track of position, tip state and statistics
+    If the current clock is a VirtualClock, it is advanced by the estimated duration of each command
+    :param p: Pipettor or PipettorSimulator
+    :param motion: duration model, default MotionModel()
+    :param observers: notified before and after each command
+    """
+
+    def __init__(self, p, motion: Optional[MotionModel] = None, observers: Optional[List[Observer]] = None):
+        # attributes of the wrapper itself live in __dict__, everything else is forwarded to the device
+        self.__dict__.update(
+            _p=p,
+            motion=motion or MotionModel(),
+            observers=list(observers or []),
+            speeds={name: getattr(p, name, 1) for name in SPEEDS},
+            position=[0.0, 0.0, 0.0],
+            tip_attached=False,
+            tip_content=0.0,
+        )
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.__dict__.update(
+            command_count=0,
+            command_counts={},
+            failed_count=0,
+            estimated_seconds=0.0,
+            wall_seconds=0.0,
+            xy_travel=0.0,
+            z_travel=0.0,
+            aspirated=0.0,
+            dispensed=0.0,
+            tips_picked=0,
+        )
+
+    @property
+    def wrapped(self):
+        return self._p
+
+    def stats(self) -> dict:
+        """Summary of the recorded commands"""
+        return {
+            "commands": self.command_count,
+            "failed": self.failed_count,
+            "estimated_seconds": self.estimated_seconds,
+            "wall_seconds": self.wall_seconds,
+            "xy_travel": self.xy_travel,
+            "z_travel": self.z_travel,
+            "aspirated": self.aspirated,
+            "dispensed": self.dispensed,
+            "tips_picked": self.tips_picked,
+            "per_command": dict(self.command_counts),
+        }
+
+    def __getattr__(self, name):
+        attr = getattr(self._p, name)
+        if name in COMMANDS:
+            return lambda *args, **kwargs: self._run(name, attr, args, kwargs)
+        return attr
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            object.__setattr__(self, name, value)
+            return
+        if name in SPEEDS:
+            self.speeds[name] = value
+        setattr(self._p, name, value)
+
+    def __enter__(self):
+        self._p.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._p.__exit__(exc_type, exc_val, exc_tb)
+
+    def _run(self, name: str, command, args: tuple, kwargs: dict):
+        for observer in self.observers:
+            observer.before_command(self, name, args)
+        seconds = self._estimate(name, args)
+        failed = True
+        t0 = time.perf_counter()
+        try:
+            result = command(*args, **kwargs)
+            failed = False
+        finally:
+            self.wall_seconds += time.perf_counter() - t0
+            self.command_count += 1
+            self.command_counts[name] = self.command_counts.get(name, 0) + 1
+            self.estimated_seconds += seconds
+            if failed:
+                self.failed_count += 1
+            else:
+                self._update_state(name, args)
+            current = clock.get_clock()
+            if isinstance(current, clock.VirtualClock):
+                current.advance(seconds)
+            for observer in self.observers:
+                observer.after_command(self, name, args, seconds, failed)
+        return result
+
+    def target(self, name: str, args: tuple):
+        """Position (x, y, z) after the given command"""
+        x, y, z = self.position
+        if name == "move_xy":
+            x, y = args[0], args[1]
+        elif name == "move_x":
+            x = args[0]
+        elif name == "move_y":
+            y = args[0]
+        elif name in ("move_z", "pick_tip") and args:
+            z = args[0]
+        elif name == "move_to_surface" and args:
+            # the surface is not known in advance, counted as a move down to the search limit
+            z = args[0]
+        elif name == "initialize":
+            x, y, z = 0.0, 0.0, 0.0
+        return x, y, z
+
+    def _estimate(self, name: str, args: tuple) -> float:
+        if name.startswith("move_"):
+            x, y, z = self.target(name, args)
+            return self.motion.move(x - self.position[0], y - self.position[1], z - self.position[2], self.speeds)
+        if name == "aspirate":
+            return self.motion.piston(args[0], self.speeds["aspirate_speed"])
+        if name == "dispense":
+            return self.motion.piston(args[0], self.speeds["dispense_speed"])
+        if name == "dispense_all":
+            return self.motion.piston(self.tip_content, self.speeds["dispense_speed"])
+        return getattr(self.motion, name, self.motion.overhead)
+
+    def _update_state(self, name: str, args: tuple):
+        x, y, z = self.target(name, args)
+        if name.startswith("move_"):
+            self.xy_travel += math.hypot(x - self.position[0], y - self.position[1])
+            self.z_travel += abs(z - self.position[2])
+        self.position[:] = [x, y, z]
+        if name == "aspirate":
+            self.tip_content += args[0]
+            self.aspirated += args[0]
+        elif name == "dispense":
+            self.tip_content = max(self.tip_content - args[0], 0.0)
+            self.dispensed += args[0]
+        elif name == "dispense_all":
+            self.dispensed += self.tip_content
+            self.tip_content = 0.0
+        elif name == "pick_tip":
+            self.tip_attached = True
+            self.tips_picked += 1
+        elif name in ("eject_tip", "initialize"):
+            self.tip_attached = False
+            self.tip_content = 0.0
@@ -3,7 +3,8 @@ import os
 import os.path
 from envs import env
 from pathlib import Path
-from biohit_pipettor.baseclass import Baseclass
+from typing import Dict
+from .baseclass import Baseclass
 
 class Labware(Baseclass):
     """
@@ -15,6 +16,7 @@ class Labware(Baseclass):
     _JSON_SUFFIXES = [".json"]
     
     def __init__(self):    
+        self.definitions: Dict[str, dict] = {}
         self._loadLibrary()       
 
 
@@ -43,11 +45,14 @@ class Labware(Baseclass):
                 if f.suffix in self._JSON_SUFFIXES:
                     filelist.append(f)            
         
-        print("filelist contains %d .json files", filelist.count() )
+        print(f"filelist contains {len(filelist)} .json files")
         #
         for f in filelist:                
-            data = json.load(f)
-            
-            
+            with open(f) as fh:
+                self.definitions[f.stem] = json.load(fh)
 
-        return bOk
+        return len(self.definitions) > 0
+
+    def get(self, name: str) -> dict:
+        """Labware definition loaded from <name>.json"""
+        return self.definitions[name]
@@ -0,0 +1,325 @@
+"""
+Run metrics: cheap counters and histograms for throughput monitoring
+The routines count into the module registry REGISTRY, MetricsObserver adds the device commands of an
+InstrumentedPipettor. The numbers are served as Prometheus text by MetricsServer and written to a JSON file
+by JsonDumper, so trends across runs (plates per hour, tip probe failures, ...) can be followed.
+"""
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from envs import env
+
+from .instrumented import Observer
+
+Labels = Tuple[Tuple[str, str], ...]
+
+SECONDS_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _key(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format(name: str, labels: Labels, extra: Labels = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return name
+    text = ",".join(f'{label}="{value}"' for label, value in labels)
+    return f"{name}{{{text}}}"
+
+
+class Counter:
+    """Monotonic counter, one value per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, lock: threading.Lock):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+        self._lock = lock
+
+    def inc(self, value: float = 1.0, **labels):
+        if value < 0:
+            raise ValueError(f"Counter {self.name} cannot decrease, got {value}")
+        key = _key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def get(self, **labels) -> float:
+        return self.values.get(_key(labels), 0.0)
+
+    def lines(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{_format(self.name, labels)} {value:g}"
+
+    def snapshot(self):
+        return {_format(self.name, labels): value for labels, value in self.values.items()}
+
+
+class Histogram:
+    """Bucketed distribution, one set of buckets per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, lock: threading.Lock, buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [counts per bucket (+Inf last), sum]
+        self.values: Dict[Labels, list] = {}
+        self._lock = lock
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def lines(self):
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{_format(self.name + '_bucket', labels, (('le', le),))} {cumulative}"
+            yield f"{_format(self.name + '_sum', labels)} {total:g}"
+            yield f"{_format(self.name + '_count', labels)} {cumulative}"
+
+    def snapshot(self):
+        return {
+            _format(self.name, labels): {"count": sum(counts), "sum": total, "buckets": dict(zip(self.buckets, counts))}
+            for labels, (counts, total) in self.values.items()
+        }
+
+
+class Registry:
+    """Named metrics, created on first use"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.setdefault(name, cls(name, help, threading.Lock(), **kwargs))
+        if not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is a {metric.kind}, not a {cls.kind}")
+        return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def reset(self):
+        """Zeroes all metrics, e.g. at the start of a run"""
+        with self._lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+            self.started = time.time()
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """All metrics as a dict, with the derived plates per hour"""
+        now = time.time()
+        hours = max(now - self.started, 1e-9) / 3600
+        data = {"timestamp": now, "uptime_seconds": now - self.started}
+        for metric in list(self.metrics.values()):
+            data.update(metric.snapshot())
+        plates = self.metrics.get("biohit_plates_total")
+        data["plates_per_hour"] = sum(plates.values.values()) / hours if plates is not None else 0.0
+        return data
+
+    def dump(self, path=None) -> Path:
+        """Writes snapshot() as JSON, replacing the file atomically"""
+        path = metrics_path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), indent=2))
+        os.replace(tmp, path)
+        return path
+
+
+REGISTRY = Registry()
+
+
+def metrics_path(path=None) -> Path:
+    """JSON dump file, default from env PIPETTOR_METRICS or biohit_metrics.json in the temp folder"""
+    if path is None:
+        path = env("PIPETTOR_METRICS")
+    return Path(path) if path is not None else Path(tempfile.gettempdir()) / "biohit_metrics.json"
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    """Increments a counter of the module registry"""
+    REGISTRY.counter(name).inc(value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    """Records a value in a histogram of the module registry"""
+    REGISTRY.histogram(name).observe(value, **labels)
+
+
+def plate_done(**labels):
+    """
+    Counts a finished plate, call it at the end of a plate protocol
+    Protocols run by the orchestrator are counted by the orchestrator
+    """
+    REGISTRY.counter("biohit_plates_total").inc(1, **labels)
+
+
+def _describe(registry: Registry):
+    registry.counter("biohit_commands_total", "Device commands sent")
+    registry.counter("biohit_command_failures_total", "Device commands that raised")
+    registry.histogram("biohit_command_seconds", "Duration of device commands estimated by the MotionModel")
+    registry.counter("biohit_tips_total", "Tips picked up, per channel")
+    registry.counter("biohit_tip_probe_failures_total", "pick_tip commands that found no tip")
+    registry.counter("biohit_volume_ul_total", "Liquid moved per channel in ul")
+    registry.counter("biohit_reservoir_trips_total", "Trips to a stock or waste reservoir")
+    registry.counter("biohit_pick_tip_retries_total", "Tip positions skipped after CommandFailed in the pick routines")
+    registry.counter("biohit_idle_seconds_total", "Time spent in clock.sleep, e.g. incubations")
+    registry.counter("biohit_plates_total", "Plates (protocols) finished")
+
+
+_describe(REGISTRY)
+
+
+class MetricsObserver(Observer):
+    """
+    Counts the commands of an InstrumentedPipettor into a registry
+    :param channels: tips per pick_tip, default: 8 for a multichannel pipettor, 1 otherwise
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, channels: Optional[int] = None):
+        self.registry = registry
+        self.channels = channels
+        _describe(registry)
+
+    def attach(self, p):
+        p.observers.append(self)
+        return p
+
+    def after_command(self, p, name, args, seconds, failed):
+        registry = self.registry
+        channels = self.channels or (8 if getattr(p, "multichannel", False) else 1)
+        registry.counter("biohit_commands_total").inc(command=name)
+        registry.histogram("biohit_command_seconds").observe(seconds, command=name)
+        if failed:
+            registry.counter("biohit_command_failures_total").inc(command=name)
+            if name == "pick_tip":
+                registry.counter("biohit_tip_probe_failures_total").inc()
+            return
+        if name == "pick_tip":
+            registry.counter("biohit_tips_total").inc(channels)
+        elif name in ("aspirate", "dispense") and args:
+            registry.counter("biohit_volume_ul_total").inc(abs(args[0]), direction=name)
+
+
+class MetricsServer:
+    """
+    Serves the registry as Prometheus text on http://host:port/metrics from a background thread
+    :param port: 0 picks a free port, see .port
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, port: int = 9464, host: str = "127.0.0.1"):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = registry.prometheus().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self) -> "MetricsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        print(f"Serving metrics on http://{self._server.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class JsonDumper:
+    """
+    Writes the registry to a JSON file every interval seconds and once more on stop()
+    :param path: see metrics_path()
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, path=None, interval: float = 60):
+        self.registry = registry
+        self.path = metrics_path(path)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self) -> "JsonDumper":
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.dump(self.path)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.registry.dump(self.path)
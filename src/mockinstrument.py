@@ -0,0 +1,411 @@
+"""
+Stand-in for the vendor InstrumentCls, so Pipettor can be driven without DLL, pythonnet and hardware
+Implements the calls Pipettor makes (MoveXY, MoveZ, Aspirate, Dispense, PickTip, EjectTip, PollPosition,
+Control.PollSpeed, Control.WaitArmToStop, ...) with timing from a MotionModel, command latency and
+injected failures. Commands with wait=False return at once and the axes move in the background, as on
+the device. Runs in-process or behind a local socket server speaking JSON lines.
+"""
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .instrumented import MotionModel
+
+_AXES = ("X", "Y", "Z", "P")
+
+
+class _Motion:
+    """Linear move of one axis between two points in time"""
+
+    __slots__ = ("start", "end", "t0", "t1")
+
+    def __init__(self, start: float, end: float, t0: float, t1: float):
+        self.start = start
+        self.end = end
+        self.t0 = t0
+        self.t1 = t1
+
+    def position(self, now: float) -> float:
+        if now >= self.t1 or self.t1 <= self.t0:
+            return self.end
+        if now <= self.t0:
+            return self.start
+        return self.start + (self.end - self.start) * (now - self.t0) / (self.t1 - self.t0)
+
+
+class MockInstrument:
+    """
+    Simulated InstrumentCls
+    Positions are in mm, the piston position in ul, speeds are the device speed steps
+    :param motion: timing of the commands, default MotionModel()
+    :param latency: seconds added to every call, the DLL/USB round trip
+    :param time_scale: factor for all waiting, e.g. 0.01 for fast tests or 0 to not wait at all
+    :param failures: command name -> probability that it fails, e.g. {"PickTip": 0.1}
+    :param surface_z: z of a liquid surface for PollSensorReading and MoveToSurface, None for no liquid
+    :param seed: seed of the failure injection and sensor noise
+    """
+
+    def __init__(
+        self,
+        motion: Optional[MotionModel] = None,
+        latency: float = 0.002,
+        time_scale: float = 1.0,
+        failures: Optional[Dict[str, float]] = None,
+        surface_z: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.motion = motion or MotionModel()
+        self.latency = latency
+        self.time_scale = time_scale
+        self.failures = dict(failures or {})
+        self.surface_z = surface_z
+        self.connected = True
+        self.PipetType = 2
+        self.has_tip = False
+        self.speeds = {"X": 10, "Y": 10, "Z": 10, "aspirate": 4, "dispense": 4}
+        self.calls: Dict[str, int] = {}
+        self._motions: Dict[str, _Motion] = {axis: _Motion(0.0, 0.0, 0.0, 0.0) for axis in _AXES}
+        self._fail_next: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def Control(self):
+        # the DLL has the polling and waiting methods on a separate Control object
+        return self
+
+    def fail_next(self, name: str, count: int = 1):
+        """Lets the next count calls of command name fail"""
+        self._fail_next[name] = self._fail_next.get(name, 0) + count
+
+    def disconnect(self):
+        """Simulates a lost USB connection, polls return -1 and Pipettor raises NotConnected"""
+        self.connected = False
+
+    # -- helpers ----------------------------------------------------------------------------------
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def _sleep(self, seconds: float):
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _call(self, name: str) -> bool:
+        """Counts the call, applies the latency and decides whether it fails"""
+        self._sleep(self.latency)
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if not self.connected:
+                return False
+            if self._fail_next.get(name, 0) > 0:
+                self._fail_next[name] -= 1
+                return False
+            return self._random.random() >= self.failures.get(name, 0.0)
+
+    def _position(self, axis: str) -> float:
+        return self._motions[axis].position(self._now())
+
+    def _busy_until(self, *axes: str) -> float:
+        return max(self._motions[axis].t1 for axis in axes)
+
+    def _move(self, targets: Dict[str, float], seconds: float, wait: bool):
+        """Starts a move after the previous arm or piston move, waits for it if wait is True"""
+        group = ("P",) if "P" in targets and len(targets) == 1 else _AXES[:3]
+        with self._lock:
+            start = max(self._now(), self._busy_until(*group))
+            end = start + seconds * self.time_scale
+            for axis, target in targets.items():
+                self._motions[axis] = _Motion(self._motions[axis].position(start), target, start, end)
+        if wait:
+            self._wait(*targets)
+
+    def _wait(self, *axes: str):
+        delay = self._busy_until(*axes) - self._now()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _target(self, axis: str) -> float:
+        """Where the axis will be once its queued moves are done"""
+        return self._motions[axis].end
+
+    def _xyz_seconds(self, x: float, y: float, z: float) -> float:
+        speeds = {"x_speed": self.speeds["X"], "y_speed": self.speeds["Y"], "z_speed": self.speeds["Z"]}
+        return self.motion.move(x - self._target("X"), y - self._target("Y"), z - self._target("Z"), speeds)
+
+    # -- InstrumentCls ----------------------------------------------------------------------------
+
+    def IsConnected(self) -> int:
+        return int(self.connected)
+
+    def InitializeInstrument(self) -> bool:
+        if not self._call("InitializeInstrument"):
+            return False
+        self._move({axis: 0.0 for axis in _AXES}, self.motion.initialize, True)
+        self.has_tip = False
+        return True
+
+    def SetActuatorSpeed(self, address: str, speed) -> bool:
+        if not self._call("SetActuatorSpeed"):
+            return False
+        self.speeds[address] = speed
+        return True
+
+    def SetAspirateSpeed(self, speed) -> bool:
+        if not self._call("SetAspirateSpeed"):
+            return False
+        self.speeds["aspirate"] = speed
+        return True
+
+    def SetDispenseSpeed(self, speed) -> bool:
+        if not self._call("SetDispenseSpeed"):
+            return False
+        self.speeds["dispense"] = speed
+        return True
+
+    def PollPosition(self, address: str) -> float:
+        self._call("PollPosition")
+        if not self.connected:
+            return -1
+        return self._position(address)
+
+    def PollSpeed(self, address: str, inwards: bool = False) -> float:
+        self._call("PollSpeed")
+        if not self.connected:
+            return -1
+        if address == "P":
+            return self.speeds["aspirate" if inwards else "dispense"]
+        return self.speeds[address]
+
+    def PollSensorReading(self) -> float:
+        """Oscillation frequency, shifted while the tip is below surface_z"""
+        self._call("PollSensorReading")
+        if not self.connected:
+            return -1
+        value = 1000.0 + self._random.gauss(0, 2)
+        if self.surface_z is not None and self._position("Z") >= self.surface_z:
+            value += 200.0
+        return value
+
+    def WaitArmToStop(self) -> bool:
+        self._call("WaitArmToStop")
+        self._wait("X", "Y", "Z")
+        return True
+
+    def WaitPistonToStop(self) -> bool:
+        self._call("WaitPistonToStop")
+        self._wait("P")
+        return True
+
+    def MoveXY(self, x: float, y: float, wait: bool = True) -> bool:
+        if not self._call("MoveXY"):
+            return False
+        self._move({"X": x, "Y": y}, self._xyz_seconds(x, y, self._target("Z")), wait)
+        return True
+
+    def MoveZ(self, z: float, wait: bool = True) -> bool:
+        if not self._call("MoveZ"):
+            return False
+        self._move({"Z": z}, self._xyz_seconds(self._target("X"), self._target("Y"), z), wait)
+        return True
+
+    def MoveToSurface(self, limit: float, distance_from_surface: float) -> bool:
+        if not self._call("MoveToSurface"):
+            return False
+        if self.surface_z is None or self.surface_z > limit:
+            return False
+        # the device searches slowly, assume a fifth of the normal z speed
+        z = self.surface_z - distance_from_surface
+        seconds = 5 * self._xyz_seconds(self._target("X"), self._target("Y"), z)
+        self._move({"Z": z}, seconds, True)
+        return True
+
+    def MovePistonToPosition(self, position: float) -> bool:
+        if not self._call("MovePistonToPosition"):
+            return False
+        volume = position - self._target("P")
+        self._move({"P": position}, self.motion.piston(volume, self.speeds["aspirate"]), True)
+        return True
+
+    def Aspirate(self, volume: float, wait: bool = True) -> bool:
+        if not self._call("Aspirate") or not self.has_tip:
+            return False
+        target = self._target("P") + volume
+        self._move({"P": target}, self.motion.piston(volume, self.speeds["aspirate"]), wait)
+        return True
+
+    def Dispense(self, volume: float, wait: bool = True) -> bool:
+        if not self._call("Dispense") or volume > self._target("P") + 1e-9:
+            return False
+        target = self._target("P") - volume
+        self._move({"P": target}, self.motion.piston(volume, self.speeds["dispense"]), wait)
+        return True
+
+    def DispenseAll(self) -> bool:
+        if not self._call("DispenseAll"):
+            return False
+        volume = self._target("P")
+        self._move({"P": 0.0}, self.motion.piston(volume, self.speeds["dispense"]), True)
+        return True
+
+    def PickTip(self, limit: float) -> bool:
+        if not self._call("PickTip") or self.has_tip:
+            return False
+        self._move({"Z": limit}, self.motion.pick_tip, True)
+        self.has_tip = True
+        return True
+
+    def EjectTip(self) -> bool:
+        if not self._call("EjectTip") or not self.has_tip:
+            return False
+        self._sleep(self.motion.eject_tip)
+        self.has_tip = False
+        return True
+
+
+def mock_pipettor(
+    tip_volume: int = 1000, initialize: bool = True, instrument: Optional[MockInstrument] = None, **kwargs
+):
+    """
+    Real Pipettor on top of a MockInstrument (or RemoteInstrument)
+    Pipettor creates its InstrumentCls itself, so the class is replaced in biohit_pipettor.pipettor
+    while it is constructed
+    :param kwargs: further Pipettor arguments, e.g. multichannel
+    :return: (pipettor, instrument)
+    """
+    from biohit_pipettor import Pipettor
+    from biohit_pipettor import pipettor as pipettor_module
+
+    instrument = instrument or MockInstrument()
+    original = pipettor_module.InstrumentCls
+    pipettor_module.InstrumentCls = lambda: instrument
+    try:
+        p = Pipettor(tip_volume=tip_volume, initialize=initialize, **kwargs)
+    finally:
+        pipettor_module.InstrumentCls = original
+    return p, instrument
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        instrument = self.server.instrument
+        for line in self.rfile:
+            request = None
+            try:
+                request = json.loads(line)
+                method = request["method"]
+                args = request.get("args", ())
+                if method == "get":
+                    result = getattr(instrument, _checked(args[0], _ATTRIBUTES))
+                elif method == "set":
+                    setattr(instrument, _checked(args[0], _ATTRIBUTES), args[1])
+                    result = None
+                else:
+                    result = getattr(instrument, _checked(method, _METHODS))(*args)
+                text = json.dumps({"id": request.get("id"), "result": result})
+            except Exception as e:
+                request_id = request.get("id") if isinstance(request, dict) else None
+                text = json.dumps({"id": request_id, "error": f"{type(e).__name__}: {e}"})
+            self.wfile.write((text + "\n").encode())
+
+
+def _checked(name, allowed) -> str:
+    """Only the InstrumentCls interface is served, not the internals of MockInstrument"""
+    if not isinstance(name, str) or name.startswith("_") or name not in allowed:
+        raise AttributeError(f"Unknown command or attribute {name!r}")
+    return name
+
+
+_METHODS = {
+    name
+    for name in dir(MockInstrument)
+    if name[0].isupper() and name != "Control" and callable(getattr(MockInstrument, name))
+} | {"fail_next", "disconnect"}
+_ATTRIBUTES = {"PipetType", "has_tip", "connected", "speeds", "calls", "latency", "time_scale", "failures", "surface_z"}
+
+
+class MockInstrumentServer(socketserver.ThreadingTCPServer):
+    """
+    Serves a MockInstrument on a local socket, one JSON object per line:
+    {"id": 1, "method": "MoveXY", "args": [10, 20, false]} -> {"id": 1, "result": true}
+    Attributes are read and written with the methods "get" and "set", e.g. ["PipetType"], see _ATTRIBUTES
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, instrument: Optional[MockInstrument] = None, address: Tuple[str, int] = ("127.0.0.1", 0)):
+        super().__init__(address, _Handler)
+        self.instrument = instrument or MockInstrument()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "MockInstrumentServer":
+        """Serves in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-instrument", daemon=True)
+        self._thread.start()
+        print(f"Mock instrument listening on {self.server_address[0]}:{self.port}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RemoteInstrument:
+    """Client of a MockInstrumentServer with the InstrumentCls interface, usable with mock_pipettor()"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.__dict__["_socket"] = socket.create_connection((host, port))
+        self.__dict__["_file"] = self._socket.makefile("rwb")
+        self.__dict__["_id"] = 0
+        self.__dict__["_lock"] = threading.Lock()
+
+    @property
+    def Control(self):
+        return self
+
+    def request(self, method: str, *args):
+        with self._lock:
+            self.__dict__["_id"] += 1
+            self._file.write((json.dumps({"id": self._id, "method": method, "args": args}) + "\n").encode())
+            self._file.flush()
+            response = json.loads(self._file.readline())
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __getattr__(self, name: str):
+        if name == "PipetType":
+            return self.request("get", name)
+        if name in _METHODS:
+            return lambda *args: self.request(name, *args)
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value):
+        self.request("set", name, value)
+
+
+def main():
+    """python -m src.mockinstrument [port], serves a mock instrument with real timing"""
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5757
+    server = MockInstrumentServer(address=("127.0.0.1", port))
+    print(f"Mock instrument listening on 127.0.0.1:{server.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Drives several Roboline units from one process
+Each device gets a worker thread, queued plate protocols go to whichever device becomes free
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from . import metrics
+
+
+class Device:
+    """
+    What a protocol gets to work with
+    :param name: device name, e.g. "roboline-1"
+    :param p: Pipettor (or PipettorSimulator) of this device
+    :param labware: labware registry shared by all devices
+    :param calibration: calibration cache shared by all devices
+    """
+
+    def __init__(self, name: str, p, labware, calibration: "CalibrationCache"):
+        self.name = name
+        self.p = p
+        self.labware = labware
+        self.calibration = calibration
+        self.busy_seconds = 0.0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+
+
+class CalibrationCache:
+    """
+    Thread-safe cache of per-device or per-deck calibration data, computed once and shared
+    A key is computed outside the lock, threads asking for the same key wait for that computation only
+    """
+
+    def __init__(self):
+        self._data: Dict[str, object] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, compute: Optional[Callable[[], object]] = None):
+        """Cached value of key, computed with compute() on first use"""
+        with self._lock:
+            if key in self._data or compute is None:
+                return self._data.get(key)
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._data[key] = value
+            del self._pending[key]
+        future.set_result(value)
+        return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = value
+
+
+class _Job:
+    def __init__(self, protocol: Callable, name: str, kwargs: dict):
+        self.protocol = protocol
+        self.name = name
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+class Controller:
+    """
+    Runs queued protocols on N devices concurrently, one worker thread per device
+    Protocols are called as protocol(device, **kwargs) and should only use device.p
+    The clock in clock.py is process-wide, so simulated runs of several devices use the real clock
+    :param pipettors: device name -> Pipettor, the pipettors must already be connected
+    :param labware: shared labware registry, e.g. Labware()
+    :param calibration: shared calibration cache, default a new CalibrationCache
+    """
+
+    def __init__(self, pipettors: Dict[str, object], labware=None, calibration: Optional[CalibrationCache] = None):
+        calibration = calibration or CalibrationCache()
+        self.devices = [Device(name, p, labware, calibration) for name, p in pipettors.items()]
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._started = 0.0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        self._started = time.perf_counter()
+        for device in self.devices:
+            thread = threading.Thread(target=self._work, args=(device,), name=f"worker-{device.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, protocol: Callable, name: Optional[str] = None, **kwargs) -> Future:
+        """
+        Queues a plate protocol, it runs on the next free device
+        :return: Future with the protocol's return value
+        :raise RuntimeError: if the controller is closed, nothing would run the job
+        """
+        job = _Job(protocol, name or protocol.__name__, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Controller is closed, cannot run {job.name}")
+            self._queue.put(job)
+        return job.future
+
+    def close(self, wait: bool = True):
+        """Lets the workers finish the queued jobs and stops them, later submit() calls raise"""
+        with self._lock:
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        if wait or not self._threads:
+            # jobs left when the controller was never started, no worker would ever pick them up
+            while not self._queue.empty():
+                job = self._queue.get()
+                if job is not None:
+                    job.future.cancel()
+        self._threads = []
+
+    def utilization(self) -> Dict[str, float]:
+        """Fraction of the time since start() each device spent running protocols"""
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        return {device.name: device.busy_seconds / elapsed for device in self.devices}
+
+    def report(self):
+        for device in self.devices:
+            share = self.utilization()[device.name]
+            print(
+                f"{device.name}: {device.jobs_done} protocols done, {device.jobs_failed} failed, "
+                f"busy {device.busy_seconds:.0f}s ({share:.0%})"
+            )
+
+    def _work(self, device: Device):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            print(f"{device.name}: starting {job.name}")
+            t0 = time.perf_counter()
+            try:
+                result = job.protocol(device, **job.kwargs)
+            except Exception as e:
+                device.jobs_failed += 1
+                job.future.set_exception(e)
+            else:
+                device.jobs_done += 1
+                metrics.plate_done(device=device.name)
+                job.future.set_result(result)
+            finally:
+                device.busy_seconds += time.perf_counter() - t0
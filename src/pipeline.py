@@ -0,0 +1,120 @@
+"""
+Background processing of measurements
+Each stage runs in its own thread and hands its output to the next stage through a bounded queue,
+so conversion, upload and analysis of one concentration step overlap with the pipetting of the next
+"""
+import queue
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+_DONE = object()
+
+
+class Measurement:
+    """
+    One measurement submitted by a protocol, passed through all stages
+    :param platename: plate name as passed to FOC48.bat
+    :param label: step of the protocol, e.g. "calcium 0.4mM"
+    :param data: anything the stages need or produce, e.g. "file" or "peaks"
+    """
+
+    def __init__(self, platename: str, label: str = "", **data):
+        self.platename = platename
+        self.label = label
+        self.data = data
+        self.submitted = time.time()
+        self.finished: Optional[float] = None
+        self.error: Optional[Tuple[str, Exception]] = None
+
+    def __repr__(self) -> str:
+        return f"Measurement({self.platename!r}, {self.label!r})"
+
+
+class Pipeline:
+    """
+    Runs each measurement through the stages in order, one worker thread per stage
+    A stage is a function taking the Measurement and returning it (or a replacement), a failing stage
+    marks the measurement with the error and it skips the remaining stages
+    :param stages: (name, function) in processing order
+    :param maxsize: queue length per stage, submit() blocks when the first stage is this far behind
+    :param on_done: called with every finished measurement, also the failed ones
+    """
+
+    def __init__(
+        self,
+        stages: List[Tuple[str, Callable[[Measurement], Measurement]]],
+        maxsize: int = 4,
+        on_done: Optional[Callable[[Measurement], None]] = None,
+    ):
+        self.stages = list(stages)
+        self.on_done = on_done
+        self.queues: List[queue.Queue] = [queue.Queue(maxsize) for _ in self.stages]
+        self.done: List[Measurement] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+        for i, (name, _) in enumerate(self.stages):
+            thread = threading.Thread(target=self._work, args=(i,), name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, measurement: Measurement) -> Measurement:
+        """Queues a measurement for the first stage and returns immediately unless the queue is full"""
+        self.queues[0].put(measurement)
+        print(f"Queued {measurement} for {', '.join(name for name, _ in self.stages)}")
+        return measurement
+
+    def close(self, wait: bool = True):
+        """Lets the stages finish all queued measurements and stops the threads"""
+        if not self._threads:
+            return
+        self.queues[0].put(_DONE)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def failed(self) -> List[Measurement]:
+        return [m for m in self.done if m.error is not None]
+
+    def _work(self, i: int):
+        name, func = self.stages[i]
+        inbox = self.queues[i]
+        outbox = self.queues[i + 1] if i + 1 < len(self.queues) else None
+        while True:
+            measurement = inbox.get()
+            if measurement is _DONE:
+                if outbox is not None:
+                    outbox.put(_DONE)
+                break
+            if measurement.error is None:
+                try:
+                    measurement = func(measurement) or measurement
+                except Exception as e:
+                    measurement.error = (name, e)
+                    print(f"{name} failed for {measurement}: {e}")
+            if outbox is not None:
+                outbox.put(measurement)
+            else:
+                self._finish(measurement)
+
+    def _finish(self, measurement: Measurement):
+        measurement.finished = time.time()
+        with self._lock:
+            self.done.append(measurement)
+        if measurement.error is None:
+            print(f"Processed {measurement} in {measurement.finished - measurement.submitted:.0f}s")
+        if self.on_done is not None:
+            self.on_done(measurement)
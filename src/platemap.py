@@ -0,0 +1,204 @@
+"""
+Plate maps with a reagent and a volume per well
+compile_plate_map() groups the wells into passes: columns in which all eight wells get the same reagent
+and volume go to the multichannel head, the remaining wells to the single channel. Every reagent gets one
+pass per head, so it is dispensed with one set of tips and the refills are shared between wells with
+different volumes. Within a pass the targets keep the plate order (column 6 first, as the routines
+traverse the plate), each tip load covers the next targets in that order.
+"""
+import csv
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from .action import MULTICHANNEL, fill, fill_multi, release_tips_multi
+from .tipplanner import TipPlanner, Transfer
+from .wellset import ROWS, WellSet
+
+Well = Tuple[int, int]
+
+
+class PlateMap:
+    """
+    Reagent and volume per well of the 48 well EHM plate, wells not in the map are left alone
+    """
+
+    def __init__(self):
+        self.wells: Dict[Well, Tuple[str, float]] = {}
+
+    def set(self, wells: Union[WellSet, Well, Iterable[Well]], reagent: str, volume: float) -> "PlateMap":
+        """
+        Assigns reagent and volume (ul per well) to wells, replaces what was set before
+        :param wells: WellSet, a single (col, row) or a list of them
+        """
+        if volume <= 0:
+            raise ValueError(f"Volume for {reagent!r} must be positive, got {volume}")
+        if isinstance(wells, tuple):
+            wells = [wells]
+        if not isinstance(wells, WellSet):
+            wells = WellSet.wells(wells)
+        for well in wells:
+            self.wells[well] = (reagent, float(volume))
+        return self
+
+    @classmethod
+    def from_csv(cls, path) -> "PlateMap":
+        """Reads a map with the columns col, row, reagent, volume (header line required)"""
+        plate_map = cls()
+        with open(path, newline="") as f:
+            for line in csv.DictReader(f):
+                plate_map.set((int(line["col"]), int(line["row"])), line["reagent"].strip(), float(line["volume"]))
+        return plate_map
+
+    def __len__(self) -> int:
+        return len(self.wells)
+
+    def __getitem__(self, well: Well) -> Tuple[str, float]:
+        return self.wells[well]
+
+    def reagents(self) -> List[str]:
+        """Reagents in the order they were first set"""
+        return list(dict.fromkeys(reagent for reagent, _ in self.wells.values()))
+
+    def selection(self, reagent: str) -> WellSet:
+        return WellSet.wells(well for well, (name, _) in self.wells.items() if name == reagent)
+
+    def total(self, reagent: str) -> float:
+        return sum(volume for name, volume in self.wells.values() if name == reagent)
+
+
+class Pass:
+    """
+    One reagent dispensed by one head
+    :param multichannel: True for the multichannel head, the targets are then columns, otherwise (col, row) wells
+    :param volumes: target -> volume per well, in dispensing order
+    """
+
+    def __init__(self, reagent: str, multichannel: bool, volumes: Dict[Hashable, float]):
+        self.reagent = reagent
+        self.multichannel = multichannel
+        self.volumes = volumes
+
+    @property
+    def total(self) -> float:
+        """Volume taken from the source"""
+        return sum(self.volumes.values()) * (MULTICHANNEL if self.multichannel else 1)
+
+    def aspirations(self, tip_volume: float = 1000) -> int:
+        """Refills as done by fill() and fill_multi(): topped up whenever the tip holds less than the next dispense"""
+        count, content = 0, 0.0
+        for volume in self.volumes.values():
+            if content < volume:
+                count += 1
+                content = tip_volume
+            content -= volume
+        return count
+
+    def transfers(self) -> List[Transfer]:
+        return [Transfer(self.reagent, target, volume) for target, volume in self.volumes.items()]
+
+    def __repr__(self):
+        head = "multi" if self.multichannel else "single"
+        return f"Pass({self.reagent!r}, {head}, {len(self.volumes)} targets, {self.total:.0f}ul)"
+
+
+class PlatePlan:
+    """Compiled passes of a plate map, multichannel passes first as they run with the other head"""
+
+    def __init__(self, passes: List[Pass], tip_volume: float = 1000):
+        self.passes = passes
+        self.tip_volume = tip_volume
+
+    @property
+    def multichannel(self) -> List[Pass]:
+        return [step for step in self.passes if step.multichannel]
+
+    @property
+    def single(self) -> List[Pass]:
+        return [step for step in self.passes if not step.multichannel]
+
+    @property
+    def aspirations(self) -> int:
+        return sum(step.aspirations(self.tip_volume) for step in self.passes)
+
+    @property
+    def tip_changes(self) -> int:
+        """Tip pickups of both heads as decided by the TipPlanner"""
+        changes = 0
+        for passes in (self.multichannel, self.single):
+            transfers = [t for step in passes for t in step.transfers()]
+            changes += sum(TipPlanner().plan(transfers))
+        return changes
+
+    def report(self) -> str:
+        lines = [repr(step) for step in self.passes]
+        lines.append(f"{len(self.passes)} passes, {self.aspirations} aspirations, {self.tip_changes} tip pickups")
+        return "\n".join(lines)
+
+
+def compile_plate_map(plate_map: PlateMap, tip_volume: float = 1000, multichannel: bool = True) -> PlatePlan:
+    """
+    Groups the wells of a plate map into the fewest passes, one per reagent and head
+    The passes are not sorted by cost: the multichannel passes come first, and on each head the reagents follow the
+    order in which they were first set in the plate map. The order of addition is up to the caller.
+    :param tip_volume: capacity of a tip, no well may need more
+    :param multichannel: False to do everything with the single channel
+    """
+    too_large = [well for well, (_, volume) in plate_map.wells.items() if volume > tip_volume]
+    if too_large:
+        raise ValueError(f"Wells {too_large} need more than one tip of {tip_volume}ul")
+
+    multi: List[Pass] = []
+    single: List[Pass] = []
+    for reagent in plate_map.reagents():
+        wells = plate_map.selection(reagent)
+        columns: Dict[int, float] = {}
+        if multichannel:
+            for col in wells.full_columns():
+                volumes = {plate_map[(col, row)][1] for row in range(1, ROWS + 1)}
+                if len(volumes) == 1:
+                    columns[col] = volumes.pop()
+        rest = wells - WellSet.by_column(*columns)
+        if columns:
+            multi.append(Pass(reagent, True, columns))
+        if rest:
+            single.append(Pass(reagent, False, {well: plate_map[well][1] for well in rest}))
+    return PlatePlan(multi + single, tip_volume)
+
+
+def run_plate_map(plan: PlatePlan, ehm_plate, containers, pipette_tips, tip_dropzone=None, p_multi=None, p_single=None,
+                  sources: Optional[Dict[str, Union[float, str]]] = None, fill_height: Optional[float] = None):
+    """
+    Executes a compiled plate map, the multichannel passes with p_multi, then the single channel passes with p_single
+    The multichannel tips are kept by pipette_tips.planner (a TipPlanner is attached for the run if none is set)
+    :param sources: reagent -> stock x position, default: the reagent name, routed via containers.reagents
+        (single channel passes need an x position)
+    :param fill_height: dispense height of the single channel, default = ehm_plate.add_height
+    """
+    sources = sources or {}
+    if plan.multichannel and p_multi is None:
+        raise ValueError("Plan has multichannel passes, but no multichannel pipettor was given")
+    if plan.single and p_single is None:
+        raise ValueError("Plan has single channel passes, but no single channel pipettor was given")
+    for step in plan.single:
+        if isinstance(sources.get(step.reagent, step.reagent), str):
+            raise ValueError(f"Single channel pass of {step.reagent!r} needs the x position of its stock in sources")
+
+    if plan.multichannel:
+        planner = pipette_tips.planner
+        if planner is None:
+            pipette_tips.planner = TipPlanner()
+        try:
+            for step in plan.multichannel:
+                print(f"Plate map: {step}")
+                fill_multi(p_multi, ehm_plate, containers, pipette_tips, sources.get(step.reagent, step.reagent),
+                           list(step.volumes), step.volumes)
+            release_tips_multi(p_multi, containers, pipette_tips)
+        finally:
+            pipette_tips.planner = planner
+
+    if fill_height is None:
+        fill_height = ehm_plate.add_height
+    for step in plan.single:
+        print(f"Plate map: {step}")
+        fill(p_single, ehm_plate, containers, pipette_tips, tip_dropzone, sources.get(step.reagent, step.reagent),
+             0, 0, step.volumes, fill_height)
+    print(f"Plate map done: {len(plan.passes)} passes")
@@ -0,0 +1,543 @@
+"""
+Operator prompts that do not stop the protocol
+ask() queues a prompt and returns at once, a backend (terminal, local web page, files or headless for tests)
+shows it and delivers the answer. Steps that need an answer are deferred with defer() and run by run_ready()
+between other steps, so the robot keeps working on everything that does not depend on the operator.
+Prompts can wait for other prompts (after=...) and fall back to a default answer after a timeout.
+"""
+import html
+import itertools
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from urllib.parse import parse_qs
+
+from envs import env
+
+# buttons of the MessageBoxW styles used by Baseclass.Mbox and the codes MessageBoxW returns for them
+STYLES = {
+    0: ("OK",),
+    1: ("OK", "Cancel"),
+    2: ("Abort", "Retry", "Ignore"),
+    3: ("Yes", "No", "Cancel"),
+    4: ("Yes", "No"),
+    5: ("Retry", "Cancel"),
+    6: ("Cancel", "Try Again", "Continue"),
+}
+RESULTS = {
+    "OK": 1,
+    "Cancel": 2,
+    "Abort": 3,
+    "Retry": 4,
+    "Ignore": 5,
+    "Yes": 6,
+    "No": 7,
+    "Try Again": 10,
+    "Continue": 11,
+}
+
+
+class Prompt:
+    """
+    A question to the operator
+    :param choices: possible answers, e.g. STYLES[1]
+    :param key: name other prompts and deferred steps refer to, default: the id
+    :param timeout: seconds after which default is taken as the answer (or the prompt fails without default)
+    :param after: keys of prompts that have to be answered before this one is shown
+    """
+
+    def __init__(
+        self,
+        id: int,
+        text: str,
+        title: str = "",
+        choices: Sequence[str] = ("OK",),
+        key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        default: Optional[str] = None,
+        after: Sequence[str] = (),
+    ):
+        if default is not None and default not in choices:
+            raise ValueError(f"Default {default!r} is not one of {list(choices)}")
+        self.id = id
+        self.text = text
+        self.title = title
+        self.choices = tuple(choices)
+        self.key = key or str(id)
+        self.timeout = timeout
+        self.default = default
+        self.after = tuple(after)
+        self.created = time.time()
+        self.shown: Optional[float] = None
+        self.answer: Optional[str] = None
+        self.answered_by = ""
+        self.timed_out = False
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """Timeout counted from when the prompt was shown"""
+        if self.timeout is None or self.shown is None:
+            return None
+        return self.shown + self.timeout
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Blocks until answered
+        :raise TimeoutError: if there is no answer within timeout seconds, or the prompt expired without default
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"No answer to {self.title!r} within {timeout}s")
+        if self.answer is None:
+            raise TimeoutError(f"{self.title!r} was not answered within {self.timeout}s and has no default")
+        return self.answer
+
+    def result(self, timeout: Optional[float] = None) -> int:
+        """Answer as the MessageBoxW return code"""
+        return RESULTS.get(self.wait(timeout), 0)
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "key": self.key,
+            "title": self.title,
+            "text": self.text,
+            "choices": list(self.choices),
+            "default": self.default,
+            "deadline": self.deadline,
+            "answer": self.answer,
+        }
+
+    def __repr__(self):
+        state = f"answer={self.answer!r}" if self.done else "open"
+        return f"Prompt({self.id}, {self.title!r}, {state})"
+
+
+class Backend:
+    """Shows prompts to the operator and passes answers to queue.answer(), override the methods that are needed"""
+
+    def start(self, queue: "PromptQueue"):
+        self.queue = queue
+
+    def show(self, prompt: Prompt):
+        pass
+
+    def withdraw(self, prompt: Prompt):
+        """The prompt was answered (maybe elsewhere) or expired"""
+        pass
+
+    def close(self):
+        pass
+
+
+class PromptQueue:
+    """
+    Queued operator prompts and the steps waiting for their answers
+    :param backend: default from env PIPETTOR_PROMPTS (terminal, web, file, headless), terminal if not set
+    """
+
+    def __init__(self, backend: Optional[Backend] = None):
+        self.backend = backend or backend_from_env()
+        self.prompts: Dict[str, Prompt] = {}
+        self._deferred: List[tuple] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self.backend.start(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.backend.close()
+
+    def ask(
+        self,
+        text: str,
+        title: str = "",
+        style: Optional[int] = 0,
+        choices: Optional[Sequence[str]] = None,
+        key: Optional[str] = None,
+        timeout: Optional[float] = None,
+        default: Optional[str] = None,
+        after: Sequence[str] = (),
+    ) -> Prompt:
+        """
+        Queues a prompt and returns without waiting, see Prompt for the parameters
+        :param style: MessageBoxW style for the choices, see STYLES
+        """
+        with self._lock:
+            prompt = Prompt(next(self._ids), text, title, choices or STYLES[style], key, timeout, default, after)
+            if prompt.key in self.prompts and not self.prompts[prompt.key].done:
+                raise ValueError(f"Prompt {prompt.key!r} is still open")
+            unknown = [key for key in prompt.after if key not in self.prompts]
+            if unknown:
+                raise ValueError(f"Prompt {prompt.key!r} waits for unknown prompts {unknown}")
+            self.prompts[prompt.key] = prompt
+            self._show_ready()
+        return prompt
+
+    def answer(self, key: Union[str, int], choice: str, by: str = "") -> bool:
+        """
+        Called by the backends, the first answer wins
+        :param key: key or id of the prompt
+        :return: False if the prompt is unknown, not shown yet, already answered or choice is invalid
+        """
+        with self._lock:
+            prompt = self.get(key)
+            if prompt is None or prompt.done or prompt.shown is None or choice not in prompt.choices:
+                return False
+            prompt.answer = choice
+            prompt.answered_by = by
+            prompt._done.set()
+            self.backend.withdraw(prompt)
+            self._show_ready()
+        print(f"Operator answered {prompt.title!r}: {choice}")
+        return True
+
+    def get(self, key: Union[str, int]) -> Optional[Prompt]:
+        if key in self.prompts:
+            return self.prompts[key]
+        return next((p for p in self.prompts.values() if str(p.id) == str(key)), None)
+
+    def open(self) -> List[Prompt]:
+        """Prompts shown and waiting for an answer"""
+        with self._lock:
+            return [p for p in self.prompts.values() if p.shown is not None and not p.done]
+
+    def _show_ready(self):
+        for prompt in self.prompts.values():
+            if prompt.shown is None and all(self.prompts[key].done for key in prompt.after):
+                prompt.shown = time.time()
+                self.backend.show(prompt)
+
+    def expire(self) -> List[Prompt]:
+        """Answers prompts past their deadline with their default, called by run_ready()"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for prompt in self.prompts.values():
+                if not prompt.done and prompt.deadline is not None and now >= prompt.deadline:
+                    prompt.answer = prompt.default
+                    prompt.answered_by = "timeout"
+                    prompt.timed_out = True
+                    prompt._done.set()
+                    self.backend.withdraw(prompt)
+                    expired.append(prompt)
+            if expired:
+                self._show_ready()
+        for prompt in expired:
+            print(f"No answer to {prompt.title!r} within {prompt.timeout}s, using {prompt.default!r}")
+        return expired
+
+    def wait(self, key: Union[str, int], timeout: Optional[float] = None, poll: float = 0.1) -> str:
+        """
+        Blocks until the prompt is answered or expired, the blocking counterpart of defer()
+        :raise TimeoutError: see Prompt.wait
+        """
+        prompt = self.get(key)
+        if prompt is None:
+            raise KeyError(f"No prompt {key!r}")
+        end = None if timeout is None else time.time() + timeout
+        while not prompt._done.wait(poll):
+            self.expire()
+            if end is not None and time.time() >= end:
+                break
+        return prompt.wait(0)
+
+    def defer(self, needs: Sequence[str], func: Callable, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in run_ready() once all prompts in needs are answered
+        """
+        with self._lock:
+            unknown = [key for key in needs if key not in self.prompts]
+            if unknown:
+                raise ValueError(f"Step waits for unknown prompts {unknown}")
+            self._deferred.append((tuple(needs), func, args, kwargs))
+
+    @property
+    def pending(self) -> int:
+        """Deferred steps not run yet"""
+        return len(self._deferred)
+
+    def run_ready(self) -> int:
+        """
+        Runs the deferred steps whose prompts are answered, in the order they were deferred
+        Call it between steps of the protocol, the steps run on the calling thread
+        :raise TimeoutError: if a prompt a step needs expired without default
+        :return: number of steps run
+        """
+        self.expire()
+        count = 0
+        while True:
+            with self._lock:
+                ready = next((s for s in self._deferred if all(self.prompts[k].done for k in s[0])), None)
+                if ready is None:
+                    return count
+                needs, func, args, kwargs = ready
+                for key in needs:
+                    # raise before removing the step, so it stays in pending for the caller handling the error
+                    if self.prompts[key].answer is None:
+                        raise TimeoutError(f"Step {func.__name__} needs {key!r}, which expired without default")
+                self._deferred.remove(ready)
+            func(*args, **kwargs)
+            count += 1
+
+    def drain(self, timeout: Optional[float] = None, poll: float = 0.1):
+        """
+        Blocks until all deferred steps have run, e.g. at the end of the protocol
+        :raise TimeoutError: if steps are still waiting after timeout seconds
+        """
+        end = None if timeout is None else time.time() + timeout
+        while True:
+            self.run_ready()
+            if not self._deferred:
+                return
+            if end is not None and time.time() >= end:
+                waiting = sorted({key for needs, *_ in self._deferred for key in needs if not self.prompts[key].done})
+                raise TimeoutError(f"{len(self._deferred)} steps still wait for {waiting}")
+            time.sleep(poll)
+
+
+class HeadlessBackend(Backend):
+    """
+    Answers every prompt itself, for tests and unattended dry runs
+    :param answers: key or title -> answer, or a function prompt -> answer; otherwise the default or first choice
+    :param delay: seconds before answering, None leaves the prompts open (to test timeouts)
+    """
+
+    def __init__(
+        self, answers: Union[Dict[str, str], Callable[[Prompt], str], None] = None, delay: Optional[float] = 0
+    ):
+        self.answers = answers or {}
+        self.delay = delay
+        self.shown: List[Prompt] = []
+
+    def choose(self, prompt: Prompt) -> str:
+        if callable(self.answers):
+            return self.answers(prompt)
+        for name in (prompt.key, prompt.title):
+            if name in self.answers:
+                return self.answers[name]
+        return prompt.default or prompt.choices[0]
+
+    def show(self, prompt: Prompt):
+        self.shown.append(prompt)
+        if self.delay is None:
+            return
+        if self.delay == 0:
+            # the queue lock is reentrant, answering from show() is fine
+            self.queue.answer(prompt.key, self.choose(prompt), by="headless")
+            return
+        timer = threading.Timer(self.delay, self.queue.answer, (prompt.key, self.choose(prompt), "headless"))
+        timer.daemon = True
+        timer.start()
+
+
+class TerminalBackend(Backend):
+    """
+    Prints prompts and reads answers from stdin in a background thread
+    Answer with the number of the choice, prefixed by the prompt id if more than one prompt is open ("3 2")
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, queue: "PromptQueue"):
+        super().start(queue)
+        self._thread = threading.Thread(target=self._read, name="prompt-terminal", daemon=True)
+        self._thread.start()
+
+    def show(self, prompt: Prompt):
+        choices = "  ".join(f"({i}) {choice}" for i, choice in enumerate(prompt.choices, 1))
+        timeout = f", {prompt.timeout:.0f}s -> {prompt.default}" if prompt.timeout is not None else ""
+        print(f"\n[{prompt.id}] {prompt.title}: {prompt.text}\n    {choices}{timeout}", flush=True)
+
+    def _read(self):
+        for line in self.stream:
+            parts = line.split()
+            if not parts:
+                continue
+            open_prompts = self.queue.open()
+            if len(parts) == 1 and len(open_prompts) == 1:
+                prompt, choice = open_prompts[0], parts[0]
+            elif len(parts) == 2:
+                prompt, choice = self.queue.get(parts[0]), parts[1]
+            else:
+                print(f"Answer with <prompt id> <choice number>, open: {[p.id for p in open_prompts]}")
+                continue
+            if prompt is None or not choice.isdigit() or not 1 <= int(choice) <= len(prompt.choices):
+                print("Unknown prompt or choice")
+                continue
+            self.queue.answer(prompt.key, prompt.choices[int(choice) - 1], by="terminal")
+
+
+class FileBackend(Backend):
+    """
+    Exchanges prompts through a folder, e.g. a network share watched by another program
+    Open prompts are listed in prompts.json, an answer is given by writing the choice into <id>.answer
+    :param folder: default from env PIPETTOR_PROMPT_DIR or ./prompts
+    :param poll: seconds between checks for answer files
+    """
+
+    def __init__(self, folder=None, poll: float = 0.5):
+        self.folder = Path(folder or env("PIPETTOR_PROMPT_DIR") or "prompts")
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.poll = poll
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, queue: "PromptQueue"):
+        super().start(queue)
+        self._write()
+        self._thread = threading.Thread(target=self._watch, name="prompt-files", daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        data = [prompt.as_dict() for prompt in self.queue.open()]
+        tmp = self.folder / "prompts.json.tmp"
+        tmp.write_text(json.dumps(data, indent=2))
+        tmp.replace(self.folder / "prompts.json")
+
+    def show(self, prompt: Prompt):
+        self._write()
+
+    def withdraw(self, prompt: Prompt):
+        self._write()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll):
+            for path in self.folder.glob("*.answer"):
+                prompt = self.queue.get(path.stem)
+                if prompt is not None:
+                    self.queue.answer(prompt.key, path.read_text().strip(), by="file")
+                path.unlink()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class WebBackend(Backend):
+    """
+    Local web page with the open prompts and a button per choice, http://host:port/
+    :param port: 0 picks a free port, see .port
+    """
+
+    def __init__(self, port: int = 8765, host: str = "127.0.0.1"):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path == "/prompts.json":
+                    backend._send(handler, "application/json", json.dumps([p.as_dict() for p in backend.queue.open()]))
+                elif handler.path == "/":
+                    backend._send(handler, "text/html; charset=utf-8", backend.page())
+                else:
+                    handler.send_error(404)
+
+            def do_POST(handler):
+                length = int(handler.headers.get("Content-Length", 0))
+                form = parse_qs(handler.rfile.read(length).decode())
+                if handler.path != "/answer" or "id" not in form or "choice" not in form:
+                    handler.send_error(400)
+                    return
+                backend.queue.answer(form["id"][0], form["choice"][0], by=f"web {handler.client_address[0]}")
+                handler.send_response(303)
+                handler.send_header("Location", "/")
+                handler.end_headers()
+
+            def log_message(handler, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @staticmethod
+    def _send(handler, content_type: str, body: str):
+        data = body.encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def page(self) -> str:
+        items = []
+        for prompt in self.queue.open():
+            buttons = "".join(
+                f'<button name="choice" value="{html.escape(choice)}">{html.escape(choice)}</button>'
+                for choice in prompt.choices
+            )
+            items.append(
+                f"<form method=post action=/answer><h3>{html.escape(prompt.title)}</h3>"
+                f"<p>{html.escape(prompt.text)}</p><input type=hidden name=id value={prompt.id}>{buttons}</form>"
+            )
+        body = "".join(items) or "<p>No open prompts</p>"
+        head = "<head><meta http-equiv=refresh content=2><title>Pipettor</title></head>"
+        return f"<html>{head}<body>{body}</body></html>"
+
+    def start(self, queue: "PromptQueue"):
+        super().start(queue)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="prompt-web", daemon=True)
+        self._thread.start()
+        print(f"Operator prompts on http://{self._server.server_address[0]}:{self.port}/")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_backends = {"terminal": TerminalBackend, "web": WebBackend, "file": FileBackend, "headless": HeadlessBackend}
+
+
+def backend_from_env() -> Backend:
+    """Backend named by env PIPETTOR_PROMPTS, terminal if not set"""
+    name = env("PIPETTOR_PROMPTS") or "terminal"
+    if name not in _backends:
+        raise ValueError(f"Unknown prompt backend {name!r}, use one of {list(_backends)}")
+    return _backends[name]()
+
+
+_queue: Optional[PromptQueue] = None
+
+
+def get_queue() -> PromptQueue:
+    """Queue used by Baseclass.Mbox, created with backend_from_env() on first use"""
+    global _queue
+    if _queue is None:
+        _queue = PromptQueue()
+    return _queue
+
+
+def use_queue(queue: Optional[PromptQueue]) -> Optional[PromptQueue]:
+    """
+    Sets the queue used by Baseclass.Mbox, returns the previous one
+    Once a queue is set, Mbox uses it on Windows as well
+    """
+    global _queue
+    previous, _queue = _queue, queue
+    return previous
+
+
+def has_queue() -> bool:
+    return _queue is not None
@@ -0,0 +1,137 @@
+"""
+Reagent map
+Lists every container well holding a reagent (or taking waste) with its volume, so the routines can
+go to the nearest well that still has enough liquid or room instead of one hard-wired position
+"""
+import math
+from typing import Dict, List, Optional
+
+
+class Location:
+    """
+    One container well
+    :param x: x position, e.g. containers.well4_x
+    :param y: y position, e.g. containers.y_corner
+    :param volume: current content (ul), None if not tracked
+    :param capacity: maximum content (ul), None if unlimited
+    :param dead_volume: content that can not be aspirated (ul)
+    :param name: shown in reports, e.g. "well4_x"
+    """
+
+    def __init__(
+        self,
+        x: float,
+        y: float,
+        volume: Optional[float] = None,
+        capacity: Optional[float] = None,
+        dead_volume: float = 0,
+        name: str = "",
+    ):
+        self.x = x
+        self.y = y
+        self.volume = volume
+        self.capacity = capacity
+        self.dead_volume = dead_volume
+        self.name = name
+
+    @property
+    def available(self) -> float:
+        """Volume that can still be aspirated"""
+        if self.volume is None:
+            return math.inf
+        return self.volume - self.dead_volume
+
+    @property
+    def free(self) -> float:
+        """Volume that can still be dispensed"""
+        if self.capacity is None:
+            return math.inf
+        return self.capacity - (self.volume or 0)
+
+    def take(self, volume: float):
+        if self.volume is not None:
+            self.volume -= volume
+
+    def put(self, volume: float):
+        if self.volume is not None:
+            self.volume += volume
+
+    def distance(self, x: float, y: float) -> float:
+        return math.hypot(self.x - x, self.y - y)
+
+    def __repr__(self) -> str:
+        return f"Location({self.name or (self.x, self.y)}, volume={self.volume})"
+
+
+class ReagentMap:
+    """
+    Sources and sinks of each reagent, "waste" is the default sink
+    Attach it to the containers (containers.reagents = reagent_map) and pass the reagent name
+    instead of a position to fill_multi, remove_multi then uses the waste sinks
+    """
+
+    def __init__(self):
+        self.locations: Dict[str, List[Location]] = {}
+
+    def add(
+        self,
+        reagent: str,
+        x: float,
+        y: float,
+        volume: Optional[float] = None,
+        capacity: Optional[float] = None,
+        dead_volume: float = 0,
+        name: str = "",
+    ) -> Location:
+        location = Location(x, y, volume, capacity, dead_volume, name)
+        self.locations.setdefault(reagent, []).append(location)
+        return location
+
+    def add_container(
+        self,
+        containers,
+        attr: str,
+        reagent: str,
+        volume: Optional[float] = None,
+        capacity: Optional[float] = None,
+        dead_volume: float = 0,
+    ) -> Location:
+        """
+        Adds a well of Reservoirs or RoundContainers
+        :param attr: x attribute of the well, e.g. "well4_x"
+        """
+        return self.add(reagent, getattr(containers, attr), containers.y_corner, volume, capacity, dead_volume, attr)
+
+    def remaining(self, reagent: str) -> float:
+        """Total volume of a reagent that can still be aspirated"""
+        return sum(location.available for location in self.locations.get(reagent, []))
+
+    def take(self, reagent: str, volume: float, x: float, y: float) -> Location:
+        """
+        Nearest source of reagent to (x, y) with at least volume left, the volume is booked
+        :raise RuntimeError: if no source has enough left
+        """
+        candidates = [loc for loc in self.locations.get(reagent, []) if loc.available >= volume]
+        if not candidates:
+            raise RuntimeError(f"No {reagent} source with {volume}ul left, {self.remaining(reagent)}ul in total")
+        location = min(candidates, key=lambda loc: loc.distance(x, y))
+        location.take(volume)
+        return location
+
+    def put(self, reagent: str, volume: float, x: float, y: float) -> Location:
+        """
+        Nearest sink of reagent to (x, y) with room for volume, the volume is booked
+        :raise RuntimeError: if no sink has enough room
+        """
+        candidates = [loc for loc in self.locations.get(reagent, []) if loc.free >= volume]
+        if not candidates:
+            raise RuntimeError(f"No {reagent} container with room for {volume}ul left")
+        location = min(candidates, key=lambda loc: loc.distance(x, y))
+        location.put(volume)
+        return location
+
+    def report(self):
+        for reagent, locations in self.locations.items():
+            for location in locations:
+                volume = "untracked" if location.volume is None else f"{location.volume:.0f}ul"
+                print(f"{reagent}: {location.name or (location.x, location.y)} {volume}")
@@ -0,0 +1,215 @@
+"""
+Background sampling of the liquid detection sensor
+The oscillation sensor is read at a fixed rate into a preallocated ring buffer while the head moves,
+so the liquid surface can be found during an ordinary descent instead of a slow move_to_surface()
+"""
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+class SensorSampler:
+    """
+    Reads p.sensor_value in a background thread
+    The first baseline_samples readings of a run are taken as the dry baseline, the surface is detected
+    where the moving average of window samples shifts more than threshold from it
+    :param p: Pipettor
+    :param rate: samples per second
+    :param capacity: ring buffer size, the oldest samples are overwritten
+    :param threshold: minimum frequency shift counted as liquid contact, in sensor units
+    :param noise_factor: the threshold is raised to noise_factor times the baseline standard deviation
+    :param on_detect: called from the sampling thread with (time, value) when contact is detected,
+        e.g. to stop the move
+    :param read: returns one sensor reading, default p.sensor_value
+    :param lock: held during each reading, other threads using p at the same time have to hold it too
+    """
+
+    def __init__(
+        self,
+        p=None,
+        rate: float = 200.0,
+        capacity: int = 4096,
+        threshold: float = 50.0,
+        noise_factor: float = 5.0,
+        baseline_samples: int = 20,
+        window: int = 4,
+        on_detect: Optional[Callable[[float, float], None]] = None,
+        read: Optional[Callable[[], float]] = None,
+        lock: Optional[threading.Lock] = None,
+    ):
+        if read is None:
+            read = lambda: p.sensor_value  # noqa: E731
+        self.read = read
+        self.lock = lock or threading.Lock()
+        self.rate = rate
+        self.threshold = threshold
+        self.noise_factor = noise_factor
+        self.baseline_samples = baseline_samples
+        self.window = window
+        self.on_detect = on_detect
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.count = 0
+        self.detected: Optional[Tuple[float, float]] = None
+        self._baseline: Optional[Tuple[float, float]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset(self):
+        self.count = 0
+        self.detected = None
+        self._baseline = None
+
+    def start(self):
+        """Starts a new run, the buffer is cleared"""
+        if self._thread is not None:
+            raise RuntimeError("Sampler is already running")
+        self.reset()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def samples(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(times, values) of the buffered samples, oldest first"""
+        capacity = len(self.values)
+        n = min(self.count, capacity)
+        if self.count <= capacity:
+            return self.times[:n].copy(), self.values[:n].copy()
+        start = self.count % capacity
+        order = np.r_[start:capacity, 0:start]
+        return self.times[order], self.values[order]
+
+    def detect(self) -> Optional[float]:
+        """Time of the first liquid contact in the buffer, None if there was none"""
+        times, values = self.samples()
+        index = detect_shift(values, self.threshold, self.noise_factor, self.baseline_samples, self.window)
+        return None if index is None else float(times[index])
+
+    def _run(self):
+        capacity = len(self.values)
+        period = 1.0 / self.rate
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            with self.lock:
+                now = time.perf_counter()
+                value = float(self.read())
+            i = self.count % capacity
+            self.times[i] = now
+            self.values[i] = value
+            self.count += 1
+            if self.detected is None:
+                self._check(now, value)
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+
+    def _check(self, now: float, value: float):
+        n = self.count
+        if n < self.baseline_samples:
+            return
+        if self._baseline is None:
+            baseline = self.values[: self.baseline_samples]
+            self._baseline = (float(baseline.mean()), max(self.threshold, self.noise_factor * float(baseline.std())))
+            return
+        if n < self.baseline_samples + self.window:
+            return
+        capacity = len(self.values)
+        recent = self.values[(np.arange(n - self.window, n)) % capacity]
+        mean, threshold = self._baseline
+        if abs(recent.mean() - mean) > threshold:
+            self.detected = (now, value)
+            if self.on_detect is not None:
+                self.on_detect(now, value)
+
+
+def detect_shift(
+    values: np.ndarray, threshold: float = 50.0, noise_factor: float = 5.0, baseline_samples: int = 20, window: int = 4
+) -> Optional[int]:
+    """
+    Index of the first sample where the moving average shifts from the baseline, None if it never does
+    The index is the last sample of the first window over the threshold
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < baseline_samples + window:
+        return None
+    baseline = values[:baseline_samples]
+    threshold = max(threshold, noise_factor * baseline.std())
+    smoothed = np.convolve(values[baseline_samples:], np.ones(window) / window, mode="valid")
+    hits = np.flatnonzero(np.abs(smoothed - baseline.mean()) > threshold)
+    if len(hits) == 0:
+        return None
+    return baseline_samples + int(hits[0]) + window - 1
+
+
+def descend_to_surface(
+    p,
+    z_target: float,
+    sampler: Optional[SensorSampler] = None,
+    settle: Optional[float] = None,
+    stop: Optional[Callable[[], None]] = None,
+    timeout: float = 60,
+    tolerance: float = 0.05,
+) -> Optional[float]:
+    """
+    Starts the move to z_target and samples the sensor meanwhile, the z axis is stopped as soon as liquid is detected
+    The surface height is interpolated at the detection time from the z positions polled during the move,
+    which replaces a separate move_to_surface() search
+    z is polled at the sampler rate, holding the sampler's lock so the two threads never talk to the device at once
+    :param sampler: SensorSampler of p, default a new one with default settings
+    :param settle: sampling time before the move for the dry baseline, default baseline_samples / rate
+    :param stop: halts the z axis, default a move to the current z, which replaces the running target
+    :param timeout: seconds until the move has to be finished
+    :param tolerance: distance (mm) from z_target at which the move counts as finished, about the axis resolution
+    :return: estimated z of the liquid surface, None if no liquid was detected before z_target
+    """
+    sampler = sampler or SensorSampler(p)
+    if settle is None:
+        settle = sampler.baseline_samples / sampler.rate
+    if stop is None:
+        stop = lambda: p.move_z(p.z_position)  # noqa: E731
+    track = [(time.perf_counter(), p.xyz_position[2])]
+    with sampler:
+        time.sleep(settle)
+        # the baseline has to be dry, wait for the thread if it started late
+        while sampler.count < sampler.baseline_samples:
+            time.sleep(1 / sampler.rate)
+        t_start = time.perf_counter()
+        with sampler.lock:
+            p.move_z(z_target, wait=False)
+        while True:
+            with sampler.lock:
+                z = p.z_position
+                track.append((time.perf_counter(), z))
+                if sampler.detected is not None:
+                    stop()
+                    break
+            if abs(z - z_target) <= tolerance:
+                break
+            if track[-1][0] - t_start > timeout:
+                with sampler.lock:
+                    stop()
+                raise RuntimeError(f"z did not reach {z_target} within {timeout}s, stopped at {z}")
+            time.sleep(1 / sampler.rate)
+    t_contact = sampler.detected[0] if sampler.detected is not None else sampler.detect()
+    if t_contact is None or t_contact < t_start:
+        return None
+    times, zs = np.array(track).T
+    return float(np.interp(t_contact, times, zs))
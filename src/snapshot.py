@@ -0,0 +1,243 @@
+"""
+Instrument state snapshot
+The state (position, tip, speeds, tip box) is saved on a clean exit and checked with one cheap
+position poll on the next connect, the full initialization (homing all axes) only runs when
+the saved state can not be trusted
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from envs import env
+
+from .instrumented import SPEEDS, InstrumentedPipettor
+
+_snapshot_env: str = "PIPETTOR_SNAPSHOT"
+_snapshot_file = Path(tempfile.gettempdir()) / "biohit_pipettor_state.json"
+
+
+def snapshot_path(path=None) -> Path:
+    """Snapshot file, default from env PIPETTOR_SNAPSHOT"""
+    if path is None and env(_snapshot_env) is not None:
+        path = env(_snapshot_env)
+    return Path(path) if path is not None else _snapshot_file
+
+
+class InstrumentSnapshot:
+    """
+    State of the pipettor and the tip box at the end of a run
+    :param position: (x, y, z) of the head
+    :param has_tip: whether a tip is attached
+    :param tip_content: liquid in the tip (ul), as far as it is known
+    :param speeds: speed settings, see instrumented.SPEEDS
+    :param tip_volume: tip volume the pipettor was connected with
+    :param multichannel: whether the pipettor was connected as multichannel
+    :param next_column: next tip column of the multichannel tip box, PipetteTips.next_column
+    :param next_tip: next tip of the single channel tip box, PipetteTips.next_tip
+    """
+
+    def __init__(
+        self,
+        position,
+        has_tip: bool,
+        tip_content: float,
+        speeds: Dict[str, float],
+        tip_volume: int,
+        multichannel: bool,
+        next_column: int = 0,
+        next_tip: int = 0,
+        saved_at: Optional[float] = None,
+    ):
+        self.position = tuple(float(v) for v in position)
+        self.has_tip = bool(has_tip)
+        self.tip_content = float(tip_content)
+        self.speeds = dict(speeds)
+        self.tip_volume = tip_volume
+        self.multichannel = bool(multichannel)
+        self.next_column = next_column
+        self.next_tip = next_tip
+        self.saved_at = time.time() if saved_at is None else saved_at
+
+    @classmethod
+    def capture(
+        cls,
+        p,
+        tip_volume: int,
+        multichannel: bool,
+        pipette_tips=None,
+        tip_content: Optional[float] = None,
+        has_tip: Optional[bool] = None,
+    ):
+        """
+        Reads the state from the device
+        The device can not be polled for the tip, tip state and content come from the caller's bookkeeping
+        :param tip_content: liquid in the tip, default taken from an InstrumentedPipettor (as returned by
+            PipettorSession), for a plain Pipettor it has to be given
+        :param has_tip: whether a tip is attached, default InstrumentedPipettor.tip_attached
+        """
+        if tip_content is None or has_tip is None:
+            if not isinstance(p, InstrumentedPipettor):
+                raise ValueError("Tip state is only tracked by InstrumentedPipettor, pass tip_content and has_tip")
+            tip_content = p.tip_content if tip_content is None else tip_content
+            has_tip = p.tip_attached if has_tip is None else has_tip
+        speeds = {}
+        for name in SPEEDS:
+            try:
+                speeds[name] = getattr(p, name)
+            except Exception:
+                continue
+        return cls(
+            p.xyz_position,
+            has_tip,
+            tip_content,
+            speeds,
+            tip_volume,
+            multichannel,
+            getattr(pipette_tips, "next_column", 0),
+            getattr(pipette_tips, "next_tip", 0),
+        )
+
+    def save(self, path=None):
+        path = snapshot_path(path)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.__dict__, indent=2))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=None) -> Optional["InstrumentSnapshot"]:
+        path = snapshot_path(path)
+        try:
+            return cls(**json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def matches(
+        self,
+        p,
+        tip_volume: int,
+        multichannel: bool,
+        tolerance: float = 0.5,
+        max_age: float = 12 * 3600,
+        has_tip: Optional[bool] = None,
+    ):
+        """
+        Reason why the device does not match the snapshot, None if it does
+        Costs one position poll and one piston poll. The tip can not be polled, a snapshot with a tip
+        attached only matches if the caller confirms it with has_tip
+        :param has_tip: whether a tip is attached as far as the caller knows, None if unknown
+        """
+        if self.tip_volume != tip_volume or self.multichannel != multichannel:
+            return "connected with different tip volume or channel mode"
+        if self.tip_content > 0:
+            return f"{self.tip_content}ul left in the tip"
+        if time.time() - self.saved_at > max_age:
+            return "snapshot is too old"
+        position = p.xyz_position
+        if any(abs(a - b) > tolerance for a, b in zip(position, self.position)):
+            return f"head at {tuple(position)}, snapshot says {self.position}"
+        piston = p.piston_position
+        if abs(piston) > 1e-3:
+            return f"piston at {piston}, not empty"
+        if has_tip is None and self.has_tip:
+            return "a tip was attached, tip state unknown"
+        if has_tip is not None and bool(has_tip) != self.has_tip:
+            return "tip state changed"
+        return None
+
+    def restore(self, p, pipette_tips=None):
+        """Sends the saved speed settings and restores the tip box state"""
+        if self.tip_content > 0:
+            raise RuntimeError(f"{self.tip_content}ul left in the tip, the pipettor has to be initialized")
+        for name, value in self.speeds.items():
+            setattr(p, name, value)
+        if pipette_tips is not None:
+            pipette_tips.next_column = self.next_column
+            pipette_tips.next_tip = self.next_tip
+
+
+def save_state(p, tip_volume: int, multichannel: bool, pipette_tips=None, path=None):
+    """Saves the state after a clean run"""
+    InstrumentSnapshot.capture(p, tip_volume, multichannel, pipette_tips).save(path)
+    print(f"Saved pipettor state to {snapshot_path(path)}")
+
+
+def connect(
+    tip_volume: int = 1000,
+    multichannel: bool = True,
+    pipette_tips=None,
+    path=None,
+    tolerance: float = 0.5,
+    max_age: float = 12 * 3600,
+    pipettor_cls=None,
+    has_tip: Optional[bool] = None,
+):
+    """
+    Connects without initialization if the saved state is still valid, otherwise initializes
+    The snapshot is consumed, a run that does not end cleanly leaves none behind
+    :param pipette_tips: PipetteTips whose tip box state is restored
+    :param pipettor_cls: Pipettor class, default biohit_pipettor.Pipettor
+    :param has_tip: whether a tip is attached as far as the caller knows, see InstrumentSnapshot.matches()
+    :return: (pipettor, True if the state was restored)
+    """
+    if pipettor_cls is None:
+        from biohit_pipettor import Pipettor as pipettor_cls
+
+    snapshot = InstrumentSnapshot.load(path)
+    try:
+        snapshot_path(path).unlink()
+    except OSError:
+        pass
+
+    p = pipettor_cls(tip_volume=tip_volume, multichannel=multichannel, initialize=False)
+    if snapshot is None:
+        reason = "no snapshot"
+    else:
+        reason = snapshot.matches(p, tip_volume, multichannel, tolerance, max_age, has_tip)
+    if reason is None:
+        snapshot.restore(p, pipette_tips)
+        print("Restored pipettor state, skipping initialization")
+        return p, True
+    print(f"Initializing pipettor ({reason})")
+    p.initialize()
+    return p, False
+
+
+class PipettorSession:
+    """
+    Context manager around connect() and save_state()
+    The state is only saved when the block exits without an exception
+
+    with PipettorSession(1000, True, pipette_tips) as p:
+        ...
+
+    p is an InstrumentedPipettor, so the tip state and the liquid left in the tip are known when the state is saved
+    """
+
+    def __init__(self, tip_volume: int = 1000, multichannel: bool = True, pipette_tips=None, path=None, **kwargs):
+        self.tip_volume = tip_volume
+        self.multichannel = multichannel
+        self.pipette_tips = pipette_tips
+        self.path = path
+        self.kwargs = kwargs
+        self.p = None
+        self.restored = False
+
+    def __enter__(self):
+        p, self.restored = connect(self.tip_volume, self.multichannel, self.pipette_tips, self.path, **self.kwargs)
+        # tracks the tip content for the snapshot
+        self.p = InstrumentedPipettor(p)
+        if self.restored:
+            # a restored snapshot with a tip needs has_tip=True from the caller, otherwise there is none
+            self.p.position[:] = p.xyz_position
+            self.p.tip_attached = bool(self.kwargs.get("has_tip"))
+        return self.p
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            save_state(self.p, self.tip_volume, self.multichannel, self.pipette_tips, self.path)
+        close = getattr(self.p, "__exit__", None)
+        if close is not None:
+            close(exc_type, exc_val, exc_tb)
@@ -0,0 +1,84 @@
+"""
+Load-adaptive speed settings
+Empty-tip travel runs at fast settings, moves carrying liquid and approaches/aspirations
+over the tissue plate run at careful settings
+"""
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+from .instrumented import InstrumentedPipettor, Observer
+
+Region = Tuple[float, float, float, float]
+
+# careful settings as used in the CRC scripts, fast settings for empty tips (the device accepts steps 1-9)
+CAREFUL = {"x_speed": 7, "y_speed": 7, "z_speed": 8, "aspirate_speed": 1}
+FAST = {"x_speed": 9, "y_speed": 9, "z_speed": 9, "aspirate_speed": 4}
+
+
+def plate_region(ehm_plate, margin: float = 5) -> Region:
+    """Bounding box (x_min, y_min, x_max, y_max) of all wells of an EHMPlatePos"""
+    xs = [ehm_plate.x_corner, ehm_plate.x_corner_multi, ehm_plate.x_corner + (ehm_plate.cols - 1) * ehm_plate.x_step]
+    ys = [ehm_plate.y_corner, ehm_plate.y_corner_multi, ehm_plate.y_corner + 7 * ehm_plate.y_step]
+    return min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin
+
+
+class SpeedProfile(Observer):
+    """
+    Switches between fast and careful speed settings before each command of an InstrumentedPipettor
+    Only settings that differ from the current ones are sent, and only for the axes the command uses
+    :param fast: speed settings for empty tips and moves away from the plate
+    :param careful: speed settings when carrying liquid, descending into and aspirating from careful regions
+    :param careful_regions: (x_min, y_min, x_max, y_max) areas with tissue, see plate_region()
+    :param loaded_volume: tip content from which XY moves count as carrying liquid
+    :param short_move: moves shorter than this (mm) that need no careful setting keep the current one,
+        to avoid an extra round trip
+    """
+
+    def __init__(
+        self,
+        fast: Optional[Dict[str, float]] = None,
+        careful: Optional[Dict[str, float]] = None,
+        careful_regions: Iterable[Region] = (),
+        loaded_volume: float = 100,
+        short_move: float = 10,
+    ):
+        self.fast = dict(FAST if fast is None else fast)
+        self.careful = dict(CAREFUL if careful is None else careful)
+        self.careful_regions = list(careful_regions)
+        self.loaded_volume = loaded_volume
+        self.short_move = short_move
+        self.changes = 0
+
+    def attach(self, p: InstrumentedPipettor) -> InstrumentedPipettor:
+        p.observers.append(self)
+        return p
+
+    def in_careful_region(self, x: float, y: float) -> bool:
+        return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, y0, x1, y1 in self.careful_regions)
+
+    def before_command(self, p: InstrumentedPipettor, name: str, args: tuple):
+        x, y, z = p.position
+        loaded = p.tip_content >= self.loaded_volume
+        if name in ("move_xy", "move_x", "move_y"):
+            tx, ty, _ = p.target(name, args)
+            # a loaded tip is never moved at fast settings, however short the move
+            if not loaded and math.hypot(tx - x, ty - y) < self.short_move:
+                return
+            self._apply(p, self.careful if loaded else self.fast, ("x_speed", "y_speed"))
+        elif name == "move_z":
+            tz = args[0]
+            descending = tz > z
+            careful = loaded or (descending and self.in_careful_region(x, y))
+            if not careful and abs(tz - z) < self.short_move:
+                return
+            self._apply(p, self.careful if careful else self.fast, ("z_speed",))
+        elif name == "aspirate":
+            careful = self.in_careful_region(x, y)
+            self._apply(p, self.careful if careful else self.fast, ("aspirate_speed",))
+
+    def _apply(self, p: InstrumentedPipettor, settings: Dict[str, float], names: Tuple[str, ...]):
+        for name in names:
+            value = settings.get(name)
+            if value is not None and p.speeds.get(name) != value:
+                setattr(p, name, value)
+                self.changes += 1
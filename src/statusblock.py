@@ -0,0 +1,258 @@
+"""
+Live status of the running protocol in a memory-mapped file
+The protocol publishes position, tip state, current routine/step and ETA after every command,
+any number of local monitors read it without talking to the device.
+Writes are guarded by a sequence counter (odd while writing), readers retry until they get a consistent copy.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from envs import env
+
+from . import clock
+from .instrumented import InstrumentedPipettor, Observer
+from .tracing import Tracer, default_tracer
+
+MAGIC = b"BHST"
+VERSION = 1
+_HEADER = struct.Struct("<4sHH")  # magic, version, size of the block
+_SEQ = struct.Struct("<Q")
+# pid, timestamp, x, y, z, tip attached, tip content, commands, failed commands, eta, routine, step
+_BODY = struct.Struct("<Id3d?dQQd64s64s")
+_SEQ_OFFSET = _HEADER.size
+_BODY_OFFSET = _SEQ_OFFSET + _SEQ.size
+SIZE = _BODY_OFFSET + _BODY.size
+
+
+def status_path(path=None) -> Path:
+    """Status file, default from env PIPETTOR_STATUS or biohit_status.bin in the temp folder"""
+    if path is None:
+        path = env("PIPETTOR_STATUS")
+    return Path(path) if path is not None else Path(tempfile.gettempdir()) / "biohit_status.bin"
+
+
+def _text(value: bytes) -> str:
+    return value.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+class StatusPublisher(Observer):
+    """
+    Writes the state of an InstrumentedPipettor into the status block after every command
+    The running @traced routines are published as routine (outermost) and step (innermost), see follow();
+    step() and routine() publish what the protocol is doing outside of them and when it is expected to finish,
+    plan() derives the ETA from the routines run so far
+    :param path: status file, see status_path()
+    :param tracer: tracer whose routine spans are followed, None to set routine and step only by hand
+    """
+
+    def __init__(self, path=None, tracer: Optional[Tracer] = default_tracer):
+        self.path = status_path(path)
+        # a monitor may still have the block of the last run mapped, so the file is never truncated,
+        # only extended and overwritten in place
+        self._file = open(self.path, "a+b")
+        if os.fstat(self._file.fileno()).st_size < SIZE:
+            self._file.truncate(SIZE)
+        self._map = mmap.mmap(self._file.fileno(), SIZE)
+        self._seq = 0
+        if _HEADER.unpack_from(self._map, 0) == (MAGIC, VERSION, SIZE):
+            # continue the sequence, readers only compare it before and after their copy
+            self._seq = _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0] // 2 * 2
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+        self._map[_BODY_OFFSET:SIZE] = bytes(_BODY.size)
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION, SIZE)
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+        self.routine_name = ""
+        self.step_name = ""
+        self.eta = 0.0
+        self._last: Optional[InstrumentedPipettor] = None
+        self._spans: List[str] = []
+        self._outer = ""
+        self._planned = 0
+        self._done = 0
+        self._plan_start = 0.0
+        self._tracer: Optional[Tracer] = None
+        if tracer is not None:
+            self.follow(tracer)
+
+    def attach(self, p: InstrumentedPipettor) -> InstrumentedPipettor:
+        p.observers.append(self)
+        self.publish(p)
+        return p
+
+    def close(self):
+        if self._tracer is not None:
+            self._tracer.listeners.remove(self)
+            self._tracer = None
+        self._map.close()
+        self._file.close()
+
+    def follow(self, tracer: Tracer = default_tracer) -> "StatusPublisher":
+        """Publishes the routine spans of tracer, a single protocol per process is assumed"""
+        if self._tracer is not None:
+            self._tracer.listeners.remove(self)
+        tracer.listeners.append(self)
+        self._tracer = tracer
+        return self
+
+    def plan(self, routines: int) -> "StatusPublisher":
+        """
+        Derives the ETA from the routine spans, the protocol runs the given number of outermost @traced routines
+        from now on. After each of them the ETA is their mean duration so far, pauses included, times the ones left
+        """
+        self._planned = routines
+        self._done = 0
+        self._plan_start = clock.get_clock().time()
+        return self
+
+    def span_enter(self, span):
+        if span.cat != "routine":
+            return
+        if not self._spans:
+            self._outer = self.routine_name
+        self._spans.append(span.name)
+        self.step(self._spans[-1] if len(self._spans) > 1 else "", self._spans[0])
+
+    def span_exit(self, span):
+        if span.cat != "routine" or not self._spans:
+            return
+        # spans nest, the one ending is the innermost
+        self._spans.pop()
+        if self._spans:
+            self.step(self._spans[-1] if len(self._spans) > 1 else "", self._spans[0])
+        else:
+            self.step("", self._outer, self._estimate())
+
+    def _estimate(self) -> Optional[float]:
+        """ETA after an outermost routine ended, None without a plan"""
+        if not self._planned:
+            return None
+        self._done += 1
+        elapsed = clock.get_clock().time() - self._plan_start
+        return time.time() + elapsed / self._done * max(self._planned - self._done, 0)
+
+    def after_command(self, p, name, args, seconds, failed):
+        self.publish(p)
+
+    def step(self, step: str = "", routine: Optional[str] = None, eta: Optional[float] = None):
+        """
+        Sets the current step
+        :param eta: expected end of the protocol as time.time(), 0 if unknown
+        """
+        if routine is not None:
+            self.routine_name = routine
+        self.step_name = step
+        if eta is not None:
+            self.eta = eta
+        if self._last is not None:
+            self.publish(self._last)
+
+    @contextmanager
+    def routine(self, name: str, eta: Optional[float] = None):
+        """Publishes name as the current routine while the block runs"""
+        previous = self.routine_name
+        self.step("", name, eta)
+        try:
+            yield self
+        finally:
+            self.step("", previous)
+
+    def publish(self, p: InstrumentedPipettor):
+        self._last = p
+        x, y, z = p.position
+        body = (
+            os.getpid(),
+            time.time(),
+            x,
+            y,
+            z,
+            p.tip_attached,
+            p.tip_content,
+            p.command_count,
+            p.failed_count,
+            self.eta,
+            self.routine_name.encode()[:64],
+            self.step_name.encode()[:64],
+        )
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+        _BODY.pack_into(self._map, _BODY_OFFSET, *body)
+        self._seq += 1
+        _SEQ.pack_into(self._map, _SEQ_OFFSET, self._seq)
+
+
+class StatusReader:
+    """
+    Reads the status block of a running protocol, no device traffic
+    :param path: status file, see status_path()
+    """
+
+    def __init__(self, path=None):
+        self.path = status_path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), SIZE, access=mmap.ACCESS_READ)
+        magic, version, size = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or size != SIZE:
+            raise ValueError(f"{self.path} is not a version {VERSION} status block")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def read(self, retries: int = 1000) -> Dict[str, object]:
+        """Consistent copy of the status"""
+        for _ in range(retries):
+            before = _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0]
+            if before % 2 == 0:
+                body = _BODY.unpack_from(self._map, _BODY_OFFSET)
+                if _SEQ.unpack_from(self._map, _SEQ_OFFSET)[0] == before:
+                    break
+            # let the writer finish
+            time.sleep(0)
+        else:
+            raise RuntimeError("Status block is being written continuously, no consistent copy")
+        pid, timestamp, x, y, z, tip_attached, tip_content, commands, failed, eta, routine, step = body
+        return {
+            "pid": pid,
+            "timestamp": timestamp,
+            "position": (x, y, z),
+            "tip_attached": tip_attached,
+            "tip_content": tip_content,
+            "commands": commands,
+            "failed": failed,
+            "eta": eta,
+            "remaining": max(eta - time.time(), 0.0) if eta else None,
+            "routine": _text(routine),
+            "step": _text(step),
+        }
+
+
+def main():
+    """python -m src.statusblock [path], prints the status of the running protocol once per second"""
+    import sys
+
+    reader = StatusReader(sys.argv[1] if len(sys.argv) > 1 else None)
+    while True:
+        s = reader.read()
+        x, y, z = s["position"]
+        remaining = "" if s["remaining"] is None else f", {s['remaining'] / 60:.0f} min left"
+        tip = f"tip {s['tip_content']:.0f}ul" if s["tip_attached"] else "no tip"
+        print(f"{s['routine']} {s['step']}: ({x:.1f}, {y:.1f}, {z:.1f}), {tip}, {s['commands']} commands{remaining}")
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    main()
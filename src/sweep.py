@@ -0,0 +1,117 @@
+"""
+Parameter sweep of a pipetting protocol on headless simulators
+Each configuration is dry-run in its own process, configurations that trigger a simulator
+error or warning are rejected, the remaining ones are ranked by estimated duration
+"""
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .instrumented import InstrumentedPipettor, MotionModel
+
+# parameters that are set on the pipettor, all other parameters are passed to the protocol
+DEVICE_SETTINGS = ("x_speed", "y_speed", "z_speed", "aspirate_speed", "dispense_speed", "tip_pickup_force")
+
+
+class SweepResult:
+    """
+    Outcome of one configuration
+    :param config: parameter values of this run
+    :param stats: InstrumentedPipettor.stats() of the run
+    :param violations: simulator errors and warnings, empty if the configuration is safe
+    """
+
+    def __init__(self, config: dict, stats: dict, violations: List[str]):
+        self.config = config
+        self.stats = stats
+        self.violations = violations
+
+    @property
+    def safe(self) -> bool:
+        return not self.violations
+
+    @property
+    def duration(self) -> float:
+        return self.stats.get("estimated_seconds", float("inf"))
+
+    def rank_key(self):
+        return (self.duration, self.stats.get("commands", 0), self.stats.get("aspirated", 0))
+
+    def __repr__(self):
+        state = "safe" if self.safe else f"rejected: {self.violations[0]}"
+        return f"SweepResult({self.config}, {self.duration:.0f}s, {self.stats.get('commands')} commands, {state})"
+
+
+def grid(**parameters: Sequence) -> List[dict]:
+    """
+    All combinations of the given parameter values
+    e.g. grid(x_speed=[5, 7], change_tips=[0, 1], cols=[[1, 2, 3], [3, 2, 1]])
+    """
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*(parameters[n] for n in names))]
+
+
+def run_config(
+    protocol: Callable,
+    config: dict,
+    tip_volume: int = 1000,
+    multichannel: bool = True,
+    motion: Optional[MotionModel] = None,
+) -> SweepResult:
+    """
+    Dry-runs protocol(p, **protocol_parameters) with one configuration on a PipettorSimulator
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from biohit_pipettor import PipettorSimulator
+
+    from .clock import VirtualClock, use_clock
+
+    use_clock(VirtualClock())
+    settings = {k: v for k, v in config.items() if k in DEVICE_SETTINGS}
+    parameters = {k: v for k, v in config.items() if k not in DEVICE_SETTINGS}
+    violations = []
+    stats: Dict = {}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            with PipettorSimulator(tip_volume=tip_volume, multichannel=multichannel, initialize=True) as sim:
+                p = InstrumentedPipettor(sim, motion)
+                for name, value in settings.items():
+                    setattr(p, name, value)
+                try:
+                    protocol(p, **parameters)
+                finally:
+                    stats = p.stats()
+        except Exception as e:
+            # any failure rejects only this configuration, the other configurations still run
+            violations.append(f"{type(e).__name__}: {e}")
+    violations.extend(f"{w.category.__name__}: {w.message}" for w in caught if issubclass(w.category, UserWarning))
+    return SweepResult(config, stats, violations)
+
+
+def run_sweep(
+    protocol: Callable,
+    configs: List[dict],
+    workers: Optional[int] = None,
+    tip_volume: int = 1000,
+    multichannel: bool = True,
+    motion: Optional[MotionModel] = None,
+) -> List[SweepResult]:
+    """
+    Runs all configurations in a process pool
+    :param protocol: module-level function protocol(p, **parameters), must be picklable
+    :param configs: list of parameter dicts, see grid()
+    :param workers: number of processes, default number of CPUs
+    :return: safe configurations ranked by estimated duration, command count and aspirated volume,
+        followed by the rejected ones
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_config, protocol, config, tip_volume, multichannel, motion) for config in configs]
+        results = [f.result() for f in futures]
+    safe = sorted((r for r in results if r.safe), key=SweepResult.rank_key)
+    rejected = [r for r in results if not r.safe]
+    print(f"{len(safe)} of {len(results)} configurations passed the simulator checks")
+    return safe + rejected
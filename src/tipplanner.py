@@ -0,0 +1,93 @@
+"""
+Contamination-aware tip reuse
+Every transfer is tagged with the liquid it aspirates and where it dispenses to, the planner
+keeps the tips as long as they cannot carry one liquid into another
+"""
+from typing import Callable, Hashable, Iterable, List, Optional, Set
+
+
+class Transfer:
+    """
+    One aspiration followed by a dispense
+    :param source: label of the liquid that is aspirated, e.g. a reservoir position or reagent name
+    :param dest: label of the liquid that is dispensed into, e.g. a plate column or "waste"
+    :param volume: transferred volume
+    :param contact: True if the tip touches the liquid in dest while dispensing
+    """
+
+    def __init__(self, source: Hashable, dest: Hashable, volume: float = 0, contact: bool = False):
+        self.source = source
+        self.dest = dest
+        self.volume = volume
+        self.contact = contact
+
+    def __repr__(self):
+        return f"Transfer({self.source!r} -> {self.dest!r}, {self.volume}, contact={self.contact})"
+
+
+class TipPlanner:
+    """
+    Decides when tips have to be changed
+    A tip is reused if every liquid it has touched so far is the liquid it is about to touch
+    (or is being transferred into), e.g. repeated dispenses from the same stock into wells
+    the tip never touched
+    :param well_group: maps a plate column to the label of its liquid when removing from the plate,
+        default: every column is its own liquid; the routines tag aspirations from wells with contact,
+        so tips that touched the cells of one well are changed before the next whatever the label
+    """
+
+    def __init__(self, well_group: Optional[Callable] = None):
+        self.well_group = well_group or (lambda col: ("plate", col))
+        self.residue: Optional[Set[Hashable]] = None
+        self.tip_changes = 0
+        self.reuses = 0
+
+    @property
+    def has_tip(self) -> bool:
+        return self.residue is not None
+
+    def needs_change(self, transfer: Transfer) -> bool:
+        """True if the next transfer could contaminate its source or destination with the current tip"""
+        if self.residue is None:
+            return True
+        # anything else on the tip would be carried into the source, and with contact into dest
+        return bool(self.residue - {transfer.source})
+
+    def new_tip(self):
+        """Records that fresh tips were picked"""
+        self.residue = set()
+        self.tip_changes += 1
+
+    def drop_tip(self):
+        """Records that the tips were ejected"""
+        self.residue = None
+
+    def record(self, transfer: Transfer):
+        """Updates the liquids the tip has touched"""
+        if self.residue is None:
+            raise RuntimeError(f"{transfer} recorded without tips")
+        self.residue.add(transfer.source)
+        if transfer.contact:
+            self.residue.add(transfer.dest)
+
+    def use(self, transfer: Transfer) -> bool:
+        """
+        Checks and records a transfer
+        :return: True if the tips have to be changed before this transfer
+        """
+        change = self.needs_change(transfer)
+        if change:
+            self.new_tip()
+        else:
+            self.reuses += 1
+        self.record(transfer)
+        return change
+
+    def plan(self, transfers: Iterable[Transfer]) -> List[bool]:
+        """
+        Tip changes for a sequence of transfers, starting from the current state without modifying it
+        :return: one flag per transfer, True if fresh tips are needed before it
+        """
+        planner = TipPlanner(self.well_group)
+        planner.residue = None if self.residue is None else set(self.residue)
+        return [planner.use(t) for t in transfers]
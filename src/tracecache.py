@@ -0,0 +1,158 @@
+"""
+Local on-disk cache of contraction traces
+Traces are stored column-wise (time, distance) as .npy files and read back memory-mapped,
+so repeated analysis runs do not depend on the database
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from envs import env
+
+
+class TraceCache:
+    """
+    Size-bounded LRU cache of traces keyed by experiment, measurement and well
+    :param folder: cache directory, default from env TRACE_CACHE_DIR
+    :param max_bytes: upper bound for the stored arrays, least recently used traces are evicted first
+    :param trace_key: returns the unique id of a trace object, default t.id
+    """
+
+    _cache_env: str = "TRACE_CACHE_DIR"
+    _cache_folder = Path.home() / ".trace_cache"
+    _index_filename: str = "index.json"
+
+    def __init__(self, folder=None, max_bytes: int = 2 * 1024**3, trace_key: Optional[Callable] = None):
+        if folder is None and env(self._cache_env) is not None:
+            folder = env(self._cache_env)
+        self.folder = Path(folder) if folder is not None else self._cache_folder
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.trace_key = trace_key or (lambda t: t.id)
+        self._index: Dict[str, dict] = self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    @staticmethod
+    def key(exp, mea, well, trace_id) -> str:
+        return f"{exp}/{mea}/{well}/{trace_id}"
+
+    @property
+    def size(self) -> int:
+        """Total number of bytes of all cached arrays"""
+        return sum(entry["nbytes"] for entry in self._index.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def keys(self, exp=None, mea=None, well=None) -> List[str]:
+        """All cached keys, optionally restricted to an experiment, measurement or well"""
+        keys = []
+        for key in self._index:
+            k_exp, k_mea, k_well, _ = key.split("/", 3)
+            if exp is not None and k_exp != str(exp):
+                continue
+            if mea is not None and k_mea != str(mea):
+                continue
+            if well is not None and k_well != str(well):
+                continue
+            keys.append(key)
+        return keys
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns memory-mapped (time, distance) arrays, None if not cached
+        The arrays are copy-on-write, in-place filtering does not modify the cache
+        """
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        path = self.folder / entry["file"]
+        if not path.is_file():
+            del self._index[key]
+            return None
+        entry["last_access"] = time.time()
+        data = np.load(path, mmap_mode="c")
+        return data[0], data[1]
+
+    def put(self, key: str, trace_time, distance):
+        """
+        Stores one trace and evicts least recently used traces if the cache grows beyond max_bytes
+        """
+        data = np.vstack([np.asarray(trace_time, dtype=np.float64), np.asarray(distance, dtype=np.float64)])
+        filename = key.replace("/", "__") + ".npy"
+        np.save(self.folder / filename, data)
+        self._index[key] = {"file": filename, "nbytes": int(data.nbytes), "last_access": time.time()}
+        self._evict()
+        self.flush()
+
+    def remove(self, key: str):
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            try:
+                os.remove(self.folder / entry["file"])
+            except (FileNotFoundError, PermissionError):
+                pass
+
+    def refresh(self, db, exp, mea, well, start_date=None) -> list:
+        """
+        Loads the traces of the given selection, only traces that are not yet cached are fetched from the database
+        :param db: ContractionDB
+        :return: trace objects with time and raw_distance set
+        """
+        kwargs = {} if start_date is None else {"start_date": start_date}
+        traces = db.get_trace_ids(exp, mea, well, **kwargs)
+        fetched = 0
+        for t in traces:
+            key = self.key(exp, mea, well, self.trace_key(t))
+            cached = self.get(key)
+            if cached is None:
+                db.add_trace(t)
+                self.put(key, t.time, t.raw_distance)
+                fetched += 1
+            else:
+                t.time, t.raw_distance = cached
+        self.flush()
+        print(f"Loaded {len(traces)} traces, {fetched} fetched from database")
+        return traces
+
+    def iter_cached(self, exp=None, mea=None, well=None) -> Iterable[Tuple[str, np.ndarray, np.ndarray]]:
+        """Yields (key, time, distance) of cached traces without touching the database"""
+        for key in self.keys(exp, mea, well):
+            cached = self.get(key)
+            if cached is not None:
+                yield (key,) + cached
+
+    def flush(self):
+        """Writes the index to disk"""
+        tmp = self.folder / (self._index_filename + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.folder / self._index_filename)
+
+    def _evict(self):
+        total = self.size
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["nbytes"]
+            self.remove(key)
+
+    def _load_index(self) -> Dict[str, dict]:
+        path = self.folder / self._index_filename
+        if not path.is_file():
+            return {}
+        with open(path) as f:
+            return json.load(f)
@@ -0,0 +1,145 @@
+"""
+Low-overhead span tracing of protocols, routines and device commands
+Spans are kept in an in-memory ring buffer and can be exported as Chrome trace / Perfetto JSON
+(open in chrome://tracing or https://ui.perfetto.dev)
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from .instrumented import InstrumentedPipettor, Observer
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: Optional[dict]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.timer()
+        for listener in self.tracer.listeners:
+            listener.span_enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = self.tracer.timer()
+        for listener in self.tracer.listeners:
+            listener.span_exit(self)
+        if not self.tracer.enabled:
+            return
+        args = self.args
+        if exc_type is not None:
+            args = dict(args or {}, error=exc_type.__name__)
+        self.tracer.events.append(("X", self.name, self.cat, self.start, end - self.start, threading.get_ident(), args))
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Records spans and instant events into a ring buffer, the oldest events are dropped when it is full
+    :param capacity: maximum number of stored events
+    :param timer: returns seconds, default time.perf_counter; use get_clock().time for simulated time
+    """
+
+    def __init__(self, capacity: int = 200000, timer: Callable[[], float] = time.perf_counter):
+        self.events: deque = deque(maxlen=capacity)
+        self.timer = timer
+        self.enabled = True
+        # objects with span_enter(span) and span_exit(span), called on the thread of the span, even if disabled
+        self.listeners: List = []
+
+    def span(self, name: str, cat: str = "routine", **args):
+        """Context manager recording the time spent inside as one span"""
+        if not self.enabled and not self.listeners:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args or None)
+
+    def instant(self, name: str, cat: str = "event", **args):
+        """Records a point in time, e.g. a failed tip pickup"""
+        if self.enabled:
+            self.events.append(("i", name, cat, self.timer(), 0.0, threading.get_ident(), args or None))
+
+    def complete(self, name: str, cat: str, start: float, duration: float, **args):
+        """Records a span with known start and duration"""
+        if self.enabled:
+            self.events.append(("X", name, cat, start, duration, threading.get_ident(), args or None))
+
+    def traced(self, cat: str = "routine"):
+        """Decorator recording every call of the function as a span"""
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(func.__name__, cat):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def clear(self):
+        self.events.clear()
+
+    def chrome_events(self) -> list:
+        """Events in the Chrome trace event format, timestamps in microseconds"""
+        pid = os.getpid()
+        result = []
+        for phase, name, cat, start, duration, tid, args in list(self.events):
+            event = {"name": name, "cat": cat, "ph": phase, "ts": start * 1e6, "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = duration * 1e6
+            else:
+                event["s"] = "t"
+            if args:
+                event["args"] = {k: v if isinstance(v, (int, float, str, bool)) else repr(v) for k, v in args.items()}
+            result.append(event)
+        return result
+
+    def export_chrome(self, path, metadata: Optional[dict] = None):
+        """Writes the recorded events as Chrome trace / Perfetto JSON"""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chrome_events(), "displayTimeUnit": "ms", "otherData": metadata or {}}, f)
+        print(f"Wrote {len(self.events)} trace events to {path}")
+
+
+class CommandTracer(Observer):
+    """Records every command of an InstrumentedPipettor as a span below the current routine"""
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.tracer = tracer or default_tracer
+        self._start = 0.0
+
+    def attach(self, p: InstrumentedPipettor) -> InstrumentedPipettor:
+        p.observers.append(self)
+        return p
+
+    def before_command(self, p, name, args):
+        self._start = self.tracer.timer()
+
+    def after_command(self, p, name, args, seconds, failed):
+        extra = {"failed": True} if failed else {}
+        self.tracer.complete(name, "command", self._start, self.tracer.timer() - self._start, **extra)
+
+
+default_tracer = Tracer()
+span = default_tracer.span
+instant = default_tracer.instant
+traced = default_tracer.traced
@@ -0,0 +1,159 @@
+"""
+Selection of wells on the 48 well EHM plate
+Columns are numbered 1..6 as in the multichannel routines (column 6 at ehm_plate.x_corner),
+rows 1..8 along y starting at ehm_plate.y_corner
+"""
+from typing import Iterable, Iterator, List, Tuple
+
+COLS = 6
+ROWS = 8
+
+
+class WellSet:
+    """
+    Immutable set of wells stored as an integer bitmask, bit (col - 1) * ROWS + (row - 1)
+    Supports set algebra with |, &, - and ^
+    :param mask: bitmask of the selected wells
+    """
+
+    __slots__ = ("mask",)
+
+    _COLUMN = (1 << ROWS) - 1
+    _ALL = (1 << (COLS * ROWS)) - 1
+
+    def __init__(self, mask: int = 0):
+        if mask & ~self._ALL:
+            raise ValueError(f"Mask {mask:#x} selects wells outside the {COLS}x{ROWS} plate")
+        self.mask = mask
+
+    @staticmethod
+    def _bit(col: int, row: int) -> int:
+        if not (1 <= col <= COLS and 1 <= row <= ROWS):
+            raise ValueError(f"Well ({col}, {row}) is outside the {COLS}x{ROWS} plate")
+        return 1 << ((col - 1) * ROWS + row - 1)
+
+    @classmethod
+    def all(cls) -> "WellSet":
+        return cls(cls._ALL)
+
+    @classmethod
+    def wells(cls, wells: Iterable[Tuple[int, int]]) -> "WellSet":
+        """Wells given as (col, row) pairs"""
+        mask = 0
+        for col, row in wells:
+            mask |= cls._bit(col, row)
+        return cls(mask)
+
+    @classmethod
+    def by_column(cls, *cols: int) -> "WellSet":
+        """All wells of the given columns"""
+        mask = 0
+        for col in cols:
+            col = int(col)
+            cls._bit(col, 1)
+            mask |= cls._COLUMN << ((col - 1) * ROWS)
+        return cls(mask)
+
+    @classmethod
+    def by_row(cls, *rows: int) -> "WellSet":
+        """All wells of the given rows"""
+        return cls.wells((col, row) for col in range(1, COLS + 1) for row in rows)
+
+    @classmethod
+    def checkerboard(cls, odd: bool = False) -> "WellSet":
+        """Every other well, starting with well (1, 1) unless odd is True"""
+        return cls.wells(
+            (col, row) for col in range(1, COLS + 1) for row in range(1, ROWS + 1) if (col + row) % 2 == int(odd)
+        )
+
+    @classmethod
+    def block(cls, n_cols: int, n_rows: int) -> "WellSet":
+        """The first n_cols x n_rows wells in the order of the single channel routines (column 6 first)"""
+        return cls.wells((COLS - i, row) for i in range(n_cols) for row in range(1, n_rows + 1))
+
+    @classmethod
+    def coerce(cls, cols) -> "WellSet":
+        """
+        Converts the column arguments used by the routines: a WellSet, a list of column numbers
+        or the number of columns (6 -> all columns)
+        """
+        if isinstance(cols, WellSet):
+            return cols
+        if isinstance(cols, int):
+            return cls.by_column(*range(1, cols + 1))
+        return cls.by_column(*cols)
+
+    def __or__(self, other: "WellSet") -> "WellSet":
+        return WellSet(self.mask | other.mask)
+
+    def __and__(self, other: "WellSet") -> "WellSet":
+        return WellSet(self.mask & other.mask)
+
+    def __sub__(self, other: "WellSet") -> "WellSet":
+        return WellSet(self.mask & ~other.mask)
+
+    def __xor__(self, other: "WellSet") -> "WellSet":
+        return WellSet(self.mask ^ other.mask)
+
+    def __invert__(self) -> "WellSet":
+        return WellSet(self._ALL & ~self.mask)
+
+    def __contains__(self, well: Tuple[int, int]) -> bool:
+        return bool(self.mask & self._bit(*well))
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __bool__(self) -> bool:
+        return self.mask != 0
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, WellSet) and self.mask == other.mask
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """(col, row) of the selected wells, column 6 first as the routines traverse the plate"""
+        for col in range(COLS, 0, -1):
+            column = (self.mask >> ((col - 1) * ROWS)) & self._COLUMN
+            for row in range(1, ROWS + 1):
+                if column & (1 << (row - 1)):
+                    yield col, row
+
+    def __repr__(self) -> str:
+        return f"WellSet({self.mask:#x}, {len(self)} wells)"
+
+    def columns(self) -> List[int]:
+        """Columns with at least one selected well"""
+        return [col for col in range(COLS, 0, -1) if (self.mask >> ((col - 1) * ROWS)) & self._COLUMN]
+
+    def full_columns(self) -> List[int]:
+        """Columns in which all wells are selected, these can be handled by the multichannel head"""
+        return [col for col in range(COLS, 0, -1) if (self.mask >> ((col - 1) * ROWS)) & self._COLUMN == self._COLUMN]
+
+    def column_groups(self) -> Tuple[List[int], "WellSet"]:
+        """Splits the selection into full columns for the multichannel head and the remaining single wells"""
+        full = self.full_columns()
+        return full, self - WellSet.by_column(*full)
+
+    def multichannel_columns(self) -> List[int]:
+        """Full columns, raises ValueError if any column is only partially selected"""
+        full, rest = self.column_groups()
+        if rest:
+            raise ValueError(f"Multichannel routines need full columns, partially selected: {rest.columns()}")
+        return full
+
+    def coordinates(self, x_corner: float, y_corner: float, x_step: float = 18, y_step: float = 9):
+        """
+        Precomputed (x, y) positions of the selected wells in traversal order
+        :param x_corner: x of column 6, e.g. ehm_plate.x_corner
+        :param y_corner: y of row 1, e.g. ehm_plate.y_corner
+        """
+        return well_coordinates(self, x_corner, y_corner, x_step, y_step)
+
+
+def well_coordinates(wells: Iterable[Tuple[int, int]], x_corner: float, y_corner: float, x_step: float = 18,
+                     y_step: float = 9) -> List[Tuple[float, float]]:
+    """(x, y) positions of (col, row) wells in the given order, see WellSet.coordinates"""
+    return [(x_corner + (COLS - col) * x_step, y_corner + (row - 1) * y_step) for col, row in wells]
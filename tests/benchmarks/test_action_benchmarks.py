@@ -0,0 +1,144 @@
+"""
+Benchmarks of the action.py routines on the PipettorSimulator
+The simulator runs with the speed settings of the CRC scripts, wrapped in InstrumentedPipettor, so command count,
+estimated motion time and XY/Z travel are deterministic. The test fails if any of them exceeds baselines.json.
+The Python overhead per simulator command is recorded in the benchmark's extra_info.
+Run with BENCH_UPDATE_BASELINES=1 to re-record baselines.json after an intended change.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("biohit_pipettor")
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+from biohit_pipettor import PipettorSimulator  # noqa: E402
+
+from src import action  # noqa: E402
+from src.clock import VirtualClock, use_clock  # noqa: E402
+from src.instrumented import InstrumentedPipettor  # noqa: E402
+
+BASELINES = Path(__file__).with_name("baselines.json")
+UPDATE = os.environ.get("BENCH_UPDATE_BASELINES") == "1"
+
+# allowed increase over the baseline, all deterministic; the wall time is only reported
+TOLERANCE = {"commands": 0.0, "estimated_seconds": 0.02, "xy_travel": 0.02, "z_travel": 0.02}
+
+# deck layout of the CRC scripts
+B1 = (130.5, 42)
+B2 = (0, 42)
+C1 = (130.5, 140)
+C2 = (0, 140)
+
+# speed settings of the CRC scripts, the estimated times in baselines.json depend on them
+SPEEDS = {"x_speed": 7, "y_speed": 7, "z_speed": 8, "aspirate_speed": 1, "dispense_speed": 1}
+
+
+class Deck:
+    def __init__(self):
+        self.ehm_plate = action.EHMPlatePos(*B1)
+        self.pipette_tips = action.PipetteTips(B2[0], B2[1], C1[0], C1[1])
+        self.containers = action.Reservoirs(*C2)
+        self.tip_dropzone = action.TipDropzone(*C1)
+
+
+def remove_medium(p, d):
+    action.remove_medium(p, d.ehm_plate, d.containers, d.pipette_tips, 6, 8, 200, 38)
+
+
+def fill(p, d):
+    action.fill(p, d.ehm_plate, d.containers, d.pipette_tips, d.tip_dropzone, d.containers.medium_x, 6, 8, 200, 30)
+
+
+def dilute(p, d):
+    action.dilute(p, d.ehm_plate, d.containers, d.pipette_tips, d.tip_dropzone, 6, 8, 100, 38)
+
+
+def fill_multi(p, d):
+    action.fill_multi(p, d.ehm_plate, d.containers, d.pipette_tips, d.containers.well5_x, [1, 2, 3, 4, 5, 6], 450)
+
+
+def remove_multi(p, d):
+    action.remove_multi(p, d.ehm_plate, d.containers, d.pipette_tips, [1, 2, 3, 4, 5, 6], 600)
+
+
+def dilute_multi(p, d):
+    action.dilute_multi(p, d.ehm_plate, d.containers, d.pipette_tips, d.tip_dropzone, 100, 38)
+
+
+def change_medium_multi(p, d):
+    action.change_medium_multi(p, d.ehm_plate, d.containers, d.pipette_tips, d.tip_dropzone, 150, 38)
+
+
+def replace_multi(p, d):
+    action.replace_multi(p, d.ehm_plate, d.containers, d.pipette_tips, d.tip_dropzone, d.containers.well4_x, 50)
+
+
+# routine, multichannel, needs tips before the routine
+ROUTINES = {
+    "remove_medium": (remove_medium, False, False),
+    "fill": (fill, False, False),
+    "dilute": (dilute, False, False),
+    "fill_multi": (fill_multi, True, False),
+    "remove_multi": (remove_multi, True, False),
+    "dilute_multi": (dilute_multi, True, False),
+    "change_medium_multi": (change_medium_multi, True, True),
+    "replace_multi": (replace_multi, True, False),
+}
+
+
+def run_routine(routine, multichannel: bool, tips_first: bool) -> dict:
+    previous = use_clock(VirtualClock())
+    try:
+        with PipettorSimulator(tip_volume=1000, multichannel=multichannel, initialize=True) as sim:
+            p = InstrumentedPipettor(sim)
+            for name, value in SPEEDS.items():
+                setattr(p, name, value)
+            d = Deck()
+            if tips_first:
+                action.pick_tip_multi(p, d.pipette_tips)
+                p.reset_stats()
+            t0 = time.perf_counter()
+            routine(p, d)
+            elapsed = time.perf_counter() - t0
+            stats = p.stats()
+            if p.tip_attached:
+                action.discard_tips(p, d.containers, d.tip_dropzone)
+    finally:
+        use_clock(previous)
+    stats["overhead_per_command"] = elapsed / max(stats["commands"], 1)
+    return stats
+
+
+def load_baselines() -> dict:
+    if BASELINES.is_file():
+        return json.loads(BASELINES.read_text())
+    return {}
+
+
+@pytest.mark.parametrize("name", list(ROUTINES))
+def test_routine_benchmark(benchmark, name):
+    routine, multichannel, tips_first = ROUTINES[name]
+    stats = benchmark.pedantic(run_routine, args=(routine, multichannel, tips_first), rounds=3, iterations=1)
+    measured = {key: stats[key] for key in TOLERANCE}
+    benchmark.extra_info.update(measured, overhead_per_command=stats["overhead_per_command"])
+
+    baselines = load_baselines()
+    if UPDATE:
+        baselines[name] = measured
+        BASELINES.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        return
+    if name not in baselines:
+        pytest.fail(f"No baseline for {name} in {BASELINES.name}, record it with BENCH_UPDATE_BASELINES=1")
+
+    regressions = [
+        f"{key}: {measured[key]:.4g} > baseline {baselines[name][key]:.4g}"
+        for key, tolerance in TOLERANCE.items()
+        if key in baselines[name] and measured[key] > baselines[name][key] * (1 + tolerance) + 1e-9
+    ]
+    assert not regressions, f"{name} regressed: " + ", ".join(regressions)
@@ -0,0 +1,231 @@
+import pytest
+
+pytest.importorskip("biohit_pipettor")
+
+from src import action  # noqa: E402
+from src.clock import VirtualClock, use_clock  # noqa: E402
+from src.reagentmap import ReagentMap  # noqa: E402
+from src.tipplanner import TipPlanner  # noqa: E402
+
+
+class Recorder:
+    """Multichannel device that accepts every command and records it with the xy position it was sent at"""
+
+    multichannel = True
+
+    def __init__(self, tip_volume: float = 1000):
+        self.tip_volume = tip_volume
+        self.content = 0.0
+        self.xy = (0.0, 0.0)
+        self.commands = []
+
+    def _record(self, name, *args):
+        self.commands.append((name, self.xy) + args)
+
+    def move_xy(self, x, y):
+        self.xy = (x, y)
+
+    def move_x(self, x):
+        self.xy = (x, self.xy[1])
+
+    def move_y(self, y):
+        self.xy = (self.xy[0], y)
+
+    def move_z(self, z):
+        pass
+
+    def pick_tip(self, z):
+        self._record("pick_tip")
+
+    def eject_tip(self):
+        self.content = 0.0
+        self._record("eject_tip")
+
+    def aspirate(self, volume):
+        if self.content + volume > self.tip_volume:
+            raise RuntimeError(f"Aspirating {volume}ul overfills the tip holding {self.content}ul")
+        self.content += volume
+        self._record("aspirate", volume)
+
+    def dispense(self, volume):
+        self.content = max(self.content - volume, 0.0)
+        self._record("dispense", volume)
+
+    def dispense_all(self):
+        self._record("dispense_all", self.content)
+        self.content = 0.0
+
+    def named(self, *names):
+        return [command for command in self.commands if command[0] in names]
+
+
+@pytest.fixture
+def deck():
+    ehm_plate = action.EHMPlatePos(130.5, 42)
+    containers = action.Reservoirs(0, 140)
+    pipette_tips = action.PipetteTips(0, 42, 130.5, 140)
+    return ehm_plate, containers, pipette_tips
+
+
+def test_remove_multi_changes_tips_between_columns(deck):
+    ehm_plate, containers, pipette_tips = deck
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    action.remove_multi(p, ehm_plate, containers, pipette_tips, [1, 3, 6], 200)
+    action.release_tips_multi(p, containers, pipette_tips)
+
+    assert len(p.named("pick_tip")) == 3
+    assert len(p.named("eject_tip")) == 3
+    # every column's medium goes to the waste before its tips are dropped
+    waste = (containers.waste_x, containers.y_corner)
+    blow_outs = [c for c in p.named("dispense", "dispense_all") if c[2] > 0]
+    assert [c[1] for c in blow_outs] == [waste] * 3
+    assert [c[2] for c in blow_outs] == [200] * 3
+
+
+def test_remove_multi_changes_tips_after_touching_cells(deck):
+    ehm_plate, containers, pipette_tips = deck
+    # even if all wells hold the same medium, no tip goes from the cells of one well into the next
+    pipette_tips.planner = TipPlanner(well_group=lambda col: "plate")
+    p = Recorder()
+    action.remove_multi(p, ehm_plate, containers, pipette_tips, [1, 3, 6], 200)
+    assert len(p.named("pick_tip")) == 3
+
+
+def medium_aspirations_with_fresh_tips(p, containers):
+    """True if the tips never touched a well before aspirating fresh medium"""
+    medium = (containers.medium_x, containers.y_corner)
+    fresh = False
+    for name, xy, *args in p.commands:
+        if name == "pick_tip":
+            fresh = True
+        elif name == "aspirate" and xy == medium:
+            if not fresh:
+                return False
+        elif name in ("aspirate", "dispense") and xy != medium:
+            fresh = fresh and xy[0] == containers.waste_x
+    return True
+
+
+def test_dilute_multi_with_planner(deck):
+    ehm_plate, containers, pipette_tips = deck
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    action.dilute_multi(p, ehm_plate, containers, pipette_tips, None, 100, 38, cols=[1, 3])
+    action.release_tips_multi(p, containers, pipette_tips)
+    # two removals and two refills, each with fresh tips
+    assert len(p.named("pick_tip")) == 4
+    assert len(p.named("eject_tip")) == 4
+    assert medium_aspirations_with_fresh_tips(p, containers)
+
+
+def test_change_medium_multi_with_planner(deck):
+    ehm_plate, containers, pipette_tips = deck
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    action.change_medium_multi(p, ehm_plate, containers, pipette_tips, None, 150, 38, cols=[1, 3])
+    action.release_tips_multi(p, containers, pipette_tips)
+    # one set per well for the removal, one load of medium fills both
+    assert len(p.named("pick_tip")) == 3
+    assert medium_aspirations_with_fresh_tips(p, containers)
+    # the removed medium of each well, then the unused fresh medium at the end
+    blow_outs = [c[2] for c in p.named("dispense_all") if c[1][0] == containers.waste_x and c[2] > 0]
+    assert blow_outs == [150, 150, 700]
+
+
+def test_replace_multi_with_planner(deck):
+    ehm_plate, containers, pipette_tips = deck
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    previous = use_clock(VirtualClock())
+    try:
+        action.replace_multi(p, ehm_plate, containers, pipette_tips, None, containers.well4_x, 50, cols=[1, 3])
+    finally:
+        use_clock(previous)
+    action.release_tips_multi(p, containers, pipette_tips)
+    assert len(p.named("pick_tip")) == 4
+    assert len(p.named("eject_tip")) == 4
+
+
+def test_tip_change_blows_out_into_mapped_waste(deck):
+    ehm_plate, containers, pipette_tips = deck
+    containers.reagents = ReagentMap()
+    near = containers.reagents.add_container(containers, "well1_x", "waste", volume=0, capacity=50000)
+    containers.reagents.add_container(containers, "well7_x", "waste", volume=0, capacity=50000)
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    action.remove_multi(p, ehm_plate, containers, pipette_tips, [1, 3], 200)
+    action.release_tips_multi(p, containers, pipette_tips)
+
+    blow_outs = [c for c in p.named("dispense", "dispense_all") if c[2] > 0]
+    assert {c[1] for c in blow_outs} == {(near.x, near.y)}
+    assert near.volume == action.MULTICHANNEL * 400
+
+
+def mapped_medium_and_waste(containers):
+    containers.reagents = ReagentMap()
+    medium = containers.reagents.add_container(containers, "well6_x", "medium", volume=20000)
+    waste = containers.reagents.add_container(containers, "well1_x", "waste", volume=0, capacity=50000)
+    return medium, waste
+
+
+def reservoir_visits(p, ehm_plate):
+    """xy of the aspirations and blow-outs away from the plate"""
+    commands = [c for c in p.named("aspirate", "dispense_all") if c[1][1] != ehm_plate.y_corner_multi and c[2] > 0]
+    return {(name, xy) for name, xy, _ in commands}
+
+
+def test_dilute_multi_uses_mapped_medium_and_waste(deck):
+    ehm_plate, containers, pipette_tips = deck
+    medium, waste = mapped_medium_and_waste(containers)
+    p = Recorder()
+    action.dilute_multi(p, ehm_plate, containers, pipette_tips, action.TipDropzone(130.5, 140), 100, 38, cols=[1, 3])
+
+    assert reservoir_visits(p, ehm_plate) == {("aspirate", (medium.x, medium.y)), ("dispense_all", (waste.x, waste.y))}
+    assert medium.volume == 20000 - action.MULTICHANNEL * 200
+    assert waste.volume == action.MULTICHANNEL * 200
+
+
+def test_change_medium_multi_uses_mapped_medium_and_waste(deck):
+    ehm_plate, containers, pipette_tips = deck
+    medium, waste = mapped_medium_and_waste(containers)
+    pipette_tips.planner = TipPlanner()
+    p = Recorder()
+    action.change_medium_multi(p, ehm_plate, containers, pipette_tips, None, 150, 38, cols=[1, 3])
+    action.release_tips_multi(p, containers, pipette_tips)
+
+    assert reservoir_visits(p, ehm_plate) == {("aspirate", (medium.x, medium.y)), ("dispense_all", (waste.x, waste.y))}
+    # one load of medium for both wells
+    assert medium.volume == 20000 - action.MULTICHANNEL * 1000
+    assert waste.volume == action.MULTICHANNEL * 300
+
+
+def test_fill_mixture_multi_one_load_per_column(deck):
+    ehm_plate, containers, pipette_tips = deck
+    p = Recorder()
+    stocks = [(containers.well4_x, 100), (containers.well5_x, 50)]
+    action.fill_mixture_multi(p, ehm_plate, containers, pipette_tips, stocks, [1, 3], air_gap=10)
+
+    well4 = (containers.well4_x, containers.y_corner)
+    well5 = (containers.well5_x, containers.y_corner)
+    load = [("aspirate", well4, 100), ("aspirate", well4, 10), ("aspirate", well5, 50), ("aspirate", well5, 10)]
+    columns = [
+        (ehm_plate.x_corner + (ehm_plate.cols - col) * ehm_plate.x_step, ehm_plate.y_corner_multi) for col in (1, 3)
+    ]
+    assert p.named("aspirate", "dispense", "dispense_all") == [
+        *load, ("dispense_all", columns[0], 170),
+        *load, ("dispense_all", columns[1], 170),
+    ]
+    assert len(p.named("pick_tip")) == 1
+    assert len(p.named("eject_tip")) == 1
+
+
+def test_fill_mixture_multi_overfill(deck):
+    ehm_plate, containers, pipette_tips = deck
+    p = Recorder()
+    stocks = [(containers.well4_x, 600), (containers.well5_x, 400)]
+    with pytest.raises(ValueError, match="1020"):
+        action.fill_mixture_multi(p, ehm_plate, containers, pipette_tips, stocks, [1], air_gap=10)
+    assert p.commands == []
+    with pytest.raises(ValueError):
+        action.fill_mixture_multi(p, ehm_plate, containers, pipette_tips, [], [1])
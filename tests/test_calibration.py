@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.calibration import Calibration, calibrate, record_reference
+from src.deck import Deck
+
+NOMINAL = Deck._refPosition
+
+
+def measure(matrix, tilt, points=NOMINAL):
+    """Where the reference points end up under a known transform"""
+    return {name: list(Calibration(matrix, tilt).apply(xyz)) for name, xyz in points.items()}
+
+
+# rotated by 0.5 degrees, shifted by (1.2, -0.8), z plane tilted
+ANGLE = np.radians(0.5)
+MATRIX = [[np.cos(ANGLE), -np.sin(ANGLE), 1.2], [np.sin(ANGLE), np.cos(ANGLE), -0.8]]
+TILT = [0.001, -0.002, 0.3]
+
+
+def test_fit_recovers_transform():
+    calibration = Calibration.fit(NOMINAL, measure(MATRIX, TILT))
+    np.testing.assert_allclose(calibration.matrix, MATRIX, atol=1e-9)
+    np.testing.assert_allclose(calibration.tilt, TILT, atol=1e-9)
+    assert calibration.residual < 1e-9
+
+
+def test_identity():
+    calibration = Calibration()
+    np.testing.assert_array_equal(calibration.apply([[1.0, 2.0], [3.0, 4.0]]), [[1, 2], [3, 4]])
+    np.testing.assert_array_equal(calibration.apply([1.0, 2.0, 3.0]), [1, 2, 3])
+
+
+def test_fit_needs_three_points_off_a_line():
+    with pytest.raises(ValueError, match="at least 3"):
+        Calibration.fit(NOMINAL, {"P1": [0, 0, 0], "P2": [1, 0, 0]})
+    line = {"P1": [0, 0, 0], "P2": [1, 1, 0], "P3": [2, 2, 0]}
+    with pytest.raises(ValueError, match="one line"):
+        Calibration.fit(line, line)
+
+
+def test_apply_table():
+    calibration = Calibration(MATRIX, TILT)
+    table = calibration.apply_table(Deck._deckPosition)
+    assert table["A2"] == pytest.approx(tuple(calibration.apply(Deck._deckPosition["A2"])))
+    assert calibration.apply_table({}) == {}
+    with pytest.raises(ValueError):
+        calibration.apply_table({"a": [0, 0], "b": [0, 0, 0]})
+
+
+def test_cached_until_points_change(tmp_path, monkeypatch):
+    path = tmp_path / "calibration.json"
+    measured = measure(MATRIX, TILT)
+    first = calibrate(NOMINAL, measured, path)
+    fits = []
+    fit = Calibration.fit.__func__
+
+    def counting_fit(cls, *args):
+        fits.append(args)
+        return fit(cls, *args)
+
+    monkeypatch.setattr(Calibration, "fit", classmethod(counting_fit))
+    cached = calibrate(NOMINAL, measured, path)
+    np.testing.assert_allclose(cached.matrix, first.matrix)
+    assert fits == []
+    calibrate(NOMINAL, dict(measured, P1=[0, 0, 0]), path)
+    assert len(fits) == 1
+
+
+def test_load_missing_or_broken(tmp_path):
+    assert Calibration.load(tmp_path / "missing.json") is None
+    (tmp_path / "broken.json").write_text("{")
+    assert Calibration.load(tmp_path / "broken.json") is None
+
+
+def test_deck_slots(tmp_path):
+    deck = Deck()
+    assert deck.tipCoordinates() == tuple(Deck._deckPosition["B2"])
+    deck.calibrate(measure(MATRIX, TILT), tmp_path / "calibration.json")
+    assert deck.slot("B2") == pytest.approx(tuple(Calibration(MATRIX).apply(Deck._deckPosition["B2"])))
+
+
+def test_offset():
+    calibration = Calibration(MATRIX, TILT)
+    x, y, z = calibration.apply([10.0, 20.0, 0.0])
+    assert calibration.offset((10, 20)) == pytest.approx((x - 10, y - 20, z))
+    assert Calibration().offset((10, 20, 5)) == (0, 0, 0)
+
+
+def labware(deck):
+    """Coordinate attributes as in PipetteTips, built at B2 with the drop zone at C1"""
+    x, y = deck.corner("B2")
+    x_drop, y_drop = deck.corner("C1")
+    return SimpleNamespace(
+        x_corner=x + 105, y_corner=y + 10.5, well1_x=x + 3, x_step=9, pick_height=75, next_column=0,
+        x_drop=x_drop + 50, y_drop=y_drop + 50, planner=None,
+    )
+
+
+def test_place_shifts_labware(tmp_path):
+    deck = Deck()
+    nominal = labware(deck)
+    assert deck.place(labware(deck), "B2") == nominal
+    deck.calibrate(measure(MATRIX, TILT), tmp_path / "calibration.json")
+    placed = deck.place(labware(deck), "B2", drop_slot="C1")
+    dx, dy, dz = deck.calibration.offset(deck.corner("B2"))
+    assert placed.x_corner == pytest.approx(nominal.x_corner + dx)
+    assert placed.well1_x == pytest.approx(nominal.well1_x + dx)
+    assert placed.y_corner == pytest.approx(nominal.y_corner + dy)
+    assert placed.pick_height == pytest.approx(nominal.pick_height + dz)
+    assert (placed.x_step, placed.next_column, placed.planner) == (9, 0, None)
+    drop_dx, drop_dy, _ = deck.calibration.offset(deck.corner("C1"))
+    assert (placed.x_drop, placed.y_drop) == pytest.approx((nominal.x_drop + drop_dx, nominal.y_drop + drop_dy))
+
+
+def test_load_calibration(tmp_path):
+    path = tmp_path / "calibration.json"
+    deck = Deck()
+    assert deck.load_calibration(path) is None
+    assert deck.slots["B2"] == tuple(Deck._deckPosition["B2"])
+    Deck().calibrate(measure(MATRIX, TILT), path)
+    assert deck.load_calibration(path) is not None
+    assert deck.slot("B2") == pytest.approx(tuple(Calibration(MATRIX).apply(Deck._deckPosition["B2"])))
+
+
+def test_record_reference():
+    class P:
+        xyz_position = (1, 2, 3)
+
+    assert record_reference(P(), "P1", {}) == {"P1": [1.0, 2.0, 3.0]}
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.clrevents import EventBridge, event_names, wait_for_event
+
+
+class Event:
+    """pythonnet style event, handlers are added with += and removed with -="""
+
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def fire(self, args):
+        for handler in list(self.handlers):
+            handler(self, args)
+
+
+class Control:
+    def __init__(self):
+        self.MoveDone = Event()
+        self.add_MoveDone = self.remove_MoveDone = None
+
+
+class Wrapped:
+    """Like clr_wrapping.ClrObject"""
+
+    def __init__(self, raw):
+        self._wrapped_instance = raw
+
+
+def test_event_names():
+    assert event_names(Wrapped(Control())) == ["MoveDone"]
+
+
+def test_unknown_event():
+    with pytest.raises(AttributeError, match="MoveDone"):
+        EventBridge(Control()).subscribe("Stopped", print)
+
+
+def test_close_removes_handlers():
+    control = Control()
+    with EventBridge(Wrapped(control)) as bridge:
+        bridge.subscribe("MoveDone", print)
+        bridge.subscribe("MoveDone", print)
+        assert len(control.MoveDone.handlers) == 2
+    assert control.MoveDone.handlers == []
+
+
+def test_waiter_with_predicate():
+    control = Control()
+    waiter = EventBridge(control).waiter("MoveDone", predicate=lambda args: args == "Z")
+    thread = threading.Timer(0.01, lambda: [control.MoveDone.fire(axis) for axis in "XYZ"])
+    thread.start()
+    assert waiter.wait(5) == "Z"
+    thread.join()
+    assert control.MoveDone.handlers == []
+
+
+def test_waiter_timeout():
+    control = Control()
+    with pytest.raises(TimeoutError):
+        EventBridge(control).waiter("MoveDone").wait(0.01)
+    assert control.MoveDone.handlers == []
+
+
+def test_future_resolves_from_other_thread():
+    control = Control()
+
+    async def main():
+        future = EventBridge(control).future("MoveDone")
+        threading.Thread(target=control.MoveDone.fire, args=("done",)).start()
+        return await asyncio.wait_for(future, 5)
+
+    assert asyncio.run(main()) == "done"
+    assert control.MoveDone.handlers == []
+
+
+def test_future_cancelled_unsubscribes():
+    control = Control()
+
+    async def main():
+        future = EventBridge(control).future("MoveDone")
+        future.cancel()
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert control.MoveDone.handlers == []
+
+
+def test_wait_for_event():
+    control = Control()
+
+    def command():
+        threading.Timer(0.01, control.MoveDone.fire, ("done",)).start()
+        return True
+
+    assert wait_for_event(control, "MoveDone", command, timeout=5)
+    assert control.MoveDone.handlers == []
+    fallback = []
+    assert wait_for_event(control, "Stopped", lambda: True, fallback=lambda: fallback.append(1))
+    assert fallback == [1]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.hill import bootstrap_hill, fit_hill, hill
+
+CONCENTRATIONS = np.array([0.0, 0.2, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0])
+# emax, ec50, hill slope of three wells
+PARAMETERS = np.array([[1.0, 1.5, 1.0], [2.5, 0.8, 2.0], [0.7, 3.0, 1.5]])
+
+
+def responses():
+    return np.stack([hill(CONCENTRATIONS, *well) for well in PARAMETERS])
+
+
+def test_hill_equation():
+    assert hill(0.0, 2.0, 1.0, 1.0) == 0.0
+    assert hill(1.0, 2.0, 1.0, 3.0) == pytest.approx(1.0)
+    assert hill(1e6, 2.0, 1.0, 1.0) == pytest.approx(2.0, rel=1e-5)
+
+
+def test_fit_recovers_known_parameters():
+    fit = fit_hill(CONCENTRATIONS, responses())
+    assert fit.converged.all()
+    np.testing.assert_allclose(fit.emax, PARAMETERS[:, 0], rtol=1e-4)
+    np.testing.assert_allclose(fit.ec50, PARAMETERS[:, 1], rtol=1e-4)
+    np.testing.assert_allclose(fit.hill_slope, PARAMETERS[:, 2], rtol=1e-4)
+    np.testing.assert_allclose(fit.predict(CONCENTRATIONS), responses(), atol=1e-6)
+
+
+def test_fit_with_noise_and_missing_values():
+    rng = np.random.default_rng(1)
+    y = responses() + rng.normal(0, 0.01, size=(3, len(CONCENTRATIONS)))
+    y[1, 3] = np.nan
+    fit = fit_hill(CONCENTRATIONS, y)
+    np.testing.assert_allclose(fit.emax, PARAMETERS[:, 0], rtol=0.05)
+    np.testing.assert_allclose(fit.ec50, PARAMETERS[:, 1], rtol=0.1)
+
+
+def test_empty_well():
+    y = np.vstack([responses(), np.full(len(CONCENTRATIONS), np.nan)])
+    fit = fit_hill(CONCENTRATIONS, y)
+    assert fit.converged.tolist() == [True, True, True, False]
+    assert np.isnan([fit.emax[3], fit.ec50[3], fit.hill_slope[3]]).all()
+    np.testing.assert_allclose(fit.emax[:3], PARAMETERS[:, 0], rtol=1e-4)
+    empty = fit_hill(CONCENTRATIONS, y[3:])
+    assert not empty.converged.any() and np.isnan(empty.emax).all()
+
+
+def test_shape_mismatch():
+    with pytest.raises(ValueError):
+        fit_hill(CONCENTRATIONS, responses()[:, :-1])
+
+
+def test_bootstrap_intervals_contain_the_parameters():
+    rng = np.random.default_rng(2)
+    y = responses() + rng.normal(0, 0.02, size=(3, len(CONCENTRATIONS)))
+    fit, lower, upper = bootstrap_hill(CONCENTRATIONS, y, n_boot=200, seed=3)
+    assert lower.shape == upper.shape == (3, 3)
+    estimates = np.stack([fit.emax, fit.ec50, fit.hill_slope], axis=-1)
+    assert (lower <= estimates).all() and (estimates <= upper).all()
+    again = bootstrap_hill(CONCENTRATIONS, y, n_boot=200, seed=3, workers=1)
+    np.testing.assert_array_equal(lower, again[1])
+
+
+def test_bootstrap_skips_empty_wells():
+    y = np.vstack([responses()[:1], np.full(len(CONCENTRATIONS), np.nan)])
+    fit, lower, upper = bootstrap_hill(CONCENTRATIONS, y, n_boot=20, seed=1)
+    assert np.isfinite(lower[0]).all() and np.isfinite(upper[0]).all()
+    assert np.isnan(lower[1]).all() and np.isnan(upper[1]).all()
@@ -0,0 +1,78 @@
+import pytest
+
+from src.instrumented import InstrumentedPipettor, MotionModel, Observer
+
+
+class Device:
+    """Accepts the commands InstrumentedPipettor records"""
+
+    x_speed = y_speed = z_speed = 1
+    aspirate_speed = dispense_speed = 1
+
+    def move_xy(self, x, y):
+        pass
+
+    def move_z(self, z):
+        pass
+
+    def move_to_surface(self, limit, distance_from_surface):
+        pass
+
+    def aspirate(self, volume):
+        pass
+
+    def dispense_all(self):
+        pass
+
+    def pick_tip(self, z):
+        pass
+
+    def eject_tip(self):
+        raise RuntimeError("no tip")
+
+
+@pytest.fixture
+def p():
+    return InstrumentedPipettor(Device(), MotionModel(xy_mm_per_s=10, z_mm_per_s=10, piston_ul_per_s=100, overhead=0))
+
+
+def test_moves(p):
+    p.move_xy(30, 40)
+    p.move_z(20)
+    assert p.position == [30, 40, 20]
+    assert p.xy_travel == 50
+    assert p.z_travel == 20
+    assert p.estimated_seconds == pytest.approx(4 + 2)
+
+
+def test_move_to_surface_counts_the_descent_to_the_limit(p):
+    p.move_z(10)
+    p.move_to_surface(70, 2)
+    assert p.position[2] == 70
+    assert p.z_travel == 70
+    assert p.estimated_seconds == pytest.approx(1 + 6)
+
+
+def test_liquid_and_tips(p):
+    p.pick_tip(75)
+    p.aspirate(300)
+    assert p.tip_attached and p.tip_content == 300
+    p.dispense_all()
+    assert p.tip_content == 0 and p.dispensed == 300
+    assert p.estimated_seconds == pytest.approx(p.motion.pick_tip + 6)
+
+
+def test_failed_commands(p):
+    seen = []
+
+    class Recorder(Observer):
+        def after_command(self, p, name, args, seconds, failed):
+            seen.append((name, failed))
+
+    p.observers.append(Recorder())
+    p.pick_tip(75)
+    with pytest.raises(RuntimeError):
+        p.eject_tip()
+    assert p.tip_attached
+    assert p.stats()["failed"] == 1
+    assert seen == [("pick_tip", False), ("eject_tip", True)]
@@ -0,0 +1,111 @@
+import json
+import socket
+
+import pytest
+
+from src.mockinstrument import MockInstrument, MockInstrumentServer, RemoteInstrument
+
+
+@pytest.fixture
+def instrument():
+    return MockInstrument(latency=0, time_scale=0, seed=1)
+
+
+@pytest.fixture
+def remote(instrument):
+    server = MockInstrumentServer(instrument).start()
+    client = RemoteInstrument(port=server.port)
+    yield client
+    client.close()
+    server.stop()
+
+
+def test_moves(instrument):
+    assert instrument.InitializeInstrument()
+    assert instrument.MoveXY(10, 20)
+    assert instrument.MoveZ(30)
+    assert [instrument.PollPosition(axis) for axis in "XYZ"] == [10, 20, 30]
+
+
+def test_move_without_wait_runs_in_background():
+    instrument = MockInstrument(latency=0, time_scale=0.01)
+    assert instrument.MoveZ(100, False)
+    assert instrument.PollPosition("Z") < 100
+    assert instrument.WaitArmToStop()
+    assert instrument.PollPosition("Z") == 100
+
+
+def test_liquid_handling(instrument):
+    assert not instrument.Aspirate(100)
+    assert instrument.PickTip(50)
+    assert not instrument.PickTip(50)
+    assert instrument.Aspirate(100)
+    assert not instrument.Dispense(150)
+    assert instrument.Dispense(60)
+    assert instrument.PollPosition("P") == pytest.approx(40)
+    assert instrument.DispenseAll()
+    assert instrument.PollPosition("P") == 0
+    assert instrument.EjectTip()
+    assert not instrument.has_tip
+
+
+def test_surface(instrument):
+    assert not instrument.MoveToSurface(100, 1)
+    instrument.surface_z = 60
+    assert not instrument.MoveToSurface(50, 1)
+    assert instrument.MoveToSurface(100, 1)
+    assert instrument.PollPosition("Z") == 59
+    instrument.MoveZ(70)
+    assert instrument.PollSensorReading() > 1100
+
+
+def test_failures(instrument):
+    instrument.fail_next("MoveXY", 2)
+    assert not instrument.MoveXY(1, 1)
+    assert not instrument.MoveXY(1, 1)
+    assert instrument.MoveXY(1, 1)
+    assert instrument.calls["MoveXY"] == 3
+    always = MockInstrument(latency=0, time_scale=0, failures={"PickTip": 1.0})
+    assert not always.PickTip(50)
+
+
+def test_disconnect(instrument):
+    instrument.disconnect()
+    assert instrument.IsConnected() == 0
+    assert instrument.PollPosition("X") == -1
+    assert not instrument.MoveXY(1, 1)
+
+
+def test_remote_commands(remote, instrument):
+    assert remote.MoveXY(10, 20, True)
+    assert remote.PollPosition("X") == 10
+    assert remote.PipetType == 2
+    remote.has_tip = True
+    assert instrument.has_tip
+
+
+def test_remote_rejects_internals(remote):
+    for method, args in [("get", ["_lock"]), ("set", ["_motions", {}]), ("get", ["_sleep"]), ("_call", ["MoveXY"])]:
+        with pytest.raises(RuntimeError, match="AttributeError"):
+            remote.request(method, *args)
+    with pytest.raises(AttributeError):
+        remote.fail
+    # the connection survives the errors
+    assert remote.IsConnected() == 1
+
+
+def test_server_answers_bad_lines(instrument):
+    server = MockInstrumentServer(instrument).start()
+    try:
+        with socket.create_connection(("127.0.0.1", server.port)) as connection:
+            stream = connection.makefile("rwb")
+            stream.write(b"not json\n")
+            stream.write(json.dumps({"id": 7, "method": "get", "args": ["Control"]}).encode() + b"\n")
+            stream.write(json.dumps({"id": 8, "method": "IsConnected"}).encode() + b"\n")
+            stream.flush()
+            responses = [json.loads(stream.readline()) for _ in range(3)]
+    finally:
+        server.stop()
+    assert responses[0]["id"] is None and "error" in responses[0]
+    assert responses[1]["id"] == 7 and "error" in responses[1]
+    assert responses[2] == {"id": 8, "result": 1}
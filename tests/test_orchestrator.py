@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from src.orchestrator import CalibrationCache, Controller
+
+
+def pipettors(n):
+    return {f"roboline-{i}": object() for i in range(1, n + 1)}
+
+
+def test_jobs_go_to_all_devices():
+    devices = 3
+    barrier = threading.Barrier(devices, timeout=5)
+
+    def protocol(device, plate):
+        # only passes if every device runs one of the first jobs at the same time
+        if plate < devices:
+            barrier.wait()
+        return device.name, plate
+
+    with Controller(pipettors(devices)) as controller:
+        futures = [controller.submit(protocol, plate=plate) for plate in range(2 * devices)]
+        results = [future.result(timeout=5) for future in futures]
+
+    assert [plate for _, plate in results] == list(range(2 * devices))
+    assert {name for name, _ in results} == set(pipettors(devices))
+    assert sum(device.jobs_done for device in controller.devices) == 2 * devices
+
+
+def test_failed_job():
+    def protocol(device):
+        raise RuntimeError("no tips")
+
+    with Controller(pipettors(2)) as controller:
+        future = controller.submit(protocol)
+        with pytest.raises(RuntimeError, match="no tips"):
+            future.result(timeout=5)
+    assert sum(device.jobs_failed for device in controller.devices) == 1
+
+
+def test_utilization():
+    def protocol(device):
+        time.sleep(0.1)
+
+    with Controller(pipettors(2)) as controller:
+        for future in [controller.submit(protocol) for _ in range(2)]:
+            future.result(timeout=5)
+        utilization = controller.utilization()
+
+    assert set(utilization) == set(pipettors(2))
+    assert all(0 < share <= 1 for share in utilization.values())
+    assert all(device.busy_seconds >= 0.1 for device in controller.devices)
+
+
+def test_submit_after_close():
+    controller = Controller(pipettors(1))
+    controller.start()
+    controller.close()
+    with pytest.raises(RuntimeError):
+        controller.submit(print)
+
+
+def test_close_cancels_jobs_never_started():
+    controller = Controller(pipettors(1))
+    future = controller.submit(print)
+    controller.close()
+    assert future.cancelled()
+
+
+def test_close_without_wait_cancels_jobs_never_started():
+    controller = Controller(pipettors(1))
+    future = controller.submit(print)
+    controller.close(wait=False)
+    assert future.cancelled()
+
+
+def test_calibration_computed_once():
+    cache = CalibrationCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 42
+
+    threads = [threading.Thread(target=cache.get, args=("deck", compute)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert cache.get("deck") == 42
+    assert len(calls) == 1
+
+
+def test_calibration_keys_do_not_block_each_other():
+    cache = CalibrationCache()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    thread = threading.Thread(target=cache.get, args=("roboline-1", slow))
+    thread.start()
+    try:
+        assert started.wait(5)
+        assert cache.get("roboline-2", lambda: "fast") == "fast"
+    finally:
+        release.set()
+        thread.join(5)
+    assert cache.get("roboline-1") == "slow"
+
+
+def test_calibration_failure_is_not_cached():
+    cache = CalibrationCache()
+
+    def fail():
+        raise ValueError("probe failed")
+
+    with pytest.raises(ValueError):
+        cache.get("deck", fail)
+    assert cache.get("deck", lambda: 1) == 1
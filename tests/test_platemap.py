@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("biohit_pipettor")
+
+from src.platemap import Pass, PlateMap, compile_plate_map, run_plate_map  # noqa: E402
+from src.wellset import ROWS, WellSet  # noqa: E402
+
+
+def test_set_and_select():
+    plate_map = PlateMap().set(WellSet.by_column(1), "medium", 400).set((2, 1), "calcium", 50)
+    plate_map.set((1, 8), "calcium", 60)
+    assert len(plate_map) == ROWS + 1
+    assert plate_map[(1, 8)] == ("calcium", 60.0)
+    assert plate_map.reagents() == ["medium", "calcium"]
+    assert plate_map.total("medium") == 7 * 400
+    assert list(plate_map.selection("calcium")) == [(2, 1), (1, 8)]
+    with pytest.raises(ValueError):
+        plate_map.set((2, 1), "medium", 0)
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "map.csv"
+    path.write_text("col,row,reagent,volume\n6,1, calcium ,50\n6,2,medium,400\n")
+    plate_map = PlateMap.from_csv(path)
+    assert plate_map.wells == {(6, 1): ("calcium", 50.0), (6, 2): ("medium", 400.0)}
+
+
+def test_full_columns_go_to_the_multichannel_head():
+    plate_map = PlateMap().set(WellSet.by_column(2, 4), "medium", 400)
+    plate_map.set(WellSet.wells([(3, 1), (5, 2)]), "medium", 300)
+    plate_map.set(WellSet.by_column(6), "calcium", 100).set((6, 8), "calcium", 150)
+    plan = compile_plate_map(plate_map)
+    assert [(step.reagent, step.multichannel) for step in plan.passes] == [
+        ("medium", True),
+        ("medium", False),
+        ("calcium", False),
+    ]
+    assert plan.multichannel[0].volumes == {4: 400, 2: 400}
+    assert list(plan.single[0].volumes) == [(5, 2), (3, 1)]
+    assert len(plan.single[1].volumes) == ROWS
+    single = compile_plate_map(plate_map, multichannel=False)
+    assert not single.multichannel
+
+
+def test_passes_keep_the_plate_order():
+    # first fit decreasing would put 600 and 400 into one load and reorder the columns
+    volumes = {6: 600, 5: 300, 4: 400, 3: 300, 2: 600, 1: 400}
+    plate_map = PlateMap()
+    for col, volume in volumes.items():
+        plate_map.set(WellSet.by_column(col), "medium", volume)
+    plan = compile_plate_map(plate_map)
+    assert list(plan.multichannel[0].volumes) == [6, 5, 4, 3, 2, 1]
+    assert plan.aspirations == plan.multichannel[0].aspirations() == 3
+
+
+def test_reagents_keep_the_order_they_were_set():
+    plate_map = PlateMap().set((1, 1), "calcium", 50).set(WellSet.by_column(2), "medium", 400)
+    plate_map.set(WellSet.by_column(3), "calcium", 50).set((4, 1), "medium", 100)
+    plan = compile_plate_map(plate_map)
+    assert [step.reagent for step in plan.multichannel] == ["calcium", "medium"]
+    assert [step.reagent for step in plan.single] == ["calcium", "medium"]
+
+
+def test_aspirations_follow_the_refills():
+    assert Pass("medium", False, {(6, 1): 600, (6, 2): 300, (6, 3): 200}).aspirations() == 2
+    assert Pass("medium", True, {6: 500, 5: 500}).aspirations() == 1
+    assert Pass("medium", True, {6: 500, 5: 500}).total == 8 * 1000
+
+
+def test_tip_pickups_one_per_reagent_and_head():
+    plate_map = PlateMap().set(WellSet.by_column(1, 2), "medium", 400).set(WellSet.by_column(3), "calcium", 100)
+    plan = compile_plate_map(plate_map)
+    assert plan.tip_changes == 2
+    assert "2 aspirations, 2 tip pickups" in plan.report()
+
+
+def test_too_large_volume():
+    with pytest.raises(ValueError, match="more than one tip"):
+        compile_plate_map(PlateMap().set((1, 1), "medium", 1200))
+
+
+def test_run_needs_the_heads_and_stock_positions():
+    plan = compile_plate_map(PlateMap().set(WellSet.by_column(1), "medium", 400).set((2, 1), "calcium", 50))
+    with pytest.raises(ValueError, match="multichannel"):
+        run_plate_map(plan, None, None, None, p_single=object())
+    with pytest.raises(ValueError, match="x position"):
+        run_plate_map(plan, None, None, None, p_multi=object(), p_single=object())
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from src.prompts import RESULTS, HeadlessBackend, PromptQueue
+
+
+def test_headless_answers_with_configured_choice():
+    queue = PromptQueue(HeadlessBackend({"tips": "Cancel"}))
+    prompt = queue.ask("Load tips", "Tips", style=1, key="tips")
+    assert prompt.answer == "Cancel"
+    assert prompt.answered_by == "headless"
+    assert prompt.result() == RESULTS["Cancel"]
+
+
+def test_timeout_takes_default():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    prompt = queue.ask("Check waste", "Waste", style=1, timeout=0.05, default="Cancel")
+    assert not prompt.done
+    time.sleep(0.1)
+    assert queue.expire() == [prompt]
+    assert prompt.answer == "Cancel"
+    assert prompt.timed_out
+    assert queue.answer(prompt.key, "OK") is False
+
+
+def test_timeout_without_default_raises():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    queue.ask("Check waste", "Waste", timeout=0, key="waste")
+    with pytest.raises(TimeoutError):
+        queue.wait("waste")
+
+
+def test_after_shows_prompts_in_order():
+    backend = HeadlessBackend(delay=None)
+    queue = PromptQueue(backend)
+    first = queue.ask("Fill stock", "Stock", key="stock")
+    second = queue.ask("Start measurement", "Measure", key="measure", after=["stock"])
+    assert backend.shown == [first]
+    assert queue.answer("measure", "OK") is False
+    assert queue.answer("stock", "OK")
+    assert backend.shown == [first, second]
+    assert queue.open() == [second]
+
+
+def test_after_unknown_prompt():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    with pytest.raises(ValueError):
+        queue.ask("Start measurement", key="measure", after=["stock"])
+
+
+def test_deferred_steps_run_once_answered():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    queue.ask("Fill stock", key="stock")
+    queue.ask("Empty waste", key="waste")
+    ran = []
+    queue.defer(["stock"], ran.append, "fill")
+    queue.defer(["waste"], ran.append, "remove")
+    queue.defer(["stock"], ran.append, "fill again")
+    assert queue.run_ready() == 0
+    queue.answer("waste", "OK")
+    assert queue.run_ready() == 1
+    queue.answer("stock", "OK")
+    queue.drain(timeout=1)
+    assert ran == ["remove", "fill", "fill again"]
+    assert queue.pending == 0
+
+
+def test_drain_times_out():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    queue.ask("Fill stock", key="stock")
+    queue.defer(["stock"], print)
+    with pytest.raises(TimeoutError):
+        queue.drain(timeout=0.05, poll=0.01)
+    assert queue.pending == 1
+
+
+def test_expired_step_stays_pending():
+    queue = PromptQueue(HeadlessBackend(delay=None))
+    queue.ask("Fill stock", key="stock", timeout=0)
+    queue.defer(["stock"], print)
+    with pytest.raises(TimeoutError):
+        queue.run_ready()
+    assert queue.pending == 1
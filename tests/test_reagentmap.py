@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from src.reagentmap import Location, ReagentMap
+
+
+class Containers:
+    well4_x = 57
+    well5_x = 39
+    y_corner = 180
+
+
+@pytest.fixture
+def reagents():
+    reagents = ReagentMap()
+    reagents.add("calcium", 0, 0, volume=5000, dead_volume=500, name="near")
+    reagents.add("calcium", 100, 0, volume=20000, name="far")
+    reagents.add("waste", 10, 0, volume=0, capacity=1000, name="small")
+    reagents.add("waste", 200, 0, name="drain")
+    return reagents
+
+
+def test_take_nearest_source(reagents):
+    assert reagents.take("calcium", 1000, 20, 0).name == "near"
+    assert reagents.take("calcium", 1000, 90, 0).name == "far"
+    assert reagents.locations["calcium"][0].volume == 4000
+    assert reagents.locations["calcium"][1].volume == 19000
+
+
+def test_take_skips_sources_below_dead_volume(reagents):
+    assert reagents.take("calcium", 4500, 0, 0).name == "near"
+    # 500ul left in near, all of it dead volume
+    assert reagents.take("calcium", 100, 0, 0).name == "far"
+    assert reagents.remaining("calcium") == 19900
+
+
+def test_take_without_enough_left(reagents):
+    with pytest.raises(RuntimeError, match="calcium"):
+        reagents.take("calcium", 30000, 0, 0)
+    with pytest.raises(RuntimeError):
+        reagents.take("medium", 1, 0, 0)
+
+
+def test_put_nearest_sink_with_room(reagents):
+    assert reagents.put("waste", 800, 0, 0).name == "small"
+    assert reagents.put("waste", 800, 0, 0).name == "drain"
+    assert reagents.locations["waste"][0].volume == 800
+    with pytest.raises(RuntimeError):
+        reagents.put("medium", 1, 0, 0)
+
+
+def test_untracked_location():
+    location = Location(0, 0)
+    assert location.available == math.inf and location.free == math.inf
+    location.take(100)
+    location.put(100)
+    assert location.volume is None
+
+
+def test_add_container():
+    reagents = ReagentMap()
+    location = reagents.add_container(Containers(), "well5_x", "calcium", volume=1000)
+    assert (location.x, location.y, location.name) == (39, 180, "well5_x")
+    assert reagents.remaining("calcium") == 1000
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.mockinstrument import MockInstrument, mock_pipettor
+from src.sensorsampler import descend_to_surface, detect_shift
+
+
+class Exclusive(MockInstrument):
+    """Records whether position and sensor polls ever overlap, as two threads using one DLL handle would"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.overlaps = 0
+        self._polling = threading.Lock()
+
+    def _exclusive(self, poll, *args):
+        if not self._polling.acquire(blocking=False):
+            self.overlaps += 1
+            return poll(*args)
+        try:
+            time.sleep(0.0005)
+            return poll(*args)
+        finally:
+            self._polling.release()
+
+    def PollPosition(self, address):
+        return self._exclusive(super().PollPosition, address)
+
+    def PollSensorReading(self):
+        return self._exclusive(super().PollSensorReading)
+
+
+class Offset(MockInstrument):
+    """Z moves end slightly off the target, within the axis resolution"""
+
+    def MoveZ(self, z, wait=True):
+        return super().MoveZ(z + 0.01, wait)
+
+
+def pipettor(instrument):
+    pytest.importorskip("biohit_pipettor")
+    # initialize and the approach at once, the descent in real time
+    time_scale, instrument.time_scale = instrument.time_scale, 0
+    p, _ = mock_pipettor(instrument=instrument)
+    p.move_z(40)
+    instrument.time_scale = time_scale
+    return p
+
+
+def test_detect_shift():
+    values = np.r_[np.full(30, 1000.0), np.full(10, 1200.0)]
+    # two of the four samples in the window are enough for a shift of 100
+    assert detect_shift(values) == 31
+    assert detect_shift(np.full(40, 1000.0)) is None
+    assert detect_shift(values[:10]) is None
+
+
+def test_descend_finds_surface():
+    instrument = Exclusive(latency=0, surface_z=60, seed=1)
+    p = pipettor(instrument)
+    surface = descend_to_surface(p, 70, timeout=5)
+    assert surface == pytest.approx(60, abs=3)
+    assert instrument.overlaps == 0
+
+
+def test_descend_without_liquid():
+    p = pipettor(MockInstrument(latency=0, seed=1))
+    assert descend_to_surface(p, 70, timeout=5) is None
+
+
+def test_descend_accepts_move_ending_off_target():
+    p = pipettor(Offset(latency=0, seed=1))
+    assert descend_to_surface(p, 50, timeout=5) is None
+    with pytest.raises(RuntimeError, match="did not reach"):
+        descend_to_surface(p, 60, timeout=0.5, tolerance=0.001)
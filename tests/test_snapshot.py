@@ -0,0 +1,138 @@
+import pytest
+
+from src.instrumented import InstrumentedPipettor
+from src.snapshot import InstrumentSnapshot, PipettorSession, connect
+
+
+class Device:
+    """Pipettor that keeps its state between connections and, like the real one, can not be polled for a tip"""
+
+    x_speed = y_speed = z_speed = aspirate_speed = dispense_speed = 1
+
+    def __init__(self):
+        self.xyz_position = (0.0, 0.0, 0.0)
+        self.piston_position = 0.0
+        self.initialized = 0
+
+    def connect(self, tip_volume, multichannel, initialize):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def initialize(self):
+        self.initialized += 1
+        self.xyz_position = (0.0, 0.0, 0.0)
+
+    def move_xy(self, x, y):
+        self.xyz_position = (x, y, self.xyz_position[2])
+
+    def pick_tip(self, z):
+        pass
+
+    def eject_tip(self):
+        pass
+
+
+class TipBox:
+    next_column = 0
+    next_tip = 0
+
+
+@pytest.fixture
+def device():
+    return Device()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "state.json"
+
+
+def session(device, path, tips=None, **kwargs):
+    return PipettorSession(1000, True, tips or TipBox(), path, pipettor_cls=device.connect, **kwargs)
+
+
+def run(device, path, tip: bool = False):
+    """One run that uses 3 tip columns, leaves the head at (10, 20) and saves its state"""
+    tips = TipBox()
+    with session(device, path, tips) as p:
+        p.x_speed = 7
+        p.pick_tip(75)
+        if not tip:
+            p.eject_tip()
+        p.move_xy(10, 20)
+        tips.next_column = 3
+
+
+def test_first_connect_initializes(device, path):
+    p, restored = connect(path=path, pipettor_cls=device.connect)
+    assert not restored and device.initialized == 1
+
+
+def test_clean_run_skips_initialization(device, path):
+    run(device, path)
+    assert device.initialized == 1
+    device.x_speed = 1
+    tips = TipBox()
+    with session(device, path, tips) as p:
+        assert p.position == [10, 20, 0]
+        assert not p.tip_attached
+    assert device.initialized == 1
+    assert device.x_speed == 7
+    assert tips.next_column == 3
+
+
+def test_snapshot_is_consumed(device, path):
+    run(device, path)
+    connect(path=path, pipettor_cls=device.connect)
+    assert not path.exists()
+
+
+def test_moved_head_or_failed_run_initializes(device, path):
+    run(device, path)
+    device.xyz_position = (50, 20, 0)
+    assert not connect(path=path, pipettor_cls=device.connect)[1]
+    with pytest.raises(RuntimeError):
+        with session(device, path):
+            raise RuntimeError("failed run")
+    assert not path.exists()
+    assert not connect(path=path, pipettor_cls=device.connect)[1]
+
+
+def test_liquid_left_initializes(device, path):
+    with session(device, path) as p:
+        p.tip_content = 100
+    snapshot = InstrumentSnapshot.load(path)
+    assert snapshot.matches(device, 1000, True) == "100.0ul left in the tip"
+    with pytest.raises(RuntimeError):
+        snapshot.restore(device)
+
+
+def test_tip_state_from_the_caller(device, path):
+    run(device, path, tip=True)
+    snapshot = InstrumentSnapshot.load(path)
+    assert snapshot.has_tip
+    assert snapshot.matches(device, 1000, True) == "a tip was attached, tip state unknown"
+    assert snapshot.matches(device, 1000, True, has_tip=False) == "tip state changed"
+    assert snapshot.matches(device, 1000, True, has_tip=True) is None
+    with session(device, path, has_tip=True) as p:
+        assert p.tip_attached
+    assert device.initialized == 1
+
+
+def test_unknown_tip_state_initializes(device, path):
+    run(device, path, tip=True)
+    with session(device, path) as p:
+        assert not p.tip_attached
+    assert device.initialized == 2
+
+
+def test_capture_needs_tip_state_of_plain_pipettor(device):
+    with pytest.raises(ValueError):
+        InstrumentSnapshot.capture(device, 1000, True)
+    snapshot = InstrumentSnapshot.capture(device, 1000, True, tip_content=0, has_tip=True)
+    assert snapshot.has_tip
+    tracked = InstrumentedPipettor(device)
+    tracked.pick_tip(75)
+    assert InstrumentSnapshot.capture(tracked, 1000, True).has_tip
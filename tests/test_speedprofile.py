@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("biohit_pipettor")
+
+from src.instrumented import InstrumentedPipettor  # noqa: E402
+from src.mockinstrument import MockInstrument, mock_pipettor  # noqa: E402
+from src.speedprofile import CAREFUL, FAST, SpeedProfile  # noqa: E402
+
+# tissue plate area
+REGION = (100, 0, 200, 100)
+
+
+@pytest.fixture
+def setup():
+    pipettor, instrument = mock_pipettor(instrument=MockInstrument(latency=0, time_scale=0))
+    profile = SpeedProfile(careful_regions=[REGION], loaded_volume=100, short_move=10)
+    p = profile.attach(InstrumentedPipettor(pipettor))
+    return p, profile, instrument
+
+
+def loaded_tip(p, volume: float = 150):
+    p.move_xy(0, 150)
+    p.pick_tip(50)
+    p.move_z(0)
+    p.aspirate(volume)
+
+
+def test_fast_settings_are_accepted():
+    assert all(1 <= value <= 9 for value in FAST.values())
+    assert all(1 <= value <= 9 for value in CAREFUL.values())
+
+
+def test_empty_tip_travels_fast(setup):
+    p, profile, instrument = setup
+    p.move_xy(50, 150)
+    assert instrument.speeds["X"] == instrument.speeds["Y"] == FAST["x_speed"]
+
+
+def test_loaded_tip_travels_carefully(setup):
+    p, profile, instrument = setup
+    loaded_tip(p)
+    p.move_xy(150, 50)
+    assert instrument.speeds["X"] == instrument.speeds["Y"] == CAREFUL["x_speed"]
+    p.dispense_all()
+    p.move_xy(0, 150)
+    assert instrument.speeds["X"] == FAST["x_speed"]
+
+
+def test_little_liquid_counts_as_empty(setup):
+    p, profile, instrument = setup
+    loaded_tip(p, volume=50)
+    p.move_xy(150, 50)
+    assert instrument.speeds["X"] == FAST["x_speed"]
+
+
+def test_short_empty_move_keeps_setting(setup):
+    p, profile, instrument = setup
+    p.move_xy(50, 150)
+    changes = profile.changes
+    p.move_xy(55, 150)
+    p.move_z(5)
+    assert profile.changes == changes
+
+
+def test_short_move_with_loaded_tip_is_careful(setup):
+    p, profile, instrument = setup
+    p.move_xy(50, 150)
+    loaded_tip(p)
+    assert instrument.speeds["X"] == FAST["x_speed"]
+    p.move_xy(5, 150)
+    assert instrument.speeds["X"] == instrument.speeds["Y"] == CAREFUL["x_speed"]
+    p.move_z(5)
+    assert instrument.speeds["Z"] == CAREFUL["z_speed"]
+
+
+def test_descent_into_plate_is_careful(setup):
+    p, profile, instrument = setup
+    p.move_xy(150, 50)
+    p.move_z(30)
+    assert instrument.speeds["Z"] == CAREFUL["z_speed"]
+    p.move_z(0)
+    assert instrument.speeds["Z"] == FAST["z_speed"]
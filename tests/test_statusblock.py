@@ -0,0 +1,125 @@
+import pytest
+
+from src.clock import VirtualClock, get_clock, use_clock
+from src.instrumented import InstrumentedPipettor
+from src.statusblock import StatusPublisher, StatusReader
+from src.tracing import Tracer
+
+
+class Device:
+    def move_xy(self, x, y):
+        pass
+
+
+@pytest.fixture
+def status(tmp_path):
+    tracer = Tracer()
+    publisher = StatusPublisher(tmp_path / "status.bin", tracer)
+    p = publisher.attach(InstrumentedPipettor(Device()))
+    reader = StatusReader(tmp_path / "status.bin")
+    yield tracer, publisher, p, reader
+    reader.close()
+    publisher.close()
+
+
+def test_publishes_commands(status):
+    tracer, publisher, p, reader = status
+    p.move_xy(10, 20)
+    state = reader.read()
+    assert state["position"] == (10, 20, 0)
+    assert state["commands"] == 1
+    assert state["remaining"] is None
+
+
+def test_traced_routines_set_routine_and_step(status):
+    tracer, publisher, p, reader = status
+    seen = []
+
+    @tracer.traced()
+    def pick_tip_multi():
+        seen.append(("pick", reader.read()["routine"], reader.read()["step"]))
+
+    @tracer.traced()
+    def fill_multi():
+        seen.append(("fill", reader.read()["routine"], reader.read()["step"]))
+        pick_tip_multi()
+        seen.append(("after pick", reader.read()["routine"], reader.read()["step"]))
+
+    with publisher.routine("plate 1"):
+        fill_multi()
+        assert reader.read()["routine"] == "plate 1"
+    assert seen == [
+        ("fill", "fill_multi", ""),
+        ("pick", "fill_multi", "pick_tip_multi"),
+        ("after pick", "fill_multi", ""),
+    ]
+    assert reader.read()["routine"] == ""
+
+
+def test_routine_reset_after_error(status):
+    tracer, publisher, p, reader = status
+
+    @tracer.traced()
+    def remove_multi():
+        raise RuntimeError("no tips")
+
+    with pytest.raises(RuntimeError):
+        remove_multi()
+    assert (reader.read()["routine"], reader.read()["step"]) == ("", "")
+    assert tracer.events[-1][-1] == {"error": "RuntimeError"}
+
+
+def test_disabled_tracer_still_updates_status(status):
+    tracer, publisher, p, reader = status
+    tracer.enabled = False
+
+    with tracer.span("dilute_multi"):
+        assert reader.read()["routine"] == "dilute_multi"
+    assert not tracer.events
+
+
+def test_close_stops_following(tmp_path):
+    tracer = Tracer()
+    publisher = StatusPublisher(tmp_path / "status.bin", tracer)
+    publisher.close()
+    assert tracer.listeners == []
+
+
+def test_reopen_keeps_the_mapped_block(tmp_path):
+    path = tmp_path / "status.bin"
+    first = StatusPublisher(path, None)
+    first.attach(InstrumentedPipettor(Device())).move_xy(10, 20)
+    first.close()
+    inode = path.stat().st_ino
+    with StatusReader(path) as reader:
+        assert reader.read()["position"] == (10, 20, 0)
+        second = StatusPublisher(path, None)
+        # the reader's mapping stays valid and sees the new run
+        assert reader.read()["position"] == (0, 0, 0)
+        assert reader.read()["commands"] == 0
+        second.close()
+    assert path.stat().st_ino == inode
+
+
+def test_eta_from_routines(status):
+    tracer, publisher, p, reader = status
+    previous = use_clock(VirtualClock())
+
+    @tracer.traced()
+    def remove_multi():
+        get_clock().advance(60)
+
+    try:
+        publisher.plan(4)
+        assert reader.read()["remaining"] is None
+        remove_multi()
+        assert reader.read()["remaining"] == pytest.approx(180, abs=5)
+        # pauses between the routines count as well
+        get_clock().advance(120)
+        remove_multi()
+        assert reader.read()["remaining"] == pytest.approx(240, abs=5)
+        remove_multi()
+        remove_multi()
+        assert reader.read()["remaining"] == 0
+    finally:
+        use_clock(previous)
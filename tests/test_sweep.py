@@ -0,0 +1,37 @@
+import pytest
+
+from src.clock import get_clock, use_clock
+from src.sweep import SweepResult, grid, run_config
+
+
+def broken(p, volume):
+    raise ValueError(f"volume {volume} not supported")
+
+
+def test_grid():
+    configs = grid(x_speed=[5, 7], cols=[[1, 2], [2, 1]])
+    assert configs == [
+        {"x_speed": 5, "cols": [1, 2]},
+        {"x_speed": 5, "cols": [2, 1]},
+        {"x_speed": 7, "cols": [1, 2]},
+        {"x_speed": 7, "cols": [2, 1]},
+    ]
+
+
+def test_ranking():
+    fast = SweepResult({"x_speed": 7}, {"estimated_seconds": 10, "commands": 5}, [])
+    slow = SweepResult({"x_speed": 5}, {"estimated_seconds": 20, "commands": 5}, [])
+    assert sorted([slow, fast], key=SweepResult.rank_key) == [fast, slow]
+    assert not SweepResult({}, {}, ["ValueError: x"]).safe
+
+
+def test_any_error_rejects_only_its_config():
+    pytest.importorskip("matplotlib")
+    pytest.importorskip("biohit_pipettor")
+    clock = get_clock()
+    try:
+        result = run_config(broken, {"x_speed": 5, "volume": 2000})
+    finally:
+        use_clock(clock)
+    assert not result.safe
+    assert result.violations[0] == "ValueError: volume 2000 not supported"
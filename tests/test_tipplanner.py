@@ -0,0 +1,40 @@
+from src.tipplanner import TipPlanner, Transfer
+
+
+def test_first_transfer_needs_tips():
+    planner = TipPlanner()
+    assert not planner.has_tip
+    assert planner.use(Transfer("calcium", 1))
+    assert planner.has_tip and planner.tip_changes == 1
+
+
+def test_same_stock_into_untouched_wells_keeps_tips():
+    planner = TipPlanner()
+    flags = [planner.use(Transfer("calcium", col)) for col in (1, 2, 3)]
+    assert flags == [True, False, False]
+    assert planner.reuses == 2
+
+
+def test_other_stock_or_contact_changes_tips():
+    planner = TipPlanner()
+    planner.use(Transfer("calcium", 1, contact=True))
+    assert planner.needs_change(Transfer("medium", 2))
+    # the tip touched column 1, so calcium would carry its liquid back into the stock
+    assert planner.needs_change(Transfer("calcium", 2))
+
+
+def test_removals_change_tips_between_columns_by_default():
+    planner = TipPlanner()
+    removals = [Transfer(planner.well_group(col), "waste") for col in (1, 2, 3)]
+    assert planner.plan(removals) == [True, True, True]
+    shared = TipPlanner(well_group=lambda col: "plate")
+    assert shared.plan(Transfer(shared.well_group(col), "waste") for col in (1, 2, 3)) == [True, False, False]
+
+
+def test_plan_does_not_change_the_state():
+    planner = TipPlanner()
+    planner.use(Transfer("calcium", 1))
+    assert planner.plan([Transfer("calcium", 2), Transfer("medium", 3)]) == [False, True]
+    assert planner.residue == {"calcium"} and planner.tip_changes == 1
+    planner.drop_tip()
+    assert planner.plan([Transfer("calcium", 2)]) == [True]
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from src.tracecache import TraceCache
+
+
+def trace(n, offset=0.0):
+    return np.arange(n, dtype=float), np.arange(n, dtype=float) + offset
+
+
+def test_put_get(tmp_path):
+    cache = TraceCache(tmp_path)
+    key = cache.key("exp1", "mea1", "A1", 7)
+    cache.put(key, *trace(5, 1))
+    time, distance = cache.get(key)
+    np.testing.assert_array_equal(time, np.arange(5))
+    np.testing.assert_array_equal(distance, np.arange(5) + 1)
+    assert cache.get(cache.key("exp1", "mea1", "A1", 8)) is None
+
+
+def test_arrays_are_copy_on_write(tmp_path):
+    cache = TraceCache(tmp_path)
+    cache.put("e/m/w/1", *trace(5))
+    distance = cache.get("e/m/w/1")[1]
+    distance[:] = 0
+    np.testing.assert_array_equal(cache.get("e/m/w/1")[1], np.arange(5))
+
+
+def test_index_is_persistent(tmp_path):
+    with TraceCache(tmp_path) as cache:
+        cache.put("e/m/w/1", *trace(5))
+    reopened = TraceCache(tmp_path)
+    assert "e/m/w/1" in reopened
+    assert reopened.size == 2 * 5 * 8
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    # room for two traces of 10 points
+    cache = TraceCache(tmp_path, max_bytes=2 * 2 * 10 * 8)
+    cache.put("e/m/w/1", *trace(10))
+    cache.put("e/m/w/2", *trace(10))
+    cache._index["e/m/w/1"]["last_access"] = cache._index["e/m/w/2"]["last_access"] + 1
+    cache.put("e/m/w/3", *trace(10))
+    assert sorted(cache.keys()) == ["e/m/w/1", "e/m/w/3"]
+    assert not (tmp_path / "e__m__w__2.npy").exists()
+
+
+def test_keys_filter(tmp_path):
+    cache = TraceCache(tmp_path)
+    for key in ["e1/m1/A1/1", "e1/m1/B1/2", "e1/m2/A1/3", "e2/m1/A1/4"]:
+        cache.put(key, *trace(2))
+    assert cache.keys(exp="e1", well="A1") == ["e1/m1/A1/1", "e1/m2/A1/3"]
+    assert [key for key, *_ in cache.iter_cached(mea="m2")] == ["e1/m2/A1/3"]
+
+
+def test_deleted_file_is_a_miss(tmp_path):
+    cache = TraceCache(tmp_path)
+    cache.put("e/m/w/1", *trace(2))
+    os.remove(tmp_path / "e__m__w__1.npy")
+    assert cache.get("e/m/w/1") is None
+    assert len(cache) == 0
+
+
+class Trace:
+    def __init__(self, id):
+        self.id = id
+        self.time = self.raw_distance = None
+
+
+class DB:
+    def __init__(self, ids):
+        self.ids = ids
+        self.fetched = []
+
+    def get_trace_ids(self, exp, mea, well, start_date=None):
+        return [Trace(id) for id in self.ids]
+
+    def add_trace(self, t):
+        self.fetched.append(t.id)
+        t.time, t.raw_distance = trace(3, t.id)
+
+
+def test_refresh_fetches_only_missing_traces(tmp_path):
+    cache = TraceCache(tmp_path)
+    first = DB([1, 2])
+    cache.refresh(first, "e", "m", "A1")
+    second = DB([1, 2, 3])
+    traces = cache.refresh(second, "e", "m", "A1")
+    assert first.fetched == [1, 2]
+    assert second.fetched == [3]
+    assert [t.raw_distance[0] for t in traces] == [1, 2, 3]
+
+
+def test_folder_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_CACHE_DIR", str(tmp_path / "env"))
+    assert TraceCache().folder == tmp_path / "env"
@@ -0,0 +1,64 @@
+import pytest
+
+from src.wellset import COLS, ROWS, WellSet, well_coordinates
+
+
+def test_iteration_order_column_6_first():
+    wells = list(WellSet.wells([(1, 2), (6, 8), (6, 1), (3, 5)]))
+    assert wells == [(6, 1), (6, 8), (3, 5), (1, 2)]
+    assert list(WellSet.all())[:ROWS + 1] == [(6, row) for row in range(1, ROWS + 1)] + [(5, 1)]
+
+
+def test_block_follows_single_channel_order():
+    assert list(WellSet.block(2, 3)) == [(6, 1), (6, 2), (6, 3), (5, 1), (5, 2), (5, 3)]
+
+
+def test_columns_and_rows():
+    assert len(WellSet.all()) == COLS * ROWS
+    assert len(WellSet.by_column(1, 3)) == 2 * ROWS
+    assert WellSet.by_row(1) == WellSet.wells((col, 1) for col in range(1, COLS + 1))
+    assert len(WellSet.checkerboard()) == len(WellSet.checkerboard(odd=True)) == COLS * ROWS // 2
+    assert (1, 1) in WellSet.checkerboard() and (1, 2) not in WellSet.checkerboard()
+
+
+def test_set_algebra():
+    a = WellSet.by_column(1, 2)
+    b = WellSet.by_column(2, 3)
+    assert a | b == WellSet.by_column(1, 2, 3)
+    assert a & b == WellSet.by_column(2)
+    assert a - b == WellSet.by_column(1)
+    assert a ^ b == WellSet.by_column(1, 3)
+    assert ~a == WellSet.by_column(3, 4, 5, 6)
+    assert not WellSet() and hash(a) == hash(WellSet.by_column(2, 1))
+
+
+def test_out_of_plate():
+    with pytest.raises(ValueError):
+        WellSet.wells([(7, 1)])
+    with pytest.raises(ValueError):
+        WellSet.by_column(0)
+    with pytest.raises(ValueError):
+        WellSet(1 << (COLS * ROWS))
+
+
+def test_coerce_routine_arguments():
+    assert WellSet.coerce(3) == WellSet.by_column(1, 2, 3)
+    assert WellSet.coerce([6, 2]) == WellSet.by_column(2, 6)
+    selection = WellSet.checkerboard()
+    assert WellSet.coerce(selection) is selection
+
+
+def test_column_groups():
+    selection = WellSet.by_column(2, 5) | WellSet.wells([(3, 1), (3, 4)])
+    full, rest = selection.column_groups()
+    assert full == [5, 2]
+    assert list(rest) == [(3, 1), (3, 4)]
+    assert selection.columns() == [5, 3, 2]
+    with pytest.raises(ValueError, match=r"\[3\]"):
+        selection.multichannel_columns()
+    assert WellSet.by_column(4, 1).multichannel_columns() == [4, 1]
+
+
+def test_coordinates():
+    assert WellSet.wells([(6, 1), (5, 2)]).coordinates(10, 20) == [(10, 20), (28, 29)]
+    assert well_coordinates([(5, 2), (6, 1)], 10, 20) == [(28, 29), (10, 20)]